@@ -1,7 +1,6 @@
 from app.filter import clean_query
 from app.request import send_tor_signal
 from app.utils.session import generate_key
-from app.utils.bangs import gen_bangs_json, load_all_bangs
 from app.utils.misc import gen_file_hash, read_config_bool
 from app.utils.ua_generator import load_ua_pool
 from base64 import b64encode
@@ -9,9 +8,11 @@ from bs4 import MarkupResemblesLocatorWarning
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from flask import Flask
+import atexit
 import json
 import logging.config
 import os
+import signal
 import sys
 from stem import Signal
 import threading
@@ -19,8 +20,12 @@ import warnings
 
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from app.services.bang_refresher import BangRefresher
+from app.services.default_config import DefaultConfig
+from app.services.favicon_cache import FaviconCache
 from app.services.http_client import HttpxClient
 from app.services.provider import close_all_clients
+from app.services.session_janitor import SessionJanitor
 from app.version import __version__
 
 app = Flask(__name__, static_folder=os.path.join(
@@ -80,6 +85,9 @@ app.config['SESSION_FILE_DIR'] = os.path.join(
 # Session files larger than this are ignored during cleanup to avoid processing
 # potentially malicious or corrupted files
 app.config['MAX_SESSION_SIZE'] = 4000
+app.config['FAVICON_CACHE_DIR'] = os.path.join(
+    app.config['CONFIG_PATH'],
+    'favicons')
 app.config['BANG_PATH'] = os.getenv(
     'CONFIG_VOLUME',
     os.path.join(app.config['STATIC_FOLDER'], 'bangs'))
@@ -91,12 +99,10 @@ app.config['BANG_FILE'] = os.path.join(
 app.services = {}
 
 
-@app.teardown_appcontext
-def _teardown_clients(exception):
-    try:
-        close_all_clients()
-    except Exception:
-        pass
+# HTTP clients are shared between requests (and streamed element responses
+# are still being read from them after a request's context is torn down), so
+# they're only closed when the process exits
+atexit.register(close_all_clients)
 
 # Ensure all necessary directories exist
 if not os.path.exists(app.config['CONFIG_PATH']):
@@ -105,6 +111,33 @@ if not os.path.exists(app.config['CONFIG_PATH']):
 if not os.path.exists(app.config['SESSION_FILE_DIR']):
     os.makedirs(app.config['SESSION_FILE_DIR'])
 
+# Invalid session files are cleaned up in the background
+app.services['session_janitor'] = SessionJanitor(
+    app.config['SESSION_FILE_DIR'],
+    app.config['MAX_SESSION_SIZE'],
+    interval_seconds=int(os.getenv('WHOOGLE_SESSION_CLEANUP_INTERVAL', '300')),
+    batch_size=int(os.getenv('WHOOGLE_SESSION_CLEANUP_BATCH_SIZE', '500')))
+app.services['session_janitor'].start()
+
+# The default config is kept in memory, and only read again once the file
+# changes or the process receives SIGHUP
+app.services['default_config'] = DefaultConfig(app.config['DEFAULT_CONFIG'])
+app.services['default_config'].get()
+if (hasattr(signal, 'SIGHUP') and
+        threading.current_thread() is threading.main_thread()):
+    signal.signal(signal.SIGHUP,
+                  lambda signum, frame: app.services['default_config'].reload())
+
+# Result favicons are cached in memory and on disk, and expired icons are
+# cleared from disk once per startup
+app.services['favicon_cache'] = FaviconCache(
+    app.config['FAVICON_CACHE_DIR'],
+    maxsize=int(os.getenv('WHOOGLE_FAVICON_CACHE_SIZE', '1024')),
+    ttl_seconds=int(os.getenv('WHOOGLE_FAVICON_CACHE_TTL', '604800')))
+threading.Thread(target=app.services['favicon_cache'].prune,
+                 name='favicon-prune',
+                 daemon=True).start()
+
 if not os.path.exists(app.config['BANG_PATH']):
     os.makedirs(app.config['BANG_PATH'])
 
@@ -199,17 +232,6 @@ app.config['CSP'] = 'default-src \'none\';' \
                     'media-src \'self\';' \
                     'connect-src \'self\';'
 
-# Generate DDG bang filter
-generating_bangs = False
-if not os.path.exists(app.config['BANG_FILE']):
-    generating_bangs = True
-    with open(app.config['BANG_FILE'], 'w', encoding='utf-8') as f:
-        json.dump({}, f)
-    bangs_thread = threading.Thread(
-        target=gen_bangs_json,
-        args=(app.config['BANG_FILE'],))
-    bangs_thread.start()
-
 # Build new mapping of static files for cache busting
 cache_busting_dirs = ['css', 'js']
 for cb_dir in cache_busting_dirs:
@@ -293,10 +315,12 @@ warnings.simplefilter('ignore', MarkupResemblesLocatorWarning)
 
 from app import routes  # noqa
 
-# The gen_bangs_json function takes care of loading bangs, so skip it here if
-# it's already being loaded
-if not generating_bangs:
-    load_all_bangs(app.config['BANG_FILE'])
+# Bangs are loaded from the last snapshot on startup, and the DDG bangs are
+# fetched (or refreshed) in the background
+app.services['bang_refresher'] = BangRefresher(
+    app.config['BANG_FILE'],
+    interval_seconds=int(os.getenv('WHOOGLE_BANG_REFRESH_INTERVAL', '86400')))
+app.services['bang_refresher'].start()
 
 # Disable logging from imported modules
 logging.config.dictConfig({
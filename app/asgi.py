@@ -0,0 +1,183 @@
+"""ASGI entry point, which can be served by any ASGI server, e.g.
+
+    uvicorn app.asgi:application
+
+Searches are handled by the async search route, so that a slow response from
+the search engine is awaited on the event loop rather than holding a worker
+thread. All other routes are run through the regular WSGI app in a worker
+thread.
+"""
+import asyncio
+import inspect
+import io
+import sys
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app import app
+from app.routes import search_async
+from app.services.provider import aclose_all_clients, close_all_clients
+
+# Matches the proxy header handling applied to app.wsgi_app, for searches
+# that are handled outside of the WSGI app
+_proxy_fix = ProxyFix(lambda environ, start_response: [])
+
+
+def _build_environ(scope: dict, body: bytes) -> dict:
+    """Builds a WSGI environ from an ASGI http scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-length':
+            continue
+        elif name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            sep = '; ' if key == 'HTTP_COOKIE' else ','
+            value = environ[key] + sep + value
+        environ[key] = value
+
+    return environ
+
+
+def _run_wsgi(wsgi_app, environ: dict, loop: asyncio.AbstractEventLoop,
+              send) -> None:
+    """Runs a WSGI app to completion, sending the response through the event
+    loop as it's produced. Meant to be run in a worker thread, so that a
+    streamed response body (e.g. a proxied image) is passed along in chunks
+    rather than being read into memory first, and is read entirely within the
+    same context it was started in.
+    """
+    started = []
+    sent_start = False
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+
+    def send_threadsafe(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def send_start():
+        status, headers = started
+        send_threadsafe({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                        for k, v in headers],
+        })
+
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            if not chunk:
+                continue
+            if not sent_start:
+                send_start()
+                sent_start = True
+            send_threadsafe({'type': 'http.response.body',
+                             'body': chunk,
+                             'more_body': True})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+    if not sent_start:
+        send_start()
+    send_threadsafe({'type': 'http.response.body', 'body': b''})
+
+
+def _is_search(environ: dict) -> bool:
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return False
+    return endpoint == 'search'
+
+
+async def _search(environ: dict, send) -> None:
+    """Handles a search the same way Flask would dispatch the search route,
+    but awaits the async variant of the route
+    """
+    _proxy_fix(environ, None)
+    with app.request_context(environ):
+        try:
+            try:
+                rv = await asyncio.to_thread(app.preprocess_request)
+                if rv is None:
+                    # The session/auth checks run before the route itself
+                    rv = await asyncio.to_thread(search_async)
+                    if inspect.isawaitable(rv):
+                        rv = await rv
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            response = await asyncio.to_thread(app.finalize_request, rv)
+        except Exception as e:
+            response = app.handle_exception(e)
+
+        await asyncio.to_thread(
+            _run_wsgi, response, environ, asyncio.get_running_loop(), send)
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await aclose_all_clients()
+            close_all_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    elif scope['type'] != 'http':
+        return
+
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    environ = _build_environ(scope, body)
+    if _is_search(environ):
+        await _search(environ, send)
+    else:
+        await asyncio.to_thread(
+            _run_wsgi, app, environ, asyncio.get_running_loop(), send)
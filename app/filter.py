@@ -1,7 +1,7 @@
+import base64
 import cssutils
 from bs4 import BeautifulSoup
-from bs4.element import ResultSet, Tag
-from cryptography.fernet import Fernet
+from bs4.element import CData, NavigableString, ResultSet, Tag
 from flask import render_template
 import html
 import urllib.parse as urlparse
@@ -11,10 +11,14 @@ import re
 
 from app.models.g_classes import GClasses
 from app.request import VALID_PARAMS, MAPS_URL
-from app.utils.misc import get_abs_url, read_config_bool
+from app.services.provider import get_element_table
+from app.utils.tokens import get_cipher
+from app.utils.misc import get_abs_url, parse_html, placeholder_img, \
+    read_config_bool
 from app.utils.results import (
     BLANK_B64, GOOG_IMG, GOOG_STATIC, G_M_LOGO_URL, LOGO_URL, SITE_ALTS,
     has_ad_content, filter_link_args, append_anon_view, get_site_alt,
+    get_json_results, site_alts_index,
 )
 from app.models.endpoint import Endpoint
 from app.models.config import Config
@@ -22,6 +26,11 @@ from app.models.config import Config
 
 MAPS_ARGS = ['q', 'daddr']
 
+# Cached favicons up to this size (in bytes) are embedded in the results page
+MAX_INLINE_FAVICON_SIZE = 4096
+PLACEHOLDER_URI = 'data:image/png;base64,' + \
+    base64.b64encode(placeholder_img).decode()
+
 minimal_mode_sections = ['Top stories', 'Images', 'People also ask']
 unsupported_g_pages = [
     'support.google.com',
@@ -36,6 +45,15 @@ unsupported_g_pages = [
 
 unsupported_g_divs = ['google.com/preferences?hl=', 'ageverification.google.co.kr']
 
+# Text that identifies AI Overview sections
+AI_OVERVIEW_PATTERNS = [
+    'AI Overview',
+    'AI responses may include mistakes',
+]
+
+# The types of text included in get_text()
+TEXT_TYPES = (NavigableString, CData)
+
 
 def extract_q(q_str: str, href: str) -> str:
     """Extracts the 'q' element from a result link. This is typically
@@ -125,16 +143,21 @@ class Filter:
             root_url='',
             page_url='',
             query='',
-            mobile=False) -> None:
+            mobile=False,
+            favicon_cache=None,
+            session_id='') -> None:
         self.soup = None
         self.config = config
+        self.favicon_cache = favicon_cache
         self.mobile = mobile
         self.user_key = user_key
+        self.session_id = session_id
         self.page_url = page_url
         self.query = query
         self.main_divs = ResultSet('')
         self._elements = 0
         self._av = set()
+        self.encrypted_paths = {}
 
         self.root_url = root_url[:-1] if root_url.endswith('/') else root_url
 
@@ -147,22 +170,27 @@ class Filter:
 
     def encrypt_path(self, path, is_element=False) -> str:
         # Encrypts path to avoid plaintext results in logs
+        element_table = get_element_table()
+        if is_element and element_table.enabled:
+            # Element URLs are kept server-side, and replaced with a short ID
+            enc_path = element_table.add(path, self.session_id)
+        else:
+            enc_path = get_cipher(self.user_key).encrypt(path)
+
         if is_element:
             # Element paths are encrypted separately from text, to allow key
             # regeneration once all items have been served to the user
-            enc_path = Fernet(self.user_key).encrypt(path.encode()).decode()
             self._elements += 1
-            return enc_path
 
-        return Fernet(self.user_key).encrypt(path.encode()).decode()
+        # Keep track of the plaintext paths, so that a rendered page can be
+        # cached and re-encrypted for each request
+        self.encrypted_paths[enc_path] = path
+        return enc_path
 
     def clean(self, soup) -> BeautifulSoup:
         self.soup = soup
         self.main_divs = self.soup.find('div', {'id': 'main'})
-        self.remove_ads()
-        self.remove_ai_overview()
-        self.remove_block_titles()
-        self.remove_block_url()
+        self.remove_results()
         self.collapse_sections()
         self.update_css()
         self.update_styling()
@@ -216,6 +244,64 @@ class Filter:
         self.remove_site_blocks(self.soup)
         return self.soup
 
+    def extract_results(self, soup) -> list[dict]:
+        """Extracts structured results (for the JSON search API) directly from
+        the upstream results page
+
+        Ads, AI Overviews and blocked results are removed as they are from
+        results pages, but none of the changes that are only needed to
+        display the page (styling, favicons, bolding, encrypted links, etc)
+        are made.
+
+        Args:
+            soup: The upstream results page
+
+        Returns:
+            list[dict]: The results, each containing the result's href, text,
+                        title and content
+        """
+        self.soup = soup
+        self.main_divs = self.soup.find('div', {'id': 'main'})
+        self.remove_results()
+        return get_json_results(self.soup, self.result_href)
+
+    def result_href(self, href: str) -> str:
+        """Resolves a link in the upstream results page to its destination,
+        as update_link does for results pages
+
+        Args:
+            href: The link's href
+
+        Returns:
+            str: The destination, or an empty string if the link isn't to an
+                 external page (or is to an unsupported Google page)
+        """
+        if '/url?q=' in href:
+            link_netloc = extract_q(urlparse.urlparse(href).query, href)
+        else:
+            link_netloc = urlparse.urlparse(href).netloc
+
+        if any(url in link_netloc for url in unsupported_g_pages):
+            if any(divlink in link_netloc for divlink in unsupported_g_divs):
+                return ''
+            href = link_netloc
+
+        href = href.replace('https://www.google.com', '')
+        q = extract_q(urlparse.urlparse(href).query, href)
+        if q.startswith('/') and q not in self.query and 'spell=1' not in href:
+            href = 'https://google.com' + q
+        elif (q.startswith('https://accounts.google.com') or
+              '/search?q=' in href):
+            return ''
+        elif 'url?q=' in href:
+            href = filter_link_args(q)
+        elif href.startswith(MAPS_URL):
+            href = build_map_url(href)
+
+        if not href.startswith('http'):
+            return ''
+        return get_site_alt(href) if self.config.alts else href
+
     def sanitize_div(self, div) -> None:
         """Removes escaped script and iframe tags from results
 
@@ -226,14 +312,21 @@ class Filter:
             return
 
         for d in div.find_all('div', recursive=True):
-            d_text = d.find(string=True, recursive=False)
+            d_text = d.string
 
             # Ensure we're working with tags that contain text content
-            if not d_text or not d.string:
+            if not d_text or d_text.parent is not d:
+                continue
+
+            d_text = html.unescape(d_text)
+            if '<' not in d_text and '&' not in d_text and d_text.strip():
+                # Text without any markup or entities is unchanged by the
+                # parser, apart from escaping, so it doesn't need parsing
+                d.string = html.escape(d_text, quote=False)
                 continue
 
-            d.string = html.unescape(d_text)
-            div_soup = BeautifulSoup(d.string, 'html.parser')
+            d.string = d_text
+            div_soup = parse_html(d.string, fragment=True)
 
             # Remove all valid script or iframe tags in the div
             for script in div_soup.find_all('script'):
@@ -244,6 +337,31 @@ class Filter:
 
             d.string = str(div_soup)
 
+    def cached_favicon(self, netloc: str) -> str:
+        """Looks up a site's favicon in the favicon cache
+
+        Args:
+            netloc: The site's netloc
+
+        Returns:
+            str: The favicon as a data URI, or an empty string if it isn't
+                 cached (or is too large to embed in the page)
+        """
+        if self.favicon_cache is None:
+            return ''
+
+        favicon = self.favicon_cache.get(netloc)
+        if favicon is None:
+            return ''
+        elif not favicon.found:
+            return PLACEHOLDER_URI
+
+        if (len(favicon.data) > MAX_INLINE_FAVICON_SIZE or
+                not re.fullmatch(r'image/[\w.+-]+', favicon.mimetype)):
+            return ''
+        data = base64.b64encode(favicon.data).decode()
+        return f'data:{favicon.mimetype};base64,{data}'
+
     def add_favicon(self, link) -> None:
         """Adds icons for each returned result, using the result site's favicon
 
@@ -274,16 +392,20 @@ class Filter:
         if not is_result_div:
             return
 
-        # Construct the html for inserting the icon into the parent div
+        # Construct the html for inserting the icon into the parent div.
+        # Icons that are already cached are embedded in the page, rather than
+        # being requested separately.
         parsed = urlparse.urlparse(link['href'])
-        favicon = self.encrypt_path(
-            f'{parsed.scheme}://{parsed.netloc}/favicon.ico',
-            is_element=True)
-        src = f'{self.root_url}/{Endpoint.element}?url={favicon}' + \
-            '&type=image/x-icon'
+        src = self.cached_favicon(parsed.netloc)
+        if not src:
+            favicon = self.encrypt_path(
+                f'{parsed.scheme}://{parsed.netloc}/favicon.ico',
+                is_element=True)
+            src = f'{self.root_url}/{Endpoint.element}?url={favicon}' + \
+                '&type=image/x-icon'
         html = f'<img class="site-favicon" src="{src}">'
 
-        favicon = BeautifulSoup(html, 'html.parser')
+        favicon = parse_html(html, fragment=True)
         link.parent.insert(0, favicon)
 
         # Update all parents to indicate that a favicon has been attached
@@ -324,8 +446,13 @@ class Filter:
             result.string.replace_with(result.string.replace(
                                        search_string, ''))
 
-    def remove_ai_overview(self) -> None:
-        """Removes Google's AI Overview/SGE results from search results
+    def remove_results(self) -> None:
+        """Removes ads, Google's AI Overview/SGE results and results blocked
+        by title or url from the search result divs
+
+        The result divs are searched in a single pass, and each unwanted
+        result is removed once, by its outermost div within #main (or for AI
+        Overviews, by its top-level result div).
 
         Returns:
             None (The soup object is modified directly)
@@ -333,70 +460,95 @@ class Filter:
         if not self.main_divs:
             return
 
-        # Patterns that identify AI Overview sections
-        ai_patterns = [
-            'AI Overview',
-            'AI responses may include mistakes',
-        ]
+        block_title = None
+        if self.config.block_title:
+            block_title = re.compile(self.config.block_title)
+        block_url = None
+        if self.config.block_url:
+            block_url = re.compile(self.config.block_url)
+
+        # AI Overview markers are only searched for in the text nodes of pages
+        # that contain them
+        main_text = self.main_divs.get_text()
+        ai_markers = sum(main_text.count(pattern)
+                         for pattern in AI_OVERVIEW_PATTERNS)
+        find_ai = ai_markers > 0
+
+        flagged = []
+        ai_strings = []
+        for node in self.main_divs.descendants:
+            if type(node) is Tag:
+                if node.name == 'span':
+                    hit = has_ad_content(node.text)
+                elif node.name == 'h3' and block_title:
+                    hit = block_title.search(node.text) is not None
+                elif node.name == 'a' and block_url:
+                    hit = block_url.search(node.get('href', '')) is not None
+                else:
+                    continue
+                if hit:
+                    flagged.append(node)
+            elif find_ai and type(node) in TEXT_TYPES:
+                markers = sum(node.count(pattern)
+                              for pattern in AI_OVERVIEW_PATTERNS)
+                if markers:
+                    ai_strings.append(node)
+                    ai_markers -= markers
+
+        removed = {}
+        for node in flagged:
+            div = self._outermost_div(node)
+            if div is not None:
+                removed[id(div)] = div
+
+        if find_ai:
+            if not ai_markers:
+                ai_divs = [div for node in ai_strings
+                           for div in self._divs_within_main(node)]
+            else:
+                # A marker is split across text nodes, so the text of each
+                # div needs to be checked
+                ai_divs = [div for div in self.main_divs.find_all('div')
+                           if any(pattern in div.get_text()
+                                  for pattern in AI_OVERVIEW_PATTERNS)]
+            for div in ai_divs:
+                result_div = self._result_div(div)
+                if result_div is not None:
+                    removed[id(result_div)] = result_div
+
+        for div in removed.values():
+            div.decompose()
 
-        # Result div classes - check both original Google classes and mapped ones
-        # since this runs before CSS class replacement
+    def _divs_within_main(self, node) -> list:
+        # The div ancestors of a node, up to (but not including) #main
+        divs = []
+        for parent in node.parents:
+            if parent is self.main_divs:
+                return divs
+            if parent.name == 'div':
+                divs.append(parent)
+        return []
+
+    def _outermost_div(self, node) -> Tag | None:
+        divs = self._divs_within_main(node)
+        return divs[-1] if divs else None
+
+    @staticmethod
+    def _result_div(div) -> Tag | None:
+        # Result div classes - check both original Google classes and mapped
+        # ones since this runs before CSS class replacement
         result_classes = [GClasses.result_class_a]  # 'ZINbbc'
         result_classes.extend(GClasses.result_classes.get(
             GClasses.result_class_a, []))  # ['Gx5Zad']
 
-        # Collect divs to remove first to avoid modifying while iterating
-        divs_to_remove = []
-
-        for div in self.main_divs.find_all('div', recursive=True):
-            # Check if this div or its children contain AI Overview markers
-            div_text = div.get_text()
-            if any(pattern in div_text for pattern in ai_patterns):
-                # Walk up to find the top-level result div
-                parent = div
-                while parent:
-                    p_cls = parent.attrs.get('class') or []
-                    if any(rc in p_cls for rc in result_classes):
-                        if parent not in divs_to_remove:
-                            divs_to_remove.append(parent)
-                        break
-                    parent = parent.parent
-
-        # Remove collected divs
-        for div in divs_to_remove:
-            div.decompose()
-
-    def remove_ads(self) -> None:
-        """Removes ads found in the list of search result divs
-
-        Returns:
-            None (The soup object is modified directly)
-        """
-        if not self.main_divs:
-            return
-
-        for div in [_ for _ in self.main_divs.find_all('div', recursive=True)]:
-            div_ads = [_ for _ in div.find_all('span', recursive=True)
-                       if has_ad_content(_.text)]
-            _ = div.decompose() if len(div_ads) else None
-
-    def remove_block_titles(self) -> None:
-        if not self.main_divs or not self.config.block_title:
-            return
-        block_title = re.compile(self.config.block_title)
-        for div in [_ for _ in self.main_divs.find_all('div', recursive=True)]:
-            block_divs = [_ for _ in div.find_all('h3', recursive=True)
-                          if block_title.search(_.text) is not None]
-            _ = div.decompose() if len(block_divs) else None
-
-    def remove_block_url(self) -> None:
-        if not self.main_divs or not self.config.block_url:
-            return
-        block_url = re.compile(self.config.block_url)
-        for div in [_ for _ in self.main_divs.find_all('div', recursive=True)]:
-            block_divs = [_ for _ in div.find_all('a', recursive=True)
-                          if block_url.search(_.attrs['href']) is not None]
-            _ = div.decompose() if len(block_divs) else None
+        # Walk up to find the top-level result div
+        parent = div
+        while parent:
+            p_cls = parent.attrs.get('class') or []
+            if any(rc in p_cls for rc in result_classes):
+                return parent
+            parent = parent.parent
+        return None
 
     def remove_block_tabs(self) -> None:
         if self.main_divs:
@@ -485,12 +637,12 @@ class Filter:
                 parent = result_children[idx].parent
                 idx += 1
 
-            details = BeautifulSoup(features='html.parser').new_tag('details')
-            summary = BeautifulSoup(features='html.parser').new_tag('summary')
+            details = parse_html(fragment=True).new_tag('details')
+            summary = parse_html(fragment=True).new_tag('summary')
             summary.string = label
 
             if subtitle:
-                soup = BeautifulSoup(subtitle, 'html.parser')
+                soup = parse_html(subtitle, fragment=True)
                 summary.append(soup)
 
             details.append(summary)
@@ -519,9 +671,9 @@ class Filter:
 
         if src.startswith(LOGO_URL):
             # Re-brand with Whoogle logo
-            element.replace_with(BeautifulSoup(
+            element.replace_with(parse_html(
                 render_template('logo.html'),
-                features='html.parser'))
+                fragment=True))
             return
         elif src.startswith(G_M_LOGO_URL):
             # Re-brand with single-letter Whoogle logo
@@ -617,7 +769,7 @@ class Filter:
             )
             # Build the style tag using a fresh soup to avoid cases where the
             # current soup lacks the helper methods (e.g., non-root elements).
-            factory_soup = BeautifulSoup('', 'html.parser')
+            factory_soup = parse_html(fragment=True)
             extra_style = factory_soup.new_tag('style')
             extra_style.string = max_width_css
             if self.soup.head:
@@ -738,12 +890,12 @@ class Filter:
         """Replaces link locations and page elements if "alts" config
         is enabled
         """
-        # Precompute regex for sites (escape dots) and common prefixes
-        site_keys = list(SITE_ALTS.keys())
-        if not site_keys:
+        # Patterns for the configured sites are compiled once per change to
+        # SITE_ALTS, rather than for every request
+        site_index = site_alts_index(SITE_ALTS)
+        sites_pattern = site_index.pattern
+        if sites_pattern is None:
             return
-        sites_pattern = re.compile('|'.join([re.escape(k) for k in site_keys]))
-        prefix_pattern = re.compile(r'^(?:https?:\/\/)?(?:(?:www|mobile|m)\.)?')
 
         # 1) Replace bare domain divs (single token) once, avoiding duplicates
         for div in self.soup.find_all('div', string=sites_pattern):
@@ -819,11 +971,11 @@ class Filter:
                     # Replace any leading www./m./mobile. + site with alt host (no scheme)
                     alt_parsed = urlparse.urlparse(alt)
                     alt_host = alt_parsed.netloc if alt_parsed.netloc else alt.replace('https://', '').replace('http://', '')
-                    # Build a pattern that includes optional prefixes for the specific site
-                    site_with_prefix = re.compile(rf'(?:(?:www|mobile|m)\.)?{re.escape(site)}')
+                    # Use a pattern that includes optional prefixes for the specific site
+                    site_with_prefix = site_index.site_with_prefix(site)
                     replaced = site_with_prefix.sub(alt_host, link_str, count=1)
 
-            new_desc = BeautifulSoup(features='html.parser').new_tag('div')
+            new_desc = parse_html(fragment=True).new_tag('div')
             new_desc.string = replaced
             desc_node.replace_with(new_desc)
 
@@ -924,7 +1076,7 @@ class Filter:
             # infinite scroll with `ijn` offsets; we need a clean,
             # de-duplicated pagination strategy before exposing a Next link.
             next_link = None
-            return BeautifulSoup(
+            return parse_html(
                 render_template(
                     'imageresults.html',
                     length=len(modern_results),
@@ -932,7 +1084,7 @@ class Filter:
                     view_label="View Image",
                     next_link=next_link
                 ),
-                features='html.parser'
+                fragment=True
             )
 
         # get some tags that are unchanged between mobile and pc versions
@@ -985,11 +1137,11 @@ class Filter:
                 'img_tbn': img_tbn
             })
 
-        soup = BeautifulSoup(render_template('imageresults.html',
-                                             length=len(results),
-                                             results=results,
-                                             view_label="View Image"),
-                             features='html.parser')
+        soup = parse_html(render_template('imageresults.html',
+                                          length=len(results),
+                                          results=results,
+                                          view_label="View Image"),
+                          fragment=True)
 
         # replace correction suggested by google object if exists
         if len(cor_suggested):
@@ -1,5 +1,6 @@
 from inspect import Attribute
 from typing import Optional
+import functools
 from app.utils.misc import read_config_bool
 from flask import current_app
 import os
@@ -35,17 +36,59 @@ def get_rule_for_selector(stylesheet: CSSStyleSheet,
     return None
 
 
+@functools.cache
+def get_env_defaults() -> dict:
+    """Returns the config defaults set through the environment. These are
+    only read once per process, rather than for every Config.
+
+    Returns:
+        dict: The default value for each config attribute
+    """
+    # User agent configuration - default to env_conf if environment variables exist, otherwise default
+    env_user_agent = os.getenv('WHOOGLE_USER_AGENT', '')
+    env_mobile_agent = os.getenv('WHOOGLE_USER_AGENT_MOBILE', '')
+
+    return {
+        'user_agent': 'env_conf' if (env_user_agent or env_mobile_agent) else 'default',
+        'show_user_agent': read_config_bool('WHOOGLE_CONFIG_SHOW_USER_AGENT'),
+        'url': os.getenv('WHOOGLE_CONFIG_URL', ''),
+        'lang_search': os.getenv('WHOOGLE_CONFIG_SEARCH_LANGUAGE', ''),
+        'lang_interface': os.getenv('WHOOGLE_CONFIG_LANGUAGE', ''),
+        'style_modified': os.getenv(
+            'WHOOGLE_CONFIG_STYLE', ''),
+        'block': os.getenv('WHOOGLE_CONFIG_BLOCK', ''),
+        'block_title': os.getenv('WHOOGLE_CONFIG_BLOCK_TITLE', ''),
+        'block_url': os.getenv('WHOOGLE_CONFIG_BLOCK_URL', ''),
+        'country': os.getenv('WHOOGLE_CONFIG_COUNTRY', ''),
+        'tbs': os.getenv('WHOOGLE_CONFIG_TIME_PERIOD', ''),
+        'theme': os.getenv('WHOOGLE_CONFIG_THEME', 'system'),
+        'safe': read_config_bool('WHOOGLE_CONFIG_SAFE'),
+        'alts': read_config_bool('WHOOGLE_CONFIG_ALTS'),
+        'nojs': read_config_bool('WHOOGLE_CONFIG_NOJS'),
+        'tor': read_config_bool('WHOOGLE_CONFIG_TOR'),
+        'near': os.getenv('WHOOGLE_CONFIG_NEAR', ''),
+        'new_tab': read_config_bool('WHOOGLE_CONFIG_NEW_TAB'),
+        'view_image': read_config_bool('WHOOGLE_CONFIG_VIEW_IMAGE'),
+        'get_only': read_config_bool('WHOOGLE_CONFIG_GET_ONLY'),
+        'anon_view': read_config_bool('WHOOGLE_CONFIG_ANON_VIEW'),
+        'preferences_encrypted': read_config_bool('WHOOGLE_CONFIG_PREFERENCES_ENCRYPTED'),
+        'preferences_key': os.getenv('WHOOGLE_CONFIG_PREFERENCES_KEY', ''),
+
+        # Google Custom Search Engine (CSE) BYOK settings
+        'cse_api_key': os.getenv('WHOOGLE_CSE_API_KEY', ''),
+        'cse_id': os.getenv('WHOOGLE_CSE_ID', ''),
+        'use_cse': read_config_bool('WHOOGLE_USE_CSE'),
+    }
+
+
 class Config:
     def __init__(self, **kwargs):
-        # User agent configuration - default to env_conf if environment variables exist, otherwise default
-        env_user_agent = os.getenv('WHOOGLE_USER_AGENT', '')
-        env_mobile_agent = os.getenv('WHOOGLE_USER_AGENT_MOBILE', '')
-        default_ua_option = 'env_conf' if (env_user_agent or env_mobile_agent) else 'default'
-        
-        self.user_agent = kwargs.get('user_agent', default_ua_option)
+        env_defaults = get_env_defaults()
+
+        self.user_agent = kwargs.get('user_agent', env_defaults['user_agent'])
         self.custom_user_agent = kwargs.get('custom_user_agent', '')
         self.use_custom_user_agent = kwargs.get('use_custom_user_agent', False)
-        self.show_user_agent = read_config_bool('WHOOGLE_CONFIG_SHOW_USER_AGENT')
+        self.show_user_agent = env_defaults['show_user_agent']
 
         # Add user agent related keys to safe_keys
         # Note: CSE credentials (cse_api_key, cse_id) are intentionally NOT included
@@ -71,33 +114,9 @@ class Config:
         ]
 
         app_config = current_app.config
-        self.url = os.getenv('WHOOGLE_CONFIG_URL', '')
-        self.lang_search = os.getenv('WHOOGLE_CONFIG_SEARCH_LANGUAGE', '')
-        self.lang_interface = os.getenv('WHOOGLE_CONFIG_LANGUAGE', '')
-        self.style_modified = os.getenv(
-            'WHOOGLE_CONFIG_STYLE', '')
-        self.block = os.getenv('WHOOGLE_CONFIG_BLOCK', '')
-        self.block_title = os.getenv('WHOOGLE_CONFIG_BLOCK_TITLE', '')
-        self.block_url = os.getenv('WHOOGLE_CONFIG_BLOCK_URL', '')
-        self.country = os.getenv('WHOOGLE_CONFIG_COUNTRY', '')
-        self.tbs = os.getenv('WHOOGLE_CONFIG_TIME_PERIOD', '')
-        self.theme = os.getenv('WHOOGLE_CONFIG_THEME', 'system')
-        self.safe = read_config_bool('WHOOGLE_CONFIG_SAFE')
-        self.alts = read_config_bool('WHOOGLE_CONFIG_ALTS')
-        self.nojs = read_config_bool('WHOOGLE_CONFIG_NOJS')
-        self.tor = read_config_bool('WHOOGLE_CONFIG_TOR')
-        self.near = os.getenv('WHOOGLE_CONFIG_NEAR', '')
-        self.new_tab = read_config_bool('WHOOGLE_CONFIG_NEW_TAB')
-        self.view_image = read_config_bool('WHOOGLE_CONFIG_VIEW_IMAGE')
-        self.get_only = read_config_bool('WHOOGLE_CONFIG_GET_ONLY')
-        self.anon_view = read_config_bool('WHOOGLE_CONFIG_ANON_VIEW')
-        self.preferences_encrypted = read_config_bool('WHOOGLE_CONFIG_PREFERENCES_ENCRYPTED')
-        self.preferences_key = os.getenv('WHOOGLE_CONFIG_PREFERENCES_KEY', '')
-
-        # Google Custom Search Engine (CSE) BYOK settings
-        self.cse_api_key = os.getenv('WHOOGLE_CSE_API_KEY', '')
-        self.cse_id = os.getenv('WHOOGLE_CSE_ID', '')
-        self.use_cse = read_config_bool('WHOOGLE_USE_CSE')
+        for attr, value in env_defaults.items():
+            if attr not in ('user_agent', 'show_user_agent'):
+                setattr(self, attr, value)
 
         self.accept_language = False
 
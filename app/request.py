@@ -1,20 +1,32 @@
 from app.models.config import Config
-from app.utils.misc import read_config_bool
-from app.services.provider import get_http_client
+from app.services.provider import get_autocomplete_cache, get_http_client, \
+    get_result_cache, get_single_flight, get_tor_controller, \
+    get_upstream_limiter
 from app.utils.ua_generator import load_ua_pool, get_random_ua, DEFAULT_FALLBACK_UA
 from defusedxml import ElementTree as ET
+import asyncio
+import functools
+import hashlib
 import httpx
 import urllib.parse as urlparse
 import os
-from stem import Signal, SocketError
-from stem.connection import AuthenticationFailure
-from stem.control import Controller
-from stem.connection import authenticate_cookie, authenticate_password
+import time
+from stem import Signal
 
 MAPS_URL = 'https://maps.google.com/maps'
 AUTOCOMPLETE_URL = ('https://suggestqueries.google.com/'
                     'complete/search?client=toolbar&')
 
+# The max number of suggestions returned by the autocomplete service. A
+# shorter list is every suggestion for its query.
+AUTOCOMPLETE_MAX_SUGGESTIONS = 10
+
+# Consent cookies keep Google from showing the interstitial consent wall
+CONSENT_COOKIES = {
+    'CONSENT': 'PENDING+987',
+    'SOCS': 'CAESHAgBEhIaAB'
+}
+
 # Valid query params
 VALID_PARAMS = ['tbs', 'tbm', 'start', 'near', 'source', 'nfpr']
 
@@ -36,36 +48,10 @@ class TorError(Exception):
 
 
 def send_tor_signal(signal: Signal) -> bool:
-    use_pass = read_config_bool('WHOOGLE_TOR_USE_PASS')
-
-    confloc = './misc/tor/control.conf'
-    # Check that the custom location of conf is real.
-    temp = os.getenv('WHOOGLE_TOR_CONF', '')
-    if os.path.isfile(temp):
-        confloc = temp
-
-    # Attempt to authenticate and send signal.
-    try:
-        with Controller.from_port(port=9051) as c:
-            if use_pass:
-                with open(confloc, "r") as conf:
-                    # Scan for the last line of the file.
-                    for line in conf:
-                        pass
-                    secret = line.strip('\n')
-                authenticate_password(c, password=secret)
-            else:
-                cookie_path = '/var/lib/tor/control_auth_cookie'
-                authenticate_cookie(c, cookie_path=cookie_path)
-            c.signal(signal)
-            os.environ['TOR_AVAILABLE'] = '1'
-            return True
-    except (SocketError, AuthenticationFailure,
-            ConnectionRefusedError, ConnectionError):
-        # TODO: Handle Tor authentication (password and cookie)
-        os.environ['TOR_AVAILABLE'] = '0'
-
-    return False
+    # The control port connection is kept open between calls
+    available = get_tor_controller().signal(signal)
+    os.environ['TOR_AVAILABLE'] = '1' if available else '0'
+    return available
 
 
 def gen_user_agent(config, is_mobile) -> str:
@@ -116,6 +102,23 @@ def gen_user_agent(config, is_mobile) -> str:
     return DEFAULT_FALLBACK_UA
 
 
+def normalize_query(query: str) -> str:
+    """Normalizes a query string generated by gen_query, so that equivalent
+    searches produce the same result cache key
+
+    Args:
+        query: The query string returned by gen_query
+
+    Returns:
+        str: The query with collapsed whitespace in the search terms and
+             sorted, non-empty url params
+    """
+    q, _, params = query.partition('&')
+    q = ' '.join(urlparse.unquote(q).split())
+    return '&'.join(
+        [urlparse.quote(q)] + sorted(_ for _ in params.split('&') if _))
+
+
 def gen_query(query, args, config) -> str:
     param_dict = {key: '' for key in VALID_PARAMS}
 
@@ -215,19 +218,17 @@ class Request:
         config: the user's current whoogle configuration
     """
 
-    def __init__(self, normal_ua, root_path, config: Config, http_client=None):
+    def __init__(self, normal_ua, root_path, config: Config, http_client=None,
+                 result_cache=None, autocomplete_cache=None):
         self.search_url = 'https://www.google.com/search?gbv=1&q='
         # Google Images rejects the lightweight gbv=1 interface. Use the
         # modern udm=2 entrypoint specifically for image searches to avoid the
         # "update your browser" interstitial.
         self.image_search_url = 'https://www.google.com/search?udm=2&q='
-        # Optionally send heartbeat to Tor to determine availability
-        # Only when Tor is enabled in config to avoid unnecessary socket usage
-        if config.tor:
-            send_tor_signal(Signal.HEARTBEAT)
-
         self.language = config.lang_search if config.lang_search else ''
         self.country = config.country if config.country else ''
+        self.safe = config.safe
+        self.tbs = config.tbs
 
         # For setting Accept-language Header
         self.lang_interface = ''
@@ -238,9 +239,8 @@ class Request:
                                            or 'iPhone' in normal_ua)
 
         # Generate user agent based on config
+        self.config = config
         self.modified_user_agent = gen_user_agent(config, self.mobile)
-        if not self.mobile:
-            self.modified_user_agent_mobile = gen_user_agent(config, True)
 
         # Dedicated modern UA to use when Google rejects legacy ones (e.g. Images)
         self.image_user_agent = (
@@ -275,13 +275,53 @@ class Request:
         self.root_path = root_path
         # Initialize HTTP client (shared per proxies)
         self.http_client = http_client or get_http_client(self.proxies)
+        self.result_cache = result_cache or get_result_cache()
+        self.autocomplete_cache = (autocomplete_cache or
+                                   get_autocomplete_cache())
+        self.autocomplete_timeout = float(
+            os.environ.get('WHOOGLE_AUTOCOMPLETE_TIMEOUT', '3'))
+
+    @functools.cached_property
+    def modified_user_agent_mobile(self) -> str:
+        # Only needed for forced mobile searches from desktop clients, so
+        # it isn't generated until it's used
+        return gen_user_agent(self.config, True)
 
     def __getitem__(self, name):
         return getattr(self, name)
 
+    def result_cache_key(self, search_base: str, query: str,
+                         user_agent: str) -> tuple:
+        """Builds the shared result cache key for a search. Only values that
+        affect the results page are included, so identical searches from
+        different users (with different randomized user agents) share an
+        entry.
+
+        Args:
+            search_base: The base search URL (web or image search)
+            query: The query string generated by gen_query
+            user_agent: The user agent class of the request (see
+                        _user_agent_key)
+
+        Returns:
+            tuple: The cache key
+        """
+        return (search_base,
+                normalize_query(query),
+                self.language,
+                self.country,
+                self.lang_interface,
+                self.safe,
+                self.tbs,
+                user_agent)
+
     def autocomplete(self, query) -> list:
         """Sends a query to Google's search suggestion service
 
+        Suggestions are cached per language and country. A query can also be
+        answered from the cached suggestions for a shorter prefix of it, when
+        those are every suggestion for the prefix, or all still match.
+
         Args:
             query: The in-progress query to send
 
@@ -292,7 +332,35 @@ class Request:
         # Check if autocomplete is disabled via environment variable
         if os.environ.get('WHOOGLE_AUTOCOMPLETE', '1') == '0':
             return []
-            
+
+        prefix = query.lower()
+        locale = (self.language, self.country, self.lang_interface)
+        suggestions = self.autocomplete_cache.get(locale + (prefix,))
+        if suggestions is None:
+            suggestions = self._prefix_suggestions(locale, prefix)
+        if suggestions is None:
+            # Identical queries that are already in flight (e.g. from fast
+            # typists) share a single upstream request
+            suggestions = get_single_flight().do(
+                ('autocomplete',) + locale + (prefix,),
+                lambda: self._fetch_autocomplete(query, locale + (prefix,)))
+        return list(suggestions)
+
+    def _prefix_suggestions(self, locale: tuple, prefix: str):
+        for end in range(len(prefix) - 1, 0, -1):
+            cached = self.autocomplete_cache.get(locale + (prefix[:end],))
+            if cached is None:
+                continue
+
+            suggestions = tuple(_ for _ in cached
+                                if _.lower().startswith(prefix))
+            if (len(cached) < AUTOCOMPLETE_MAX_SUGGESTIONS or
+                    len(suggestions) == len(cached)):
+                return suggestions
+            return None
+        return None
+
+    def _fetch_autocomplete(self, query: str, cache_key: tuple) -> tuple:
         try:
             ac_query = dict(q=query)
             if self.language:
@@ -302,39 +370,49 @@ class Request:
             if self.lang_interface:
                 ac_query['hl'] = self.lang_interface
 
-            response = self.send(base_url=AUTOCOMPLETE_URL,
-                                 query=urlparse.urlencode(ac_query)).text
+            # Suggestions are only useful while the user is typing, so
+            # they're fetched once with a short timeout
+            ac_query = urlparse.urlencode(ac_query)
+            search_base, headers, _ = self._build_send(AUTOCOMPLETE_URL,
+                                                       ac_query)
+            if self.tor:
+                self._validate_tor(0, headers)
+            response = self.http_client.get(
+                search_base + ac_query,
+                headers=headers,
+                cookies=CONSENT_COOKIES,
+                retries=0,
+                timeout=self.autocomplete_timeout).text
 
             if not response:
-                return []
+                return ()
 
             try:
                 root = ET.fromstring(response)
-                return [_.attrib['data'] for _ in
-                        root.findall('.//suggestion/[@data]')]
+                suggestions = tuple(_.attrib['data'] for _ in
+                                    root.findall('.//suggestion/[@data]'))
             except ET.ParseError:
                 # Malformed XML response
-                return []
+                return ()
         except Exception as e:
             # Log the error but don't crash - autocomplete is non-essential
             print(f"Autocomplete error: {str(e)}")
-            return []
+            return ()
 
-    def send(self, base_url='', query='', attempt=0,
-             force_mobile=False, user_agent=''):
-        """Sends an outbound request to a URL. Optionally sends the request
-        using Tor, if enabled by the user.
+        # Empty replies aren't cached either, since a longer query could
+        # still have suggestions (see _prefix_suggestions)
+        if suggestions:
+            self.autocomplete_cache.set(cache_key, suggestions)
+        return suggestions
 
-        Args:
-            base_url: The URL to use in the request
-            query: The optional query string for the request
-            attempt: The number of attempts made for the request
-                (used for cycling through Tor identities, if enabled)
-            force_mobile: Optional flag to enable a mobile user agent
-                (used for fetching full size images in search results)
+    def _build_send(self, base_url='', query='', force_mobile=False,
+                    user_agent='') -> tuple:
+        """Builds the URL base, headers and result cache key for an outbound
+        request (see send for args)
 
         Returns:
-            Response: The Response object returned by the requests call
+            tuple: The URL base, headers and cache key (None if the request
+                   isn't cached)
 
         """
         use_client_user_agent = int(os.environ.get('WHOOGLE_USE_CLIENT_USER_AGENT', '0'))
@@ -389,55 +467,205 @@ class Request:
                 self.lang_interface.replace('lang_', '') + ';q=1.0'
             )
 
-        # Consent cookies keep Google from showing the interstitial consent wall
-        consent_cookies = {
-            'CONSENT': 'PENDING+987',
-            'SOCS': 'CAESHAgBEhIaAB'
-        }
+        search_base = base_url or self.search_url
+        if not base_url and ('tbm=isch' in query or 'udm=2' in query):
+            search_base = self.image_search_url
+
+        # Searches are served from the shared result cache when possible.
+        # Tor searches always go upstream, since they need a validated
+        # connection for each request.
+        cache_key = None
+        if not base_url and not self.tor:
+            if user_agent and use_client_user_agent == 1:
+                ua_key = modified_user_agent
+            else:
+                ua_key = self._user_agent_key(modified_user_agent,
+                                              self.mobile or force_mobile)
+            cache_key = self.result_cache_key(search_base, query, ua_key)
+
+        return search_base, headers, cache_key
+
+    def _user_agent_key(self, modified_user_agent: str, mobile: bool) -> str:
+        # User agents from the randomized default pool only differ by
+        # device type. Any other user agent (custom, env or fallback) can
+        # change the markup Google returns, so the UA itself is keyed on.
+        if self.config.user_agent == 'default':
+            return 'mobile' if mobile else ''
+
+        ua_hash = hashlib.sha256(modified_user_agent.encode()).hexdigest()
+        return f'{self.config.user_agent}:{ua_hash[:16]}'
+
+    def _cache_result(self, cache_key, response) -> None:
+        if (cache_key and response.status_code == 200
+                and 'captcha-form' not in response.text
+                and 'g-recaptcha' not in response.text):
+            self.result_cache.set(cache_key, response)
+
+    def send(self, base_url='', query='', attempt=0,
+             force_mobile=False, user_agent=''):
+        """Sends an outbound request to a URL. Optionally sends the request
+        using Tor, if enabled by the user.
+
+        Args:
+            base_url: The URL to use in the request
+            query: The optional query string for the request
+            attempt: The number of attempts made for the request
+                (used for cycling through Tor identities, if enabled)
+            force_mobile: Optional flag to enable a mobile user agent
+                (used for fetching full size images in search results)
+
+        Returns:
+            Response: The Response object returned by the requests call
+
+        """
+        search_base, headers, cache_key = self._build_send(
+            base_url, query, force_mobile, user_agent)
+
+        if self.tor:
+            self._validate_tor(attempt, headers)
+
+        if cache_key:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # Identical searches that are already in flight share a single
+            # upstream request and response
+            return get_single_flight().do(
+                cache_key,
+                lambda: self._fetch(search_base, query, headers, cache_key))
+
+        response = self._fetch(search_base, query, headers, cache_key)
+
+        # Retry query with new identity if using Tor (max 10 attempts)
+        if 'form id="captcha-form"' in response.text and self.tor:
+            attempt += 1
+            if attempt > 10:
+                raise TorError("Tor query failed -- max attempts exceeded 10")
+            return self.send(search_base, query, attempt)
+
+        return response
+
+    def stream(self, base_url) -> httpx.Response:
+        """Sends an outbound request to a URL without reading the response
+        body, so that it can be passed through to the client in chunks (see
+        HttpxClient.stream). Used for elements in the results page, e.g.
+        images.
+
+        Args:
+            base_url: The URL to use in the request
+
+        Returns:
+            Response: The streamed httpx response, which must be closed once
+                      it has been read
+
+        """
+        search_base, headers, _ = self._build_send(base_url)
+        if self.tor:
+            self._validate_tor(0, headers)
+
+        return self.http_client.stream(search_base,
+                                       headers=headers,
+                                       cookies=CONSENT_COOKIES)
+
+    def _validate_tor(self, attempt, headers) -> None:
+        if attempt > 0:
+            # A NEWNYM sent too soon after the last one is skipped, which
+            # would retry over the circuit that was just served a CAPTCHA
+            time.sleep(get_tor_controller().newnym_wait())
 
         # Validate Tor conn and request new identity if the last one failed
-        if self.tor and not send_tor_signal(
+        if not send_tor_signal(
                 Signal.NEWNYM if attempt > 0 else Signal.HEARTBEAT):
             raise TorError(
                 "Tor was previously enabled, but the connection has been "
                 "dropped. Please check your Tor configuration and try again.",
                 disable=True)
 
-        # Make sure that the tor connection is valid, if enabled
-        if self.tor:
-            try:
-                tor_check = self.http_client.get('https://check.torproject.org/',
-                                                 headers=headers,
-                                                 retries=1)
-                self.tor_valid = 'Congratulations' in tor_check.text
-
-                if not self.tor_valid:
-                    raise TorError(
-                        "Tor connection succeeded, but the connection could "
-                        "not be validated by torproject.org",
-                        disable=True)
-            except httpx.RequestError:
+        # Make sure that the tor connection is valid. A successful validation
+        # is reused until WHOOGLE_TOR_CHECK_INTERVAL expires.
+        try:
+            self.tor_valid = get_tor_controller().validate(
+                lambda: self._check_tor(headers))
+
+            if not self.tor_valid:
                 raise TorError(
-                    "Error raised during Tor connection validation",
+                    "Tor connection succeeded, but the connection could "
+                    "not be validated by torproject.org",
                     disable=True)
+        except httpx.RequestError:
+            raise TorError(
+                "Error raised during Tor connection validation",
+                disable=True)
 
-        search_base = base_url or self.search_url
-        if not base_url and ('tbm=isch' in query or 'udm=2' in query):
-            search_base = self.image_search_url
-
-        try:
+    def _check_tor(self, headers) -> bool:
+        tor_check = self.http_client.get('https://check.torproject.org/',
+                                         headers=headers,
+                                         retries=1)
+        return 'Congratulations' in tor_check.text
+
+    def _fetch(self, search_base, query, headers, cache_key):
+        url = search_base + query
+        if self._is_search_engine(search_base):
+            with get_upstream_limiter():
+                response = self.http_client.get(
+                    url, headers=headers, cookies=CONSENT_COOKIES)
+        else:
             response = self.http_client.get(
+                url, headers=headers, cookies=CONSENT_COOKIES)
+
+        self._cache_result(cache_key, response)
+        return response
+
+    async def _fetch_async(self, search_base, query, headers, cache_key):
+        async with get_upstream_limiter():
+            response = await self.http_client.aget(
                 search_base + query,
                 headers=headers,
-                cookies=consent_cookies)
-        except httpx.HTTPError as e:
-            raise
-
-        # Retry query with new identity if using Tor (max 10 attempts)
-        if 'form id="captcha-form"' in response.text and self.tor:
-            attempt += 1
-            if attempt > 10:
-                raise TorError("Tor query failed -- max attempts exceeded 10")
-            return self.send(search_base, query, attempt)
+                cookies=CONSENT_COOKIES)
 
+        self._cache_result(cache_key, response)
         return response
+
+    def _is_search_engine(self, search_base) -> bool:
+        # Only searches count against the upstream limit, so that loading
+        # images, favicons, etc. for a results page isn't held up.
+        # Suggestions are fetched separately, with a short timeout instead
+        # (see _fetch_autocomplete).
+        return search_base in (self.search_url, self.image_search_url)
+
+    async def send_async(self, base_url='', query='', attempt=0,
+                         force_mobile=False, user_agent=''):
+        """Async variant of send, which awaits the upstream response instead
+        of blocking the calling thread (see send for args)
+
+        Returns:
+            Response: The Response object returned by the requests call
+
+        """
+        if self.tor:
+            # Validating the Tor connection relies on the (blocking) stem
+            # controller, so Tor requests are sent from a worker thread
+            return await asyncio.to_thread(
+                self.send, base_url, query, attempt, force_mobile, user_agent)
+
+        search_base, headers, cache_key = self._build_send(
+            base_url, query, force_mobile, user_agent)
+
+        if cache_key:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            return await get_single_flight().do_async(
+                cache_key,
+                lambda: self._fetch_async(
+                    search_base, query, headers, cache_key))
+
+        if not self._is_search_engine(search_base):
+            return await self.http_client.aget(
+                search_base + query,
+                headers=headers,
+                cookies=CONSENT_COOKIES)
+
+        return await self._fetch_async(search_base, query, headers, cache_key)
@@ -1,6 +1,8 @@
 import argparse
+import asyncio
 import base64
 import io
+import itertools
 import json
 import os
 import re
@@ -18,25 +20,33 @@ from app.models.config import Config
 from app.models.endpoint import Endpoint
 from app.request import Request, TorError
 from app.services.cse_client import CSEException
+from app.services.favicon_cache import Favicon, MISSING
+from app.services.provider import get_autocomplete_requests, \
+    get_element_table, get_page_cache, get_single_flight
+from app.services.result_cache import PageTemplate
 from app.utils.bangs import suggest_bang, resolve_bang
 from app.utils.misc import empty_gif, placeholder_img, get_proxy_host_url, \
     fetch_favicon
 from app.filter import Filter
 from app.utils.misc import read_config_bool, get_client_ip, get_request_url, \
-    check_for_update, encrypt_string
+    check_for_update, encrypt_string, parse_html
 from app.utils.widgets import *
 from app.utils.results import bold_search_terms,\
-    add_currency_card, check_currency, get_tabs_content
+    add_currency_card, check_currency, get_json_results, get_tabs_content
 from app.utils.search import Search, needs_https, has_captcha
 from app.utils.session import valid_user_session
-from bs4 import BeautifulSoup as bsoup
+from app.utils.tokens import ELEMENT_ID_PREFIX, get_cipher, is_token
 from flask import jsonify, make_response, request, redirect, render_template, \
-    send_file, session, url_for, g
+    send_file, session, stream_with_context, url_for, g, has_request_context
+from flask.ctx import _AppCtxGlobals
 import httpx
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import InvalidToken
 from cryptography.exceptions import InvalidSignature
 from werkzeug.datastructures import MultiDict
 
+# Proxied elements are passed through to the client in chunks of this size
+ELEMENT_CHUNK_SIZE = 64 * 1024
+
 ac_var = 'WHOOGLE_AUTOCOMPLETE'
 autocomplete_enabled = os.getenv(ac_var, '1')
 
@@ -90,36 +100,6 @@ def session_required(f):
         # a session based key is always used.
         g.session_key = app.enc_key
 
-        # Clear out old sessions
-        invalid_sessions = []
-        for user_session in os.listdir(app.config['SESSION_FILE_DIR']):
-            file_path = os.path.join(
-                app.config['SESSION_FILE_DIR'],
-                user_session)
-
-            try:
-                # Ignore files that are larger than the max session file size
-                if os.path.getsize(file_path) > app.config['MAX_SESSION_SIZE']:
-                    continue
-
-                with open(file_path, 'r', encoding='utf-8') as session_file:
-                    data = json.load(session_file)
-                    if isinstance(data, dict) and 'valid' in data:
-                        continue
-                    invalid_sessions.append(file_path)
-            except Exception:
-                # Broad exception handling here due to how instances installed
-                # with pip seem to have issues storing unrelated files in the
-                # same directory as sessions
-                pass
-
-        for invalid_session in invalid_sessions:
-            try:
-                os.remove(invalid_session)
-            except FileNotFoundError:
-                # Don't throw error if the invalid session has been removed
-                pass
-
         return f(*args, **kwargs)
 
     return decorated
@@ -142,32 +122,60 @@ def before_request_func():
         request.args if request.method == 'GET' else request.form
     )
 
-    default_config = json.load(open(app.config['DEFAULT_CONFIG'])) \
-        if os.path.exists(app.config['DEFAULT_CONFIG']) else {}
-
     # Generate session values for user if unavailable
     if not valid_user_session(session):
-        session['config'] = default_config
+        session['config'] = app.services['default_config'].get()
         session['uuid'] = str(uuid.uuid4())
         session['key'] = app.enc_key
         session['auth'] = False
 
+    # Note: g.user_config, g.user_request and g.app_location are only built
+    # once they're used (see LazyGlobals), so that routes which don't need
+    # them don't pay for them.
+
+
+def _load_user_config() -> Config:
     # Establish config values per user session
-    g.user_config = Config(**session['config'])
+    user_config = Config(**session['config'])
 
     # Update user config if specified in search args
-    g.user_config = g.user_config.from_params(g.request_params)
+    user_config = user_config.from_params(g.request_params)
 
-    if not g.user_config.url:
-        g.user_config.url = get_request_url(request.url_root)
+    if not user_config.url:
+        user_config.url = get_request_url(request.url_root)
 
-    g.user_request = Request(
+    return user_config
+
+
+def _load_user_request() -> Request:
+    return Request(
         request.headers.get('User-Agent'),
         get_request_url(request.url_root),
         config=g.user_config
     )
 
-    g.app_location = g.user_config.url
+
+class LazyGlobals(_AppCtxGlobals):
+    """Request globals that are built on first access, rather than for every
+    request
+    """
+    loaders = {
+        'user_config': _load_user_config,
+        'user_request': _load_user_request,
+        'app_location': lambda: g.user_config.url,
+    }
+
+    def __getattr__(self, name):
+        loader = self.loaders.get(name)
+        if loader is None or not has_request_context():
+            raise AttributeError(name)
+
+        value = loader()
+        setattr(self, name, value)
+        return value
+
+
+app.app_ctx_globals_class = LazyGlobals
 
 
 @app.after_request
@@ -202,7 +210,12 @@ def unknown_page(e):
 
 @app.route(f'/{Endpoint.healthz}', methods=['GET'])
 def healthz():
-    return ''
+    # Counters from the background services, for monitoring
+    return jsonify({
+        'session_janitor': app.services['session_janitor'].stats(),
+        'default_config': app.services['default_config'].stats(),
+        'bang_refresher': app.services['bang_refresher'].stats(),
+    })
 
 
 @app.route('/', methods=['GET'])
@@ -285,51 +298,49 @@ def autocomplete():
         q = urlparse.unquote_plus(
             request.data.decode('utf-8').replace('q=', ''))
 
+    # Requests from the autocomplete script are numbered per page load (the
+    # numbering starts again on each page, which has its own random ID).
+    # Requests that were overtaken by a later keystroke before they arrived
+    # don't go upstream, and ones overtaken while fetching suggestions are
+    # answered without them, so a stale list never replaces a newer one.
+    page = request.args.get('page')
+    seq = request.args.get('seq', type=int)
+    latest_requests = None
+    if page and seq is not None:
+        latest_requests = get_autocomplete_requests()
+        if not latest_requests.start((session['uuid'], page), seq):
+            return jsonify([q, []])
+
     # Return a list of suggestions for the query
     #
     # Note: If Tor is enabled, this returns nothing, as the request is
     # almost always rejected
     # Also check if autocomplete is disabled globally
     autocomplete_enabled = os.environ.get('WHOOGLE_AUTOCOMPLETE', '1') != '0'
-    return jsonify([
-        q,
-        g.user_request.autocomplete(q) if (not g.user_config.tor and autocomplete_enabled) else []
-    ])
+    suggestions = g.user_request.autocomplete(q) if (
+        not g.user_config.tor and autocomplete_enabled) else []
+    if (latest_requests is not None and
+            not latest_requests.is_latest((session['uuid'], page), seq)):
+        return jsonify([q, []])
 
-def clean_text_spacing(text: str) -> str:
-    """Clean up text spacing issues from HTML extraction.
-    
-    Args:
-        text: Text extracted from HTML that may have spacing issues
-        
-    Returns:
-        Cleaned text with proper spacing
-    """
-    if not text:
-        return text
-    
-    # Normalize multiple spaces to single space
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Fix domain names: remove space before period followed by domain extension
-    # Examples: "weather .com" -> "weather.com", "example .org" -> "example.org"
-    text = re.sub(r'\s+\.([a-zA-Z]{2,})\b', r'.\1', text)
-    
-    # Fix www/http/https patterns
-    # Examples: "www .example" -> "www.example"
-    text = re.sub(r'\b(www|http|https)\s+\.', r'\1.', text)
-    
-    # Fix spaces before common punctuation
-    text = re.sub(r'\s+([,;:])', r'\1', text)
-    
-    # Strip leading/trailing whitespace
-    return text.strip()
+    return jsonify([q, suggestions])
 
 
-@app.route(f'/{Endpoint.search}', methods=['GET', 'POST'])
-@session_required
-@auth_required
-def search():
+def _wants_json() -> bool:
+    return (
+        request.args.get('format') == 'json' or
+        'application/json' in request.headers.get('Accept', '') or
+        'application/*+json' in request.headers.get('Accept', '')
+    )
+
+
+def _start_search():
+    """Handles a search up until the request to the search engine
+
+    Returns:
+        Search | Response: The search to run, or a response (a redirect or a
+                           cached results page) if nothing needs to be sent
+    """
     if request.method == 'POST':
         # Redirect as a GET request with an encrypted query
         post_data = MultiDict(request.form)
@@ -337,7 +348,9 @@ def search():
         get_req_str = urlparse.urlencode(post_data)
         return redirect(url_for('.search') + '?' + get_req_str)
 
-    search_util = Search(request, g.user_config, g.session_key, user_request=g.user_request)
+    search_util = Search(request, g.user_config, g.session_key,
+                         user_request=g.user_request,
+                         structured=_wants_json())
     query = search_util.new_search_query()
 
     bang = resolve_bang(query)
@@ -348,33 +361,51 @@ def search():
     if not query:
         return redirect(url_for('.index'))
 
-    # Generate response and number of external elements from the page
-    try:
-        response = search_util.generate_response()
-    except TorError as e:
+    # Serve a previously rendered page for the same search if one is cached.
+    # Tor and IP lookups are specific to the requester, and encrypted
+    # preferences can't be matched in the page, so these are never cached.
+    page_cache = get_page_cache()
+    g.page_key = None
+    if (page_cache.enabled and not _wants_json() and
+            not search_util.feeling_lucky and
+            search_util.widget != 'ip' and
+            not g.user_config.tor and
+            not g.user_config.preferences_encrypted):
+        g.page_key = search_util.page_cache_key() + (
+            app.config['HAS_UPDATE'],
+            g.user_request.mobile,
+            g.user_request.modified_user_agent
+            if g.user_config.show_user_agent else '')
+        cached_page = page_cache.get(g.page_key)
+        if cached_page is not None:
+            return cached_page.render(
+                get_cipher(g.session_key).encrypt,
+                g.user_config.preferences,
+                lambda path: get_element_table().add(path, session['uuid']))
+
+    return search_util
+
+
+def _search_error(search_util: Search, e: TorError | CSEException):
+    if isinstance(e, TorError):
         session['error_message'] = e.message + (
             "\\n\\nTor config is now disabled!" if e.disable else "")
         session['config']['tor'] = False if e.disable else session['config'][
             'tor']
         return redirect(url_for('.index'))
-    except CSEException as e:
+    else:
         localization_lang = g.user_config.get_localization_lang()
         translation = app.config['TRANSLATIONS'][localization_lang]
-        wants_json = (
-            request.args.get('format') == 'json' or
-            'application/json' in request.headers.get('Accept', '') or
-            'application/*+json' in request.headers.get('Accept', '')
-        )
         error_msg = f"Custom Search API Error: {e.message}"
         if e.is_quota_error:
             error_msg = ("Google Custom Search API quota exceeded. "
                         "Free tier allows 100 queries/day. "
                         "Wait until midnight PT or disable CSE in settings.")
-        if wants_json:
+        if _wants_json():
             return jsonify({
                 'error': True,
                 'error_message': error_msg,
-                'query': urlparse.unquote(query)
+                'query': urlparse.unquote(search_util.query)
             }), e.code
         return render_template(
             'error.html',
@@ -382,32 +413,48 @@ def search():
             translation=translation,
             config=g.user_config), e.code
 
-    wants_json = (
-        request.args.get('format') == 'json' or
-        'application/json' in request.headers.get('Accept', '') or
-        'application/*+json' in request.headers.get('Accept', '')
-    )
+
+def _finish_search(search_util: Search, response):
+    """Post-processes and renders the results for a search
+
+    Args:
+        search_util: The current search
+        response: The result of Search.generate_response
+    """
+    query = search_util.query
+    wants_json = _wants_json()
 
     if search_util.feeling_lucky:
         if wants_json:
             return jsonify({'redirect': response}), 303
         return redirect(response, code=303)
 
+    # Structured results (for the JSON API) were extracted directly from the
+    # upstream page, and don't need any of the page post-processing
+    if isinstance(response, list):
+        return jsonify({
+            'query': urlparse.unquote(query),
+            'search_type': search_util.search_type,
+            'results': response
+        })
+
     # If the user is attempting to translate a string, determine the correct
     # string for formatting the lingva.ml url
     localization_lang = g.user_config.get_localization_lang()
     translation = app.config['TRANSLATIONS'][localization_lang]
     translate_to = localization_lang.replace('lang_', '')
 
+    # The filtered results are shared as a single parsed tree through the
+    # rest of the search pipeline, and only serialized once when rendering
+    if isinstance(response, str):
+        response = parse_html(response)
+
     # removing st-card to only use whoogle time selector
-    soup = bsoup(response, "html.parser");
-    for x in soup.find_all(attrs={"id": "st-card"}):
+    for x in response.find_all(attrs={"id": "st-card"}):
         x.replace_with("")
 
-    response = str(soup)
-
     # Return 503 if temporarily blocked by captcha
-    if has_captcha(str(response)):
+    if has_captcha(response):
         app.logger.error('503 (CAPTCHA)')
         fallback_engine = os.environ.get('WHOOGLE_FALLBACK_ENGINE_URL', '')
         if (fallback_engine):
@@ -436,18 +483,20 @@ def search():
 
     # check for widgets and add if requested
     if search_util.widget != '':
-        html_soup = bsoup(str(response), 'html.parser')
         if search_util.widget == 'ip':
-            response = add_ip_card(html_soup, get_client_ip(request))
+            response = add_ip_card(response, get_client_ip(request))
         elif search_util.widget == 'calculator' and not 'nojs' in request.args:
-            response = add_calculator_card(html_soup)
+            response = add_calculator_card(response)
+
+    preferences = g.user_config.preferences
+    home_url = f"home?preferences={preferences}" if preferences else "home"
 
     # Update tabs content (fallback to the raw query if full_query isn't set)
     full_query_val = getattr(search_util, 'full_query', query)
     tabs = get_tabs_content(app.config['HEADER_TABS'],
                             full_query_val,
                             search_util.search_type,
-                            g.user_config.preferences,
+                            preferences,
                             translation)
     
     # Filter out unsupported tabs when CSE is enabled
@@ -463,127 +512,20 @@ def search():
     # Feature to display currency_card
     # Since this is determined by more than just the
     # query is it not defined as a standard widget
-    conversion = check_currency(str(response))
+    conversion = check_currency(response)
     if conversion:
-        html_soup = bsoup(str(response), 'html.parser')
-        response = add_currency_card(html_soup, conversion)
-
-    preferences = g.user_config.preferences
-    home_url = f"home?preferences={preferences}" if preferences else "home"
-    cleanresponse = str(response).replace("andlt;","&lt;").replace("andgt;","&gt;")
+        response = add_currency_card(response, conversion)
 
     if wants_json:
-        # Build a parsable JSON from the filtered soup
-        json_soup = bsoup(str(response), 'html.parser')
-        results = []
-        seen = set()
-        
-        # Find all result containers (using known result classes)
-        result_divs = json_soup.find_all('div', class_=['ZINbbc', 'ezO2md'])
-        
-        if result_divs:
-            # Process structured Google results with container divs
-            for div in result_divs:
-                # Find the first valid link in this result container
-                link = None
-                for a in div.find_all('a', href=True):
-                    if a['href'].startswith('http'):
-                        link = a
-                        break
-                
-                if not link:
-                    continue
-                    
-                href = link['href']
-                if href in seen:
-                    continue
-                
-                # Get all text from the result container, not just the link
-                text = clean_text_spacing(div.get_text(separator=' ', strip=True))
-                if not text:
-                    continue
-                
-                # Extract title and content separately
-                # Title is typically in an h3 tag, CVA68e span, or the main link text
-                title = ''
-                # First try h3 tag
-                h3_tag = div.find('h3')
-                if h3_tag:
-                    title = clean_text_spacing(h3_tag.get_text(separator=' ', strip=True))
-                else:
-                    # Try CVA68e class (common title class in Google results)
-                    title_span = div.find('span', class_='CVA68e')
-                    if title_span:
-                        title = clean_text_spacing(title_span.get_text(separator=' ', strip=True))
-                    elif link:
-                        # Fallback to link text, but exclude URL breadcrumb
-                        title = clean_text_spacing(link.get_text(separator=' ', strip=True))
-                
-                # Content is the description/snippet text
-                # Look for description/snippet elements
-                content = ''
-                # Common classes for snippets/descriptions in Google results
-                snippet_selectors = [
-                    {'class_': 'VwiC3b'},   # Standard snippet
-                    {'class_': 'FrIlee'},   # Alternative snippet class (common in current Google)
-                    {'class_': 's'},        # Another snippet class
-                    {'class_': 'st'},       # Legacy snippet class
-                ]
-                
-                for selector in snippet_selectors:
-                    snippet_elem = div.find('span', selector) or div.find('div', selector)
-                    if snippet_elem:
-                        # Get text but exclude any nested links (like "Related searches")
-                        content = clean_text_spacing(snippet_elem.get_text(separator=' ', strip=True))
-                        # Only use if it's substantial content (not just the URL breadcrumb)
-                        if content and not content.startswith('www.') and '›' not in content:
-                            break
-                        else:
-                            content = ''
-                
-                # If no specific content found, use text minus title as fallback
-                if not content and title:
-                    # Try to extract content by removing title from full text
-                    if text.startswith(title):
-                        content = text[len(title):].strip()
-                    else:
-                        content = text
-                elif not content:
-                    content = text
-                    
-                seen.add(href)
-                results.append({
-                    'href': href,
-                    'text': text,
-                    'title': title,
-                    'content': content
-                })
-        else:
-            # Fallback: extract links directly if no result containers found
-            for a in json_soup.find_all('a', href=True):
-                href = a['href']
-                if not href.startswith('http'):
-                    continue
-                if href in seen:
-                    continue
-                text = clean_text_spacing(a.get_text(separator=' ', strip=True))
-                if not text:
-                    continue
-                seen.add(href)
-                # In fallback mode, the link text serves as both title and text
-                results.append({
-                    'href': href,
-                    'text': text,
-                    'title': text,
-                    'content': ''
-                })
-
+        results = get_json_results(response)
         return jsonify({
             'query': urlparse.unquote(query),
             'search_type': search_util.search_type,
             'results': results
         })
 
+    cleanresponse = str(response).replace("andlt;","&lt;").replace("andgt;","&gt;")
+
     # Get the user agent that was used for the search
     used_user_agent = ''
     if search_util.user_request:
@@ -591,7 +533,7 @@ def search():
     elif hasattr(g, 'user_request') and g.user_request:
         used_user_agent = g.user_request.modified_user_agent
     
-    return render_template(
+    page = render_template(
         'display.html',
         has_update=app.config['HAS_UPDATE'],
         query=urlparse.unquote(query),
@@ -627,6 +569,50 @@ def search():
             mobile=g.user_request.mobile,
             tabs=tabs)).replace("  ", "")
 
+    if g.page_key is not None:
+        get_page_cache().set(g.page_key, PageTemplate(
+            page, search_util.encrypted_paths, preferences))
+
+    return page
+
+
+@app.route(f'/{Endpoint.search}', methods=['GET', 'POST'])
+@session_required
+@auth_required
+def search():
+    search_util = _start_search()
+    if not isinstance(search_util, Search):
+        return search_util
+
+    # Generate response and number of external elements from the page
+    try:
+        response = search_util.generate_response()
+    except (TorError, CSEException) as e:
+        return _search_error(search_util, e)
+
+    return _finish_search(search_util, response)
+
+
+@session_required
+@auth_required
+async def search_async():
+    """Async variant of the search route, served through the ASGI entry point
+    (app/asgi.py). The request to the search engine is awaited, so a slow
+    response doesn't hold a worker thread.
+    """
+    # Building the user config and request (and checking Tor) blocks, so is
+    # kept off the event loop
+    search_util = await asyncio.to_thread(_start_search)
+    if not isinstance(search_util, Search):
+        return search_util
+
+    try:
+        response = await search_util.generate_response_async()
+    except (TorError, CSEException) as e:
+        return _search_error(search_util, e)
+
+    return await asyncio.to_thread(_finish_search, search_util, response)
+
 
 @app.route(f'/{Endpoint.config}', methods=['GET', 'POST', 'PUT'])
 @session_required
@@ -697,10 +683,14 @@ def imgres():
 @auth_required
 def element():
     element_url = src_url = request.args.get('url')
-    if element_url.startswith('gAAAAA'):
+    if element_url.startswith(ELEMENT_ID_PREFIX):
+        src_url = get_element_table().resolve(element_url, session['uuid'])
+        if src_url is None:
+            # The ID has expired (or was never valid for this session)
+            return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
+    elif is_token(element_url):
         try:
-            cipher_suite = Fernet(g.session_key)
-            src_url = cipher_suite.decrypt(element_url.encode()).decode()
+            src_url = get_cipher(g.session_key).decrypt(element_url)
         except (InvalidSignature, InvalidToken) as e:
             return render_template(
                 'error.html',
@@ -713,27 +703,126 @@ def element():
     if not validators.domain(domain):
         return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
 
+    max_size = int(os.environ.get('WHOOGLE_ELEMENT_MAX_SIZE', '5242880'))
+    if urlparse.urlparse(src_url).path == '/favicon.ico':
+        return _favicon(src_url, max_size)
+
     try:
-        response = g.user_request.send(base_url=src_url)
+        response = g.user_request.stream(src_url)
+    except httpx.HTTPError:
+        return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
 
-        # Display an empty gif if the requested element couldn't be retrieved
-        if response.status_code != 200 or len(response.content) == 0:
-            if 'favicon' in src_url:
-                favicon = fetch_favicon(src_url)
-                return send_file(io.BytesIO(favicon), mimetype='image/png')
-            else:
-                return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
+    # The body is decoded while streaming, so the upstream length is only
+    # accurate for responses that weren't compressed
+    content_length = response.headers.get('Content-Length', '')
+    known_length = (content_length.isdigit() and
+                    'Content-Encoding' not in response.headers)
+    if (response.status_code != 200 or
+            (max_size and known_length and int(content_length) > max_size)):
+        response.close()
+        return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
+
+    mimetype = src_type or response.headers.get('Content-Type')
+    chunks = response.iter_bytes(ELEMENT_CHUNK_SIZE)
+    if max_size and not known_length:
+        # Elements of unknown size are read up to the max size before
+        # anything is sent, so that larger elements can still be replaced
+        body = _read_element(response, chunks, max_size)
+        if not body:
+            return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
+        return app.response_class(body, mimetype=mimetype)
+
+    # Read ahead to the first chunk, so that an empty response can still be
+    # replaced before anything is sent
+    try:
+        first_chunk = next(chunks, b'')
+    except httpx.HTTPError:
+        first_chunk = b''
+
+    # Display an empty gif if the requested element couldn't be retrieved
+    if not first_chunk:
+        response.close()
+        return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
+
+    headers = {}
+    if known_length:
+        headers['Content-Length'] = content_length
 
-        file_data = response.content
-        tmp_mem = io.BytesIO()
-        tmp_mem.write(file_data)
-        tmp_mem.seek(0)
+    return app.response_class(
+        stream_with_context(_stream_element(
+            response, itertools.chain([first_chunk], chunks))),
+        headers=headers,
+        mimetype=mimetype)
 
-        return send_file(tmp_mem, mimetype=src_type)
+
+def _favicon(src_url: str, max_size: int):
+    favicon_cache = app.services['favicon_cache']
+    netloc = urlparse.urlparse(src_url).netloc.lower()
+
+    favicon = favicon_cache.get(netloc)
+    if favicon is None:
+        # Results pages request the same favicons at once, so concurrent
+        # requests for a site's icon share a single fetch
+        favicon = get_single_flight().do(
+            ('favicon', netloc),
+            lambda: _fetch_favicon(src_url, max_size))
+        favicon_cache.set(netloc, favicon)
+
+    if not favicon.found:
+        return send_file(io.BytesIO(placeholder_img), mimetype='image/png')
+    return send_file(io.BytesIO(favicon.data), mimetype=favicon.mimetype)
+
+
+def _fetch_favicon(src_url: str, max_size: int) -> Favicon:
+    try:
+        response = g.user_request.send(base_url=src_url)
+        size = len(response.content)
+        if (response.status_code == 200 and size and
+                not (max_size and size > max_size)):
+            # The icon is shared with other users, so its type comes from
+            # the site rather than the request
+            mimetype = response.headers.get('Content-Type', '').split(';')[0]
+            if not mimetype.startswith('image/'):
+                mimetype = 'image/x-icon'
+            return Favicon(response.content, mimetype)
     except httpx.HTTPError:
         pass
 
-    return send_file(io.BytesIO(empty_gif), mimetype='image/gif')
+    # Fall back to DuckDuckGo's favicon retriever
+    try:
+        data = fetch_favicon(src_url)
+    except httpx.HTTPError:
+        data = placeholder_img
+    return MISSING if data == placeholder_img else Favicon(data, 'image/png')
+
+
+def _read_element(response: httpx.Response, chunks, max_size: int) -> bytes:
+    """Reads an element's body, up to the max size
+
+    Returns:
+        bytes: The body, or an empty string if it couldn't be read or is
+               over the max size
+    """
+    body = bytearray()
+    try:
+        for chunk in chunks:
+            body += chunk
+            if len(body) > max_size:
+                return b''
+    except httpx.HTTPError:
+        return b''
+    finally:
+        response.close()
+    return bytes(body)
+
+
+def _stream_element(response: httpx.Response, chunks):
+    try:
+        yield from chunks
+    except httpx.HTTPError:
+        pass
+    finally:
+        response.close()
 
 
 @app.route(f'/{Endpoint.window}')
@@ -741,14 +830,14 @@ def element():
 @auth_required
 def window():
     target_url = request.args.get('location')
-    if target_url.startswith('gAAAAA'):
-        cipher_suite = Fernet(g.session_key)
-        target_url = cipher_suite.decrypt(target_url.encode()).decode()
+    if is_token(target_url):
+        target_url = get_cipher(g.session_key).decrypt(target_url)
 
     content_filter = Filter(
         g.session_key,
         root_url=request.url_root,
-        config=g.user_config)
+        config=g.user_config,
+        session_id=session['uuid'])
     target = urlparse.urlparse(target_url)
 
     # Ensure requested URL has a valid domain
@@ -761,7 +850,7 @@ def window():
 
     get_body = g.user_request.send(base_url=target_url).text
 
-    results = bsoup(get_body, 'html.parser')
+    results = parse_html(get_body)
     src_attrs = ['src', 'href', 'srcset', 'data-srcset', 'data-src']
 
     # Parse HTML response and replace relative links w/ absolute
@@ -837,10 +926,14 @@ def internal_error(e):
     else:
         query = request.args.get('q')
 
+    # Only use the user config if it was already built, since building it
+    # may be what caused the error
+    user_config = g.__dict__.get('user_config')
+
     # Attempt to parse the query
     try:
-        if hasattr(g, 'user_config') and hasattr(g, 'session_key'):
-            search_util = Search(request, g.user_config, g.session_key)
+        if user_config is not None and hasattr(g, 'session_key'):
+            search_util = Search(request, user_config, g.session_key)
             query = search_util.new_search_query()
     except Exception:
         pass
@@ -852,8 +945,8 @@ def internal_error(e):
         return redirect(fallback_engine + (query or ''))
 
     # Safely get localization language with fallback
-    if hasattr(g, 'user_config'):
-        localization_lang = g.user_config.get_localization_lang()
+    if user_config is not None:
+        localization_lang = user_config.get_localization_lang()
     else:
         localization_lang = 'lang_en'
     translation = app.config['TRANSLATIONS'][localization_lang]
@@ -866,9 +959,9 @@ def internal_error(e):
     }
     
     # Add user config if available
-    if hasattr(g, 'user_config'):
-        template_context['config'] = g.user_config
-        template_context['params'] = g.user_config.to_params(keys=['preferences'])
+    if user_config is not None:
+        template_context['config'] = user_config
+        template_context['params'] = user_config.to_params(keys=['preferences'])
     
     return render_template('error.html', **template_context), 500
 
@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.utils import bangs
+from app.utils.misc import write_atomic
+
+# Conditional request state for the DDG bangs list is kept next to the bangs
+# file (without a .json extension, so it isn't loaded as a bang file)
+META_FILE = 'bangs.meta'
+
+
+class BangRefresher:
+    """Keeps the DDG bangs up to date in the background.
+
+    On start, the bangs are loaded from the last snapshot (or the bang files)
+    without waiting on the network, and the DDG bangs list is then fetched in
+    a background thread if it's missing or older than `interval_seconds`.
+    Refreshes are conditional requests (If-None-Match/If-Modified-Since), so
+    an unchanged list isn't downloaded again. A new list is written to disk
+    atomically, and the bangs are swapped in memory in a single assignment.
+
+    A refresher with an interval of 0 only fetches the list if there isn't
+    one on disk yet. Whether the bangs are ready is reported at /healthz.
+    """
+
+    def __init__(self, bangs_file: str, interval_seconds: int = 86400,
+                 timeout: float = 30.0, retry_seconds: int = 300) -> None:
+        self.bangs_file = bangs_file
+        self.meta_file = os.path.join(os.path.dirname(bangs_file), META_FILE)
+        self.interval_seconds = interval_seconds
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.refreshes = 0
+        self.not_modified = 0
+        self.failures = 0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the DDG bangs have been loaded"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _has_bangs_file(self) -> bool:
+        try:
+            return os.path.getsize(self.bangs_file) > 4
+        except OSError:
+            return False
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return meta if isinstance(meta, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, meta: dict) -> None:
+        try:
+            write_atomic(self.meta_file, json.dumps(meta).encode())
+        except OSError:
+            pass
+
+    def load(self) -> bool:
+        """Loads the bangs from disk
+
+        Returns:
+            bool: Whether the DDG bangs were available
+        """
+        if not self._has_bangs_file():
+            return False
+
+        bangs.load_all_bangs(self.bangs_file)
+        self._ready.set()
+        return True
+
+    def due_in(self) -> float:
+        """Returns the seconds until the DDG bangs list should be fetched
+        again, or 0 if it's due now
+        """
+        if not self._has_bangs_file():
+            return 0
+        if self.interval_seconds <= 0:
+            return float('inf')
+
+        checked = self._read_meta().get('checked', 0)
+        return max(0, checked + self.interval_seconds - time.time())
+
+    def run_once(self) -> bool:
+        """Fetches the DDG bangs list, if it has changed since the last fetch
+
+        Returns:
+            bool: Whether new bangs were loaded
+        """
+        with self._lock:
+            meta = self._read_meta() if self._has_bangs_file() else {}
+            headers = {}
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+            r = httpx.get(bangs.DDG_BANGS, headers=headers,
+                          timeout=self.timeout)
+            if r.status_code == 304:
+                meta['checked'] = time.time()
+                self._write_meta(meta)
+                self.not_modified += 1
+                if not self.ready:
+                    self.load()
+                return False
+            r.raise_for_status()
+
+            bangs_data = bangs.parse_ddg_bangs(r.json())
+            write_atomic(self.bangs_file,
+                         json.dumps(bangs_data).encode('utf-8'))
+            self._write_meta({
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+                'checked': time.time(),
+            })
+            bangs.load_all_bangs(self.bangs_file, bangs_data)
+            self.refreshes += 1
+            self._ready.set()
+            return True
+
+    def start(self) -> None:
+        self.load()
+        if self._thread is not None:
+            return
+        if self.ready and self.interval_seconds <= 0:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='bang-refresher',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            delay = self.due_in()
+            if delay <= 0:
+                try:
+                    self.run_once()
+                    delay = self.due_in()
+                except Exception as e:
+                    self.failures += 1
+                    print(f'Warning: Could not refresh DDG bangs: {e}',
+                          file=sys.stderr)
+                    delay = self.retry_seconds
+
+            if delay == float('inf') or self._stop.wait(delay):
+                return
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'ready': int(self.ready),
+            'refreshes': self.refreshes,
+            'not_modified': self.not_modified,
+            'failures': self.failures,
+        }
@@ -0,0 +1,222 @@
+import asyncio
+import collections
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from cachetools import TTLCache
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key, so that only the first
+    caller (the leader) does the work, and every caller that arrives while it
+    is in flight receives the same result or exception.
+
+    Sync callers are coalesced with other threads, and async callers with
+    other tasks on the same event loop.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key: Hashable,
+                       fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and task.get_loop() is loop:
+                self.coalesced += 1
+            else:
+                # The work runs in its own task, so that it isn't cancelled
+                # along with the request that started it
+                task = self._tasks[key] = loop.create_task(fn())
+                task.add_done_callback(
+                    lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+        # Avoid "exception was never retrieved" warnings if every caller
+        # was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class UpstreamLimiter:
+    """Caps the number of simultaneous requests to the search engine. Callers
+    beyond the limit wait in line (threads and async tasks alike) until a
+    request finishes. A limit of 0 disables the cap.
+    """
+
+    def __init__(self, limit: int = 16) -> None:
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters: collections.deque = collections.deque()
+
+    def _try_acquire(self) -> bool:
+        if self.limit <= 0:
+            return True
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._try_acquire():
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+
+        # The slot is handed over directly by release
+        event.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire():
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Pass the slot on if it was handed over before the cancellation
+            # (otherwise it's passed on by _wake once it is)
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        if self.limit <= 0:
+            return
+
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+            waiter = self._waiters.popleft()
+
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                # The waiter's event loop has been closed
+                self.release()
+
+    def _wake(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def __enter__(self) -> 'UpstreamLimiter':
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+    async def __aenter__(self) -> 'UpstreamLimiter':
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.release()
+
+
+class LatestRequests:
+    """Tracks the latest of a client's numbered requests (e.g. autocomplete
+    requests, which are numbered per keystroke). A request that has already
+    been overtaken by a newer one from the same client when it starts can be
+    dropped before going upstream, and one that's overtaken while in flight
+    can be dropped once it's done, rather than answered with a stale result.
+    Clients are forgotten after `ttl_seconds` without a request.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl_seconds: int = 300) -> None:
+        self.superseded = 0
+        self._latest = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+
+    def _is_latest(self, client: Hashable, seq: int) -> bool:
+        latest = self._latest.get(client)
+        if latest is not None and seq < latest:
+            self.superseded += 1
+            return False
+        return True
+
+    def start(self, client: Hashable, seq: int) -> bool:
+        """Records a client's request
+
+        Args:
+            client: The client (e.g. its session ID and page load)
+            seq: The request's number, which increases with each request
+
+        Returns:
+            bool: False if a newer request from the client has already
+                  started, otherwise True
+        """
+        with self._lock:
+            if not self._is_latest(client, seq):
+                return False
+            self._latest[client] = seq
+        return True
+
+    def is_latest(self, client: Hashable, seq: int) -> bool:
+        """Checks that no newer request from the client has started since
+        a request did (see start)
+
+        Args:
+            client: The client (e.g. its session ID and page load)
+            seq: The request's number
+
+        Returns:
+            bool: False if a newer request from the client has started,
+                  otherwise True
+        """
+        with self._lock:
+            return self._is_latest(client, seq)
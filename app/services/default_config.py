@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import threading
+from typing import Dict
+
+
+class DefaultConfig:
+    """Keeps the instance's default config (config.json) in memory.
+
+    The file is only read again once its modification time changes, or after
+    reload() is called (e.g. on SIGHUP). The number of loads is kept in
+    `reloads`, and reported at /healthz for monitoring.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.reloads = 0
+        self._config = {}
+        self._mtime = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        """Marks the config to be read again on its next use. This only sets
+        a flag, so it's safe to call from a signal handler.
+        """
+        self._stale = True
+
+    def get(self) -> dict:
+        """Returns a copy of the default config, reading the file first if it
+        has changed
+
+        Returns:
+            dict: The default config values
+        """
+        mtime = self._get_mtime()
+        if self._stale or mtime != self._mtime:
+            with self._lock:
+                if self._stale or mtime != self._mtime:
+                    self._load(mtime)
+
+        return dict(self._config)
+
+    def _load(self, mtime) -> None:
+        self._stale = False
+        self._mtime = mtime
+        if mtime is None:
+            self._config = {}
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._config = json.load(f)
+            self.reloads += 1
+        except (OSError, ValueError) as e:
+            # Keep serving the last good config
+            print(f'Warning: Could not load {self.path}: {e}', file=sys.stderr)
+
+    def stats(self) -> Dict[str, int]:
+        return {'reloads': self.reloads}
@@ -0,0 +1,61 @@
+import hashlib
+import secrets
+from typing import Dict, Optional
+
+from app.services.result_cache import ResultCache
+from app.utils.tokens import ELEMENT_ID_PREFIX
+
+
+class ElementTable:
+    """Maps short random IDs to the URLs of elements in results pages
+    (images, favicons, etc.), so that the URLs don't need to be encrypted
+    into the page, and /element can look them up without decrypting anything.
+
+    An ID only resolves for the session it was created for. IDs are
+    evicted least-recently-used first once the table is full, and expire
+    after the configured TTL. A table with a size or TTL of 0 is disabled.
+    """
+
+    def __init__(self, maxsize: int = 0, ttl_seconds: int = 3600) -> None:
+        self._ids = ResultCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self._ids.enabled
+
+    @staticmethod
+    def _owner(session_id: str) -> bytes:
+        return hashlib.sha256(session_id.encode()).digest()[:16]
+
+    def add(self, url: str, session_id: str) -> str:
+        """Stores an element URL for a session
+
+        Args:
+            url: The element URL
+            session_id: The session's ID (session['uuid'])
+
+        Returns:
+            str: The element's ID
+        """
+        element_id = ELEMENT_ID_PREFIX + secrets.token_urlsafe(12)
+        self._ids.set(element_id, (self._owner(session_id), url))
+        return element_id
+
+    def resolve(self, element_id: str, session_id: str) -> Optional[str]:
+        """Looks up an element URL
+
+        Args:
+            element_id: The element's ID
+            session_id: The session's ID (session['uuid'])
+
+        Returns:
+            str: The element URL, or None if the ID has expired or belongs to
+                 a different session
+        """
+        entry = self._ids.get(element_id)
+        if entry is None or entry[0] != self._owner(session_id):
+            return None
+        return entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        return self._ids.stats()
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.utils.misc import write_atomic
+
+
+class Favicon(NamedTuple):
+    data: bytes
+    mimetype: str
+
+    @property
+    def found(self) -> bool:
+        return bool(self.data)
+
+
+# Cached in place of an icon for sites that don't have one
+MISSING = Favicon(b'', '')
+
+# Remembered in memory for sites whose icon isn't cached (on disk either), so
+# that it isn't looked up on disk again for every results page
+NOT_CACHED = Favicon(b'', 'not-cached')
+
+
+class FaviconCache:
+    """Caches site favicons by netloc, in memory (LRU) and on disk, so that
+    popular sites' icons aren't fetched again for every results page.
+
+    Sites without a favicon are cached too (as MISSING), but only for
+    `negative_ttl_seconds`. Lookups for icons that aren't cached are
+    remembered in memory for `miss_ttl_seconds`, rather than checking the
+    disk every time. A cache with a size or TTL of 0 is disabled.
+
+    On disk, each icon is stored in its own file, as the icon's mimetype on
+    the first line followed by the icon itself. The file's modification time
+    is used to expire it.
+    """
+
+    def __init__(self, cache_dir: str, maxsize: int = 1024,
+                 ttl_seconds: int = 604800,
+                 negative_ttl_seconds: int = 86400,
+                 miss_ttl_seconds: int = 60) -> None:
+        self.cache_dir = cache_dir
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = min(negative_ttl_seconds, ttl_seconds)
+        self.miss_ttl_seconds = min(miss_ttl_seconds, ttl_seconds)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = TTLCache(maxsize=max(maxsize, 1),
+                                ttl=max(ttl_seconds, 1))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl_seconds > 0
+
+    def _path(self, netloc: str) -> str:
+        name = hashlib.sha256(netloc.encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, name)
+
+    def _ttl(self, favicon: Favicon) -> int:
+        return self.ttl_seconds if favicon.found else self.negative_ttl_seconds
+
+    def get(self, netloc: str) -> Optional[Favicon]:
+        """Looks up the favicon for a site
+
+        Args:
+            netloc: The site's netloc
+
+        Returns:
+            Favicon: The cached favicon (MISSING if the site is known not to
+                     have one), or None if it isn't cached
+        """
+        if not self.enabled:
+            return None
+
+        netloc = netloc.lower()
+        with self._lock:
+            favicon, expires = self._memory.get(netloc, (None, 0))
+            if favicon is not None and expires > time.time():
+                if favicon is NOT_CACHED:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                return favicon
+
+        entry = self._read(netloc)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                # Unless the icon was cached in the meantime
+                now = time.time()
+                if self._memory.get(netloc, (None, 0))[1] <= now:
+                    self._memory[netloc] = (
+                        NOT_CACHED, now + self.miss_ttl_seconds)
+                return None
+
+            self.disk_hits += 1
+            self._memory[netloc] = entry
+        return entry[0]
+
+    def set(self, netloc: str, favicon: Favicon) -> None:
+        if not self.enabled:
+            return
+
+        netloc = netloc.lower()
+        with self._lock:
+            self._memory[netloc] = (favicon, time.time() + self._ttl(favicon))
+        self._write(netloc, favicon)
+
+    def _read(self, netloc: str) -> Optional[Tuple[Favicon, float]]:
+        path = self._path(netloc)
+        try:
+            with open(path, 'rb') as f:
+                mimetype, _, data = f.read().partition(b'\n')
+            modified = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        favicon = Favicon(data, mimetype.decode())
+        expires = modified + self._ttl(favicon)
+        if expires <= time.time():
+            return None
+        return favicon, expires
+
+    def _write(self, netloc: str, favicon: Favicon) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Icons are written atomically, so that a partially written icon
+            # is never read (or left behind)
+            write_atomic(
+                self._path(netloc),
+                favicon.mimetype.encode() + b'\n' + favicon.data)
+        except OSError:
+            # The in-memory cache still applies
+            pass
+
+    def prune(self) -> int:
+        """Removes expired icons from disk
+
+        Returns:
+            int: The number of files removed
+        """
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        now = time.time()
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                # Only the age of missing icons is known without reading the
+                # file, so other icons are kept until the full TTL passes
+                age = now - os.path.getmtime(path)
+                if (age > self.ttl_seconds or
+                        (age > self.negative_ttl_seconds and
+                         os.path.getsize(path) <= 1)):
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._memory) if self.enabled else 0,
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
@@ -1,3 +1,4 @@
+import asyncio
 import threading
 import time
 from typing import Any, Dict, Optional, Tuple
@@ -61,6 +62,9 @@ class HttpxClient:
         self._cache = TTLCache(maxsize=cache_maxsize, ttl=cache_ttl_seconds)
         self._cache_lock = threading.Lock()
 
+        # The async client is only created once an async request is made
+        self._async_client: Optional[httpx.AsyncClient] = None
+
     def _determine_verify_setting(self):
         """Determine SSL verification setting from environment.
 
@@ -83,8 +87,11 @@ class HttpxClient:
 
         return True
 
-    def _build_client(self, client_kwargs: Dict[str, Any], verify: Any) -> httpx.Client:
-        """Construct httpx.Client with proxies and provided verify setting."""
+    def _build_client(self, client_kwargs: Dict[str, Any], verify: Any,
+                      client_cls=None):
+        """Construct httpx.Client (or httpx.AsyncClient) with proxies and
+        provided verify setting."""
+        client_cls = client_cls or httpx.Client
         kwargs = dict(client_kwargs)
         kwargs['verify'] = verify
         if self._proxies:
@@ -92,27 +99,27 @@ class HttpxClient:
             single_proxy = proxy_values[0] if proxy_values and all(v == proxy_values[0] for v in proxy_values) else None
             if single_proxy:
                 try:
-                    return httpx.Client(proxy=single_proxy, **kwargs)
+                    return client_cls(proxy=single_proxy, **kwargs)
                 except TypeError:
                     try:
-                        return httpx.Client(proxies=self._proxies, **kwargs)
+                        return client_cls(proxies=self._proxies, **kwargs)
                     except TypeError:
                         mounts: Dict[str, httpx.Proxy] = {}
                         for scheme_key, url in self._proxies.items():
                             prefix = f"{scheme_key}://"
                             mounts[prefix] = httpx.Proxy(url)
-                        return httpx.Client(mounts=mounts, **kwargs)
+                        return client_cls(mounts=mounts, **kwargs)
             else:
                 try:
-                    return httpx.Client(proxies=self._proxies, **kwargs)
+                    return client_cls(proxies=self._proxies, **kwargs)
                 except TypeError:
                     mounts: Dict[str, httpx.Proxy] = {}
                     for scheme_key, url in self._proxies.items():
                         prefix = f"{scheme_key}://"
                         mounts[prefix] = httpx.Proxy(url)
-                    return httpx.Client(mounts=mounts, **kwargs)
+                    return client_cls(mounts=mounts, **kwargs)
         else:
-            return httpx.Client(**kwargs)
+            return client_cls(**kwargs)
 
     @property
     def proxies(self) -> Dict[str, str]:
@@ -128,7 +135,8 @@ class HttpxClient:
             cookies: Optional[Dict[str, str]] = None,
             retries: int = 2,
             backoff_seconds: float = 0.5,
-            use_cache: bool = False) -> httpx.Response:
+            use_cache: bool = False,
+            timeout: Optional[float] = None) -> httpx.Response:
         if use_cache:
             key = self._cache_key('GET', url, headers)
             with self._cache_lock:
@@ -144,29 +152,17 @@ class HttpxClient:
                 if self._client.is_closed:
                     self._recreate_client()
                     
-                response = self._client.get(url, headers=headers, cookies=cookies)
+                # Use the client's timeout unless one is given
+                kwargs = {} if timeout is None else {'timeout': timeout}
+                response = self._client.get(url, headers=headers,
+                                            cookies=cookies, **kwargs)
                 if use_cache and response.status_code == 200:
                     with self._cache_lock:
                         self._cache[key] = response
                 return response
             except Exception as exc:
                 last_exc = exc
-                # Check for specific errors that require client recreation
-                should_recreate = False
-                
-                if isinstance(exc, (httpx.HTTPError, RuntimeError)):
-                    if "client has been closed" in str(exc).lower():
-                        should_recreate = True
-                
-                # Handle H2 protocol errors (connection state issues)
-                if H2ProtocolError and isinstance(exc, H2ProtocolError):
-                    should_recreate = True
-                
-                # Also check if the error message contains h2 protocol error info
-                if "ProtocolError" in str(exc) or "ConnectionState.CLOSED" in str(exc):
-                    should_recreate = True
-                
-                if should_recreate:
+                if self._should_recreate(exc):
                     self._recreate_client()
                     if attempt < retries:
                         time.sleep(backoff_seconds * (2 ** attempt))
@@ -186,6 +182,85 @@ class HttpxClient:
             raise last_exc
         raise httpx.HTTPError('Unknown HTTP error')
 
+    def stream(self,
+               url: str,
+               headers: Optional[Dict[str, str]] = None,
+               cookies: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """Sends a GET request without reading the response body, so that it
+        can be read in chunks (e.g. with iter_bytes). The response must be
+        closed once it's no longer needed.
+        """
+        if self._client.is_closed:
+            self._recreate_client()
+
+        request = self._client.build_request(
+            'GET', url, headers=headers, cookies=cookies)
+        return self._client.send(request, stream=True)
+
+    async def aget(self,
+                   url: str,
+                   headers: Optional[Dict[str, str]] = None,
+                   cookies: Optional[Dict[str, str]] = None,
+                   retries: int = 2,
+                   backoff_seconds: float = 0.5,
+                   use_cache: bool = False) -> httpx.Response:
+        """Async variant of get, using a shared httpx.AsyncClient. Retries
+        back off with asyncio.sleep, rather than blocking the calling thread.
+        """
+        if use_cache:
+            key = self._cache_key('GET', url, headers)
+            with self._cache_lock:
+                cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+
+        attempt = 0
+        while True:
+            try:
+                if self._async_client is None or self._async_client.is_closed:
+                    self._async_client = self._build_async_client()
+
+                response = await self._async_client.get(
+                    url, headers=headers, cookies=cookies)
+                if use_cache and response.status_code == 200:
+                    with self._cache_lock:
+                        self._cache[key] = response
+                return response
+            except Exception as exc:
+                if attempt >= retries:
+                    raise
+
+                if (self._should_recreate(exc) and
+                        self._async_client is not None):
+                    await self._async_client.aclose()
+                    self._async_client = None
+
+                await asyncio.sleep(backoff_seconds * (2 ** attempt))
+                attempt += 1
+
+    @staticmethod
+    def _should_recreate(exc: Exception) -> bool:
+        """Checks for errors that require the client to be recreated"""
+        if isinstance(exc, (httpx.HTTPError, RuntimeError)):
+            if "client has been closed" in str(exc).lower():
+                return True
+
+        # Handle H2 protocol errors (connection state issues)
+        if H2ProtocolError and isinstance(exc, H2ProtocolError):
+            return True
+
+        # Also check if the error message contains h2 protocol error info
+        return "ProtocolError" in str(exc) or "ConnectionState.CLOSED" in str(exc)
+
+    def _build_async_client(self) -> httpx.AsyncClient:
+        """Construct httpx.AsyncClient with the same configuration (and
+        verify setting) as the sync client."""
+        client_kwargs = dict(timeout=self._timeout_seconds,
+                             follow_redirects=True,
+                             http2=self._http2)
+        return self._build_client(client_kwargs, self._verify,
+                                  client_cls=httpx.AsyncClient)
+
     def _recreate_client(self) -> None:
         """Recreate the HTTP client when it has been closed."""
         try:
@@ -216,4 +291,9 @@ class HttpxClient:
     def close(self) -> None:
         self._client.close()
 
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
 
@@ -1,10 +1,25 @@
 import os
-from typing import Dict, Tuple
+import threading
+from typing import Dict, Optional, Tuple
 
+from app.services.concurrency import LatestRequests, SingleFlight, \
+    UpstreamLimiter
+from app.services.element_table import ElementTable
 from app.services.http_client import HttpxClient
+from app.services.result_cache import ResultCache
+from app.services.tor_controller import TorController
 
 
 _clients: Dict[tuple, HttpxClient] = {}
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+_page_cache: Optional[ResultCache] = None
+_autocomplete_cache: Optional[ResultCache] = None
+_element_table: Optional[ElementTable] = None
+_single_flight = SingleFlight()
+_autocomplete_requests = LatestRequests()
+_upstream_limiter: Optional[UpstreamLimiter] = None
+_tor_controller: Optional[TorController] = None
 
 
 def _proxies_key(proxies: Dict[str, str]) -> Tuple[Tuple[str, str], Tuple[str, str]]:
@@ -38,3 +53,103 @@ def close_all_clients() -> None:
     _clients.clear()
 
 
+async def aclose_all_clients() -> None:
+    for client in list(_clients.values()):
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+
+def get_result_cache() -> ResultCache:
+    """Returns the shared search result cache, sized by
+    WHOOGLE_RESULT_CACHE_SIZE (entries) and WHOOGLE_RESULT_CACHE_TTL (seconds)
+    """
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                maxsize=int(os.environ.get('WHOOGLE_RESULT_CACHE_SIZE', '64')),
+                ttl_seconds=int(os.environ.get('WHOOGLE_RESULT_CACHE_TTL', '300')))
+    return _result_cache
+
+
+def get_page_cache() -> ResultCache:
+    """Returns the shared cache of rendered results pages, sized by
+    WHOOGLE_PAGE_CACHE_SIZE (entries) and WHOOGLE_PAGE_CACHE_TTL (seconds)
+    """
+    global _page_cache
+    with _result_cache_lock:
+        if _page_cache is None:
+            _page_cache = ResultCache(
+                maxsize=int(os.environ.get('WHOOGLE_PAGE_CACHE_SIZE', '32')),
+                ttl_seconds=int(os.environ.get('WHOOGLE_PAGE_CACHE_TTL', '300')))
+    return _page_cache
+
+
+def get_autocomplete_cache() -> ResultCache:
+    """Returns the shared cache of search suggestions, sized by
+    WHOOGLE_AUTOCOMPLETE_CACHE_SIZE (entries) and
+    WHOOGLE_AUTOCOMPLETE_CACHE_TTL (seconds)
+    """
+    global _autocomplete_cache
+    with _result_cache_lock:
+        if _autocomplete_cache is None:
+            _autocomplete_cache = ResultCache(
+                maxsize=int(
+                    os.environ.get('WHOOGLE_AUTOCOMPLETE_CACHE_SIZE', '1024')),
+                ttl_seconds=int(
+                    os.environ.get('WHOOGLE_AUTOCOMPLETE_CACHE_TTL', '600')))
+    return _autocomplete_cache
+
+
+def get_element_table() -> ElementTable:
+    """Returns the shared table of results page element URLs, sized by
+    WHOOGLE_ELEMENT_TABLE_SIZE (entries) and WHOOGLE_ELEMENT_TABLE_TTL
+    (seconds)
+    """
+    global _element_table
+    with _result_cache_lock:
+        if _element_table is None:
+            _element_table = ElementTable(
+                maxsize=int(os.environ.get('WHOOGLE_ELEMENT_TABLE_SIZE', '0')),
+                ttl_seconds=int(
+                    os.environ.get('WHOOGLE_ELEMENT_TABLE_TTL', '3600')))
+    return _element_table
+
+
+def get_single_flight() -> SingleFlight:
+    """Returns the shared coalescer for identical in-flight searches"""
+    return _single_flight
+
+
+def get_autocomplete_requests() -> LatestRequests:
+    """Returns the shared tracker of each session's latest autocomplete
+    request
+    """
+    return _autocomplete_requests
+
+
+def get_upstream_limiter() -> UpstreamLimiter:
+    """Returns the shared limit on simultaneous requests to the search engine,
+    set by WHOOGLE_UPSTREAM_CONCURRENCY
+    """
+    global _upstream_limiter
+    with _result_cache_lock:
+        if _upstream_limiter is None:
+            _upstream_limiter = UpstreamLimiter(
+                int(os.environ.get('WHOOGLE_UPSTREAM_CONCURRENCY', '16')))
+    return _upstream_limiter
+
+
+def get_tor_controller() -> TorController:
+    """Returns the shared Tor control port connection, which revalidates the
+    Tor connection every WHOOGLE_TOR_CHECK_INTERVAL seconds
+    """
+    global _tor_controller
+    with _result_cache_lock:
+        if _tor_controller is None:
+            _tor_controller = TorController(
+                check_interval=int(
+                    os.environ.get('WHOOGLE_TOR_CHECK_INTERVAL', '300')))
+    return _tor_controller
@@ -0,0 +1,134 @@
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from cachetools import TTLCache
+
+from app.utils.tokens import ELEMENT_ID_PREFIX, TOKEN_RE
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a per-entry TTL, shared across users.
+
+    Entries are evicted least-recently-used first once the cache is full, and
+    expire after the configured TTL. Hit/miss counters are kept for
+    monitoring. A cache with a size or TTL of 0 is disabled.
+    """
+
+    def __init__(self, maxsize: int = 64, ttl_seconds: int = 300) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl_seconds, 1))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._cache) if self.enabled else 0,
+                'maxsize': self.maxsize,
+                'ttl': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class PageTemplate:
+    """A rendered results page with its per-session values cut out, so that
+    it can be cached and served to other users.
+
+    Encrypted paths (/element?url= tokens and internal search links) are
+    re-encrypted for each request, and the user's preferences token is
+    substituted back in, without running the page through the filter again.
+    """
+    def __init__(self, page: str, paths: Dict[str, str],
+                 preferences: str = '') -> None:
+        """
+        Args:
+            page: The rendered results page
+            paths: The encrypted tokens in the page, mapped to their
+                   decrypted paths
+            preferences: The preferences token used while rendering the page
+        """
+        pattern = TOKEN_RE
+        if preferences:
+            pattern = re.compile(
+                f'{TOKEN_RE.pattern}|{re.escape(preferences)}')
+
+        # Alternating literal text and slots, where a slot is either a path
+        # to encrypt (and whether it's an element ID) or None for the
+        # preferences token
+        self._parts: List[Any] = []
+        self._slots = 0
+        pos = 0
+        for match in pattern.finditer(page):
+            value = match.group(0)
+            if value == preferences:
+                slot = None
+            elif value in paths:
+                slot = (paths[value], value.startswith(ELEMENT_ID_PREFIX))
+            else:
+                # Not one of this page's tokens, leave it as-is
+                continue
+
+            self._parts += [page[pos:match.start()], slot]
+            self._slots += 1
+            pos = match.end()
+        self._parts.append(page[pos:])
+
+    def __len__(self) -> int:
+        return self._slots
+
+    def render(self, encrypt: Callable[[str], str],
+               preferences: str = '',
+               add_element: Optional[Callable[[str], str]] = None) -> str:
+        """Fills the page back in for the current request
+
+        Args:
+            encrypt: Encrypts a path with the current session key
+            preferences: The current user's preferences token
+            add_element: Creates an element ID for a path, for pages that
+                         were rendered with element IDs (see ElementTable)
+
+        Returns:
+            str: The results page
+        """
+        add_element = add_element or encrypt
+        page = []
+        for idx, part in enumerate(self._parts):
+            if idx % 2 == 0:
+                page.append(part)
+            elif part is None:
+                page.append(preferences)
+            else:
+                path, is_element = part
+                page.append(add_element(path) if is_element else encrypt(path))
+        return ''.join(page)
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+from typing import Dict, List
+
+
+class SessionJanitor:
+    """Removes invalid session files from the session directory in the
+    background, rather than scanning the directory on every request.
+
+    Each run examines at most `batch_size` files, continuing from where the
+    previous run stopped, so a large session directory is worked through over
+    several runs instead of in one burst of disk I/O.
+    """
+
+    def __init__(self, session_dir: str, max_session_size: int,
+                 interval_seconds: int = 300, batch_size: int = 500) -> None:
+        self.session_dir = session_dir
+        self.max_session_size = max_session_size
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.files_reaped = 0
+        self.runs = 0
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_seconds > 0
+
+    def run_once(self) -> int:
+        """Examines the next batch of session files, and removes the ones
+        that aren't valid sessions
+
+        Returns:
+            int: The number of files removed
+        """
+        with self._lock:
+            if not self._pending:
+                try:
+                    self._pending = sorted(os.listdir(self.session_dir))
+                except FileNotFoundError:
+                    self._pending = []
+
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+
+        reaped = 0
+        for user_session in batch:
+            file_path = os.path.join(self.session_dir, user_session)
+            if self._is_invalid(file_path):
+                try:
+                    os.remove(file_path)
+                    reaped += 1
+                except FileNotFoundError:
+                    # Don't throw error if the invalid session has been removed
+                    pass
+
+        with self._lock:
+            self.files_reaped += reaped
+            self.runs += 1
+        return reaped
+
+    def _is_invalid(self, file_path: str) -> bool:
+        try:
+            # Ignore files that are larger than the max session file size
+            if os.path.getsize(file_path) > self.max_session_size:
+                return False
+
+            with open(file_path, 'r', encoding='utf-8') as session_file:
+                data = json.load(session_file)
+                return not (isinstance(data, dict) and 'valid' in data)
+        except Exception:
+            # Broad exception handling here due to how instances installed
+            # with pip seem to have issues storing unrelated files in the
+            # same directory as sessions
+            return False
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='session-janitor',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                pass
+
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'files_reaped': self.files_reaped,
+                'runs': self.runs,
+                'pending': len(self._pending),
+            }
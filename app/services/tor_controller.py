@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from stem import Signal, SocketError
+from stem.connection import AuthenticationFailure, authenticate_cookie, \
+    authenticate_password
+from stem.control import Controller
+
+from app.utils.misc import read_config_bool
+
+COOKIE_PATH = '/var/lib/tor/control_auth_cookie'
+
+
+class TorController:
+    """Keeps a single authenticated connection to the Tor control port,
+    shared across requests, along with the last known state of the Tor
+    connection.
+
+    A successful validation of the Tor connection is trusted for
+    `check_interval` seconds (0 validates every time), and NEWNYM signals are
+    sent at most once every `newnym_interval` seconds, since Tor doesn't build
+    new circuits any more often than that. Callers that need a new identity
+    should wait for `newnym_wait` seconds before signalling.
+    """
+
+    def __init__(self, port: int = 9051, check_interval: int = 300,
+                 newnym_interval: int = 10) -> None:
+        self.port = port
+        self.check_interval = check_interval
+        self.newnym_interval = newnym_interval
+        self.connects = 0
+        self.validations = 0
+        self.newnym_sent = 0
+        self.newnym_skipped = 0
+        self._controller: Optional[Controller] = None
+        self._last_newnym: Optional[float] = None
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def _connect(self) -> Controller:
+        controller = Controller.from_port(port=self.port)
+        try:
+            if read_config_bool('WHOOGLE_TOR_USE_PASS'):
+                confloc = './misc/tor/control.conf'
+                # Check that the custom location of conf is real.
+                temp = os.getenv('WHOOGLE_TOR_CONF', '')
+                if os.path.isfile(temp):
+                    confloc = temp
+
+                with open(confloc, "r") as conf:
+                    # Scan for the last line of the file.
+                    for line in conf:
+                        pass
+                    secret = line.strip('\n')
+                authenticate_password(controller, password=secret)
+            else:
+                authenticate_cookie(controller, cookie_path=COOKIE_PATH)
+        except BaseException:
+            controller.close()
+            raise
+        return controller
+
+    def signal(self, signal: Signal) -> bool:
+        """Sends a signal to Tor, connecting to the control port first if
+        there isn't an open connection
+
+        Args:
+            signal: The signal to send
+
+        Returns:
+            bool: True if Tor is reachable, otherwise False
+        """
+        with self._lock:
+            try:
+                connected = False
+                if self._controller is None or not self._controller.is_alive():
+                    self._close()
+                    self._controller = self._connect()
+                    self.connects += 1
+                    connected = True
+
+                    # The connection was (re)established, so the state of the
+                    # Tor connection needs to be validated again
+                    self._valid_until = 0.0
+
+                if signal == Signal.HEARTBEAT and not connected:
+                    # The open, authenticated connection is proof enough
+                    return True
+
+                if signal == Signal.NEWNYM:
+                    now = time.monotonic()
+                    if (self._last_newnym is not None and
+                            now - self._last_newnym < self.newnym_interval):
+                        self.newnym_skipped += 1
+                        return True
+                    self._last_newnym = now
+                    self.newnym_sent += 1
+
+                self._controller.signal(signal)
+                return True
+            except (SocketError, AuthenticationFailure,
+                    ConnectionRefusedError, ConnectionError):
+                # TODO: Handle Tor authentication (password and cookie)
+                self._close()
+                return False
+
+    def newnym_wait(self) -> float:
+        """Returns the number of seconds until a NEWNYM signal would be sent
+        instead of skipped
+
+        Returns:
+            float: The remaining time, or 0 if a NEWNYM can be sent now
+        """
+        with self._lock:
+            if self._last_newnym is None:
+                return 0.0
+            return max(0.0, self._last_newnym + self.newnym_interval -
+                       time.monotonic())
+
+    def validate(self, check: Callable[[], bool]) -> bool:
+        """Checks that searches are being routed through Tor, reusing the
+        last successful result until it expires
+
+        Args:
+            check: Validates the Tor connection (e.g. with torproject.org)
+
+        Returns:
+            bool: True if the Tor connection is valid
+        """
+        if time.monotonic() < self._valid_until:
+            return True
+
+        with self._check_lock:
+            # Another thread may have just validated the connection
+            if time.monotonic() < self._valid_until:
+                return True
+
+            self.validations += 1
+            valid = check()
+            if valid and self.check_interval > 0:
+                self._valid_until = time.monotonic() + self.check_interval
+            return valid
+
+    def invalidate(self) -> None:
+        self._valid_until = 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._controller is not None:
+            try:
+                self._controller.close()
+            except Exception:
+                pass
+            self._controller = None
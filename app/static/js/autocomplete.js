@@ -2,10 +2,34 @@ let searchInput;
 let currentFocus;
 let originalSearch;
 let autocompleteResults;
+let autocompleteTimer;
+let autocompleteRequest;
+let autocompleteSeq = 0;
+
+// Requests are numbered from 1 on every page load, so each page load has its
+// own ID for the server to track the numbering by
+const autocompletePage = Math.random().toString(36).slice(2);
+
+// Delay (ms) after the last keystroke before fetching suggestions
+const AUTOCOMPLETE_DELAY = 150;
 
 const handleUserInput = () => {
+    clearTimeout(autocompleteTimer);
+    autocompleteTimer = setTimeout(fetchAutocomplete, AUTOCOMPLETE_DELAY);
+};
+
+const fetchAutocomplete = () => {
+    // Suggestions for an earlier query are out of date, so stop waiting for
+    // them. Requests are numbered so that the server can drop them too.
+    if (autocompleteRequest) {
+        autocompleteRequest.abort();
+    }
+
     let xhrRequest = new XMLHttpRequest();
-    xhrRequest.open("POST", "autocomplete");
+    autocompleteRequest = xhrRequest;
+    xhrRequest.open(
+        "POST",
+        "autocomplete?page=" + autocompletePage + "&seq=" + (++autocompleteSeq));
     xhrRequest.setRequestHeader("Content-type", "application/x-www-form-urlencoded");
     xhrRequest.onload = function () {
         if (xhrRequest.readyState === 4 && xhrRequest.status !== 200) {
@@ -1,12 +1,64 @@
+import bisect
 import json
+import marshal
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
 import httpx
 import urllib.parse as urlparse
 import os
 import glob
 
-bangs_dict = {}
+from app.utils.misc import write_atomic
+
 DDG_BANGS = 'https://duckduckgo.com/bang.js'
 
+# The max number of bang suggestions returned for a query
+MAX_BANG_SUGGESTIONS = 10
+
+# Parsed bangs are also saved next to the bang files in this format, so that
+# the json files only need to be parsed again once one of them changes
+SNAPSHOT_FILE = 'bangs.snapshot'
+SNAPSHOT_VERSION = 1
+
+
+class BangTable(NamedTuple):
+    """The loaded bangs, which are never modified once built. Reloading the
+    bangs builds a new table, which replaces the current one in a single
+    assignment.
+
+    Attributes:
+        bangs: The (url, suggestion) of each bang, by lowercase operator
+        operators: The operators, sorted for looking up suggestions by prefix
+        suggestions: The suggestions, in the same order as the operators
+    """
+    bangs: Mapping[str, tuple[str, str]]
+    operators: tuple[str, ...]
+    suggestions: tuple[str, ...]
+
+    @classmethod
+    def build(cls, bangs: dict) -> 'BangTable':
+        """Builds a table from bangs in the bang file format
+
+        Args:
+            bangs: The bang url and suggestion, by operator
+
+        Returns:
+            BangTable: The bang table
+        """
+        table = {}
+        for operator, bang in bangs.items():
+            table[operator.lower()] = (bang['url'], bang['suggestion'])
+        return cls.from_entries(sorted(table.items()))
+
+    @classmethod
+    def from_entries(cls, entries) -> 'BangTable':
+        return cls(MappingProxyType(dict(entries)),
+                   tuple(operator for operator, _ in entries),
+                   tuple(bang[1] for _, bang in entries))
+
+
+bang_table = BangTable.build({})
+
 
 def load_all_bangs(ddg_bangs_file: str, ddg_bangs: dict = {}):
     """Loads all the bang files in alphabetical order
@@ -14,16 +66,17 @@ def load_all_bangs(ddg_bangs_file: str, ddg_bangs: dict = {}):
     Args:
         ddg_bangs_file: The str path to the new DDG bangs json file
         ddg_bangs: The dict of ddg bangs. If this is empty, it will load the
-                   bangs from the file
+                   bangs from the file (or from the snapshot of the bang
+                   files, if they haven't changed)
 
     Returns:
         None
 
     """
-    global bangs_dict
+    global bang_table
     ddg_bangs_file = os.path.normpath(ddg_bangs_file)
 
-    if (bangs_dict and not ddg_bangs) or os.path.getsize(ddg_bangs_file) <= 4:
+    if (bang_table.bangs and not ddg_bangs) or os.path.getsize(ddg_bangs_file) <= 4:
         return
 
     bangs = {}
@@ -36,11 +89,20 @@ def load_all_bangs(ddg_bangs_file: str, ddg_bangs: dict = {}):
     # Move the ddg bangs file to the beginning
     bang_files = sorted([f for f in bang_files if f != ddg_bangs_file])
 
+    snapshot_file = os.path.join(bangs_dir, SNAPSHOT_FILE)
+    signature = _bang_files_signature([ddg_bangs_file] + bang_files)
+    if not ddg_bangs:
+        table = _read_snapshot(snapshot_file, signature)
+        if table is not None:
+            bang_table = table
+            return
+
     if ddg_bangs:
         bangs |= ddg_bangs
     else:
         bang_files.insert(0, ddg_bangs_file)
 
+    complete = True
     for i, bang_file in enumerate(bang_files):
         try:
             with open(bang_file, 'r', encoding='utf-8') as f:
@@ -50,28 +112,70 @@ def load_all_bangs(ddg_bangs_file: str, ddg_bangs: dict = {}):
             # occur if file is still being written
             if i != 0:
                 raise
+            complete = False
 
-    bangs_dict = dict(sorted(bangs.items()))
+    bang_table = BangTable.build(bangs)
+    if complete:
+        _write_snapshot(snapshot_file, signature, bang_table)
 
 
-def gen_bangs_json(bangs_file: str) -> None:
-    """Generates a json file from the DDG bangs list
+def set_bangs(bangs: dict) -> None:
+    """Replaces the available bangs
 
     Args:
-        bangs_file: The str path to the new DDG bangs json file
+        bangs: The dict of bangs, by operator
 
     Returns:
         None
 
     """
-    # Request full list from DDG
-    r = httpx.get(DDG_BANGS)
-    r.raise_for_status()
+    global bang_table
+    bang_table = BangTable.build(bangs)
 
-    # Convert to json
-    data = json.loads(r.text)
 
-    # Set up a json object (with better formatting) for all available bangs
+def _bang_files_signature(bang_files: list[str]) -> tuple:
+    signature = []
+    for bang_file in bang_files:
+        stat = os.stat(bang_file)
+        signature.append((os.path.basename(bang_file),
+                          stat.st_mtime_ns,
+                          stat.st_size))
+    return tuple(signature)
+
+
+def _read_snapshot(snapshot_file: str, signature: tuple) -> Optional[BangTable]:
+    try:
+        with open(snapshot_file, 'rb') as f:
+            version, snapshot_signature, entries = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if version != SNAPSHOT_VERSION or snapshot_signature != signature:
+        return None
+    return BangTable.from_entries(entries)
+
+
+def _write_snapshot(snapshot_file: str, signature: tuple,
+                    table: BangTable) -> None:
+    entries = tuple(table.bangs.items())
+    try:
+        write_atomic(snapshot_file,
+                     marshal.dumps((SNAPSHOT_VERSION, signature, entries)))
+    except OSError:
+        # The snapshot only speeds up loading
+        pass
+
+
+def parse_ddg_bangs(data: list) -> dict:
+    """Converts the DDG bangs list to the bang file format
+
+    Args:
+        data: The decoded DDG bang.js list
+
+    Returns:
+        dict: The bang url and suggestion, by operator
+
+    """
     bangs_data = {}
 
     for row in data:
@@ -81,24 +185,55 @@ def gen_bangs_json(bangs_file: str) -> None:
             'suggestion': bang_command + ' (' + row['s'] + ')'
         }
 
-    with open(bangs_file, 'w', encoding='utf-8') as f:
-        json.dump(bangs_data, f)
+    return bangs_data
+
+
+def gen_bangs_json(bangs_file: str, timeout: float = 30.0) -> None:
+    """Generates a json file from the DDG bangs list
+
+    Args:
+        bangs_file: The str path to the new DDG bangs json file
+        timeout: The max seconds to wait for the DDG bangs list
+
+    Returns:
+        None
+
+    """
+    # Request full list from DDG
+    r = httpx.get(DDG_BANGS, timeout=timeout)
+    r.raise_for_status()
+
+    # Set up a json object (with better formatting) for all available bangs
+    bangs_data = parse_ddg_bangs(json.loads(r.text))
+
+    write_atomic(bangs_file, json.dumps(bangs_data).encode('utf-8'))
     print('* Finished creating ddg bangs json')
     load_all_bangs(bangs_file, bangs_data)
 
 
-def suggest_bang(query: str) -> list[str]:
+def suggest_bang(query: str, limit: int = MAX_BANG_SUGGESTIONS) -> list[str]:
     """Suggests bangs for a user's query
 
     Args:
         query: The search query
+        limit: The max number of suggestions to return
 
     Returns:
-        list[str]: A list of bang suggestions
+        list[str]: A list of bang suggestions, in alphabetical order of the
+                   bang operator
 
     """
-    global bangs_dict
-    return [bangs_dict[_]['suggestion'] for _ in bangs_dict if _.startswith(query)]
+    table = bang_table
+    query = query.lower()
+
+    # Operators starting with the query are adjacent in the sorted index, so
+    # the first match is found with a binary search
+    start = bisect.bisect_left(table.operators, query)
+    end = start
+    while (end < len(table.operators) and end - start < limit and
+           table.operators[end].startswith(query)):
+        end += 1
+    return list(table.suggestions[start:end])
 
 
 def resolve_bang(query: str) -> str:
@@ -112,39 +247,34 @@ def resolve_bang(query: str) -> str:
              wasn't a match or didn't contain a bang operator
 
     """
-    global bangs_dict
-
     #if ! not in query simply return (speed up processing)
     if '!' not in query:
         return ''
 
+    bangs = bang_table.bangs
     split_query = query.strip().split(' ')
 
-    # look for operator in query if one is found, list operator should be of
-    # length 1, operator should not be case-sensitive here to remove it later
-    operator = [
-        word
-        for word in split_query
-        if word.lower() in bangs_dict
-    ]
-    if len(operator) == 1:
-        # get operator
-        operator = operator[0]
-
-        # removes operator from query
-        split_query.remove(operator)
-
-        # rebuild the query string
-        bang_query = ' '.join(split_query).strip()
-
-        # Check if operator is a key in bangs and get bang if exists
-        bang = bangs_dict.get(operator.lower(), None)
-        if bang:
-            bang_url = bang['url']
-
-            if bang_query:
-                return bang_url.replace('{}', bang_query, 1)
-            else:
-                parsed_url = urlparse.urlparse(bang_url)
-                return f'{parsed_url.scheme}://{parsed_url.netloc}'
-    return ''
+    # look for the operator in the query, in a single pass. There should only
+    # be one, and operators aren't case-sensitive.
+    bang = None
+    operator_idx = -1
+    for idx, word in enumerate(split_query):
+        if word.lower() in bangs:
+            if bang is not None:
+                return ''
+            bang = bangs[word.lower()]
+            operator_idx = idx
+
+    if bang is None:
+        return ''
+
+    # rebuild the query string without the operator
+    bang_query = ' '.join(
+        split_query[:operator_idx] + split_query[operator_idx + 1:]).strip()
+
+    bang_url = bang[0]
+    if bang_query:
+        return bang_url.replace('{}', bang_query, 1)
+    else:
+        parsed_url = urlparse.urlparse(bang_url)
+        return f'{parsed_url.scheme}://{parsed_url.netloc}'
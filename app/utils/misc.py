@@ -1,18 +1,26 @@
 import base64
+import functools
 import hashlib
 import contextlib
 import io
 import os
 import re
+import tempfile
 
 import httpx
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup as bsoup
-from cryptography.fernet import Fernet
+from bs4 import FeatureNotFound
 from flask import Request
 
+from app.utils.tokens import get_cipher
+
 ddg_favicon_site = 'http://icons.duckduckgo.com/ip2'
 
+# Supported BeautifulSoup tree builders, see WHOOGLE_HTML_PARSER
+HTML_PARSERS = ['html.parser', 'lxml', 'html5lib']
+DEFAULT_HTML_PARSER = 'html.parser'
+
 empty_gif = base64.b64decode(
     'R0lGODlhAQABAIAAAP///////yH5BAEKAAEALAAAAAABAAEAAAICTAEAOw==')
 
@@ -47,6 +55,59 @@ def fetch_favicon(url: str) -> bytes:
     return placeholder_img
 
 
+@functools.cache
+def html_parser_available(parser: str) -> bool:
+    """Checks if a BeautifulSoup tree builder can be used (lxml and html5lib
+    are optional dependencies)
+
+    Args:
+        parser: The name of the tree builder
+
+    Returns:
+        bool: True/False indicating if the tree builder is installed
+    """
+    try:
+        bsoup('', parser)
+        return True
+    except FeatureNotFound:
+        print(f'Warning: HTML parser "{parser}" is not installed, '
+              f'falling back to {DEFAULT_HTML_PARSER}')
+        return False
+
+
+def get_html_parser() -> str:
+    """Returns the tree builder to use for parsing full pages, as configured
+    by WHOOGLE_HTML_PARSER. Falls back to the built-in html.parser if the
+    configured parser is unknown or not installed.
+
+    Returns:
+        str: The name of the tree builder
+    """
+    parser = os.getenv('WHOOGLE_HTML_PARSER', DEFAULT_HTML_PARSER).lower()
+    if parser not in HTML_PARSERS or not html_parser_available(parser):
+        return DEFAULT_HTML_PARSER
+    return parser
+
+
+def parse_html(markup='', fragment=False, parser='') -> bsoup:
+    """Parses html into a BeautifulSoup tree using the configured parser
+
+    Args:
+        markup: The html (string or file) to parse
+        fragment: Whether the markup is a partial snippet meant to be
+                  inserted into another tree. Fragments are always parsed
+                  with html.parser, since lxml and html5lib wrap them in
+                  <html> and <body> elements.
+        parser: Optional tree builder to use instead of the configured one
+
+    Returns:
+        BeautifulSoup: The parsed tree
+    """
+    if fragment:
+        parser = DEFAULT_HTML_PARSER
+    return bsoup(markup, parser or get_html_parser())
+
+
 def gen_file_hash(path: str, static_file: str) -> str:
     with open(os.path.join(path, static_file), 'rb') as f:
         file_contents = f.read()
@@ -56,6 +117,31 @@ def gen_file_hash(path: str, static_file: str) -> str:
     return f'{filename_split[0]}.{file_hash}{filename_split[-1]}'
 
 
+def write_atomic(path: str, data: bytes) -> None:
+    """Writes a file by renaming a complete temp file over it, so that it's
+    never read while partially written
+
+    Args:
+        path: The str path of the file
+        data: The file contents
+
+    Returns:
+        None
+
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 def read_config_bool(var: str, default: bool=False) -> bool:
     val = os.getenv(var, '1' if default else '0')
     # user can specify one of the following values as 'true' inputs (all
@@ -99,7 +185,7 @@ def check_for_update(version_url: str, current: str) -> int:
     # Check for the latest version of Whoogle
     has_update = ''
     with contextlib.suppress(httpx.RequestError, AttributeError):
-        update = bsoup(httpx.get(version_url).text, 'html.parser')
+        update = parse_html(httpx.get(version_url).text)
         latest = update.select_one('[class="Link--primary"]').string[1:]
         current = int(''.join(filter(str.isdigit, current)))
         latest = int(''.join(filter(str.isdigit, latest)))
@@ -130,10 +216,8 @@ def list_to_dict(lst: list) -> dict:
 
 
 def encrypt_string(key: bytes, string: str) -> str:
-    cipher_suite = Fernet(key)
-    return cipher_suite.encrypt(string.encode()).decode()
+    return get_cipher(key).encrypt(string)
 
 
 def decrypt_string(key: bytes, string: str) -> str:
-    cipher_suite = Fernet(g.session_key)
-    return cipher_suite.decrypt(string.encode()).decode()
+    return get_cipher(key).decrypt(string)
@@ -1,15 +1,17 @@
 from app.models.config import Config
 from app.models.endpoint import Endpoint
-from app.utils.misc import list_to_dict
+from app.utils.misc import list_to_dict, parse_html
 from bs4 import BeautifulSoup, NavigableString, MarkupResemblesLocatorWarning
 import warnings
 import copy
+import functools
 from flask import current_app
 import html
 import os
 import urllib.parse as urlparse
 from urllib.parse import parse_qs
 import re
+from typing import Callable
 warnings.filterwarnings('ignore', category=MarkupResemblesLocatorWarning)
 
 SKIP_ARGS = ['ref_src', 'utm']
@@ -31,8 +33,111 @@ BLACKLIST = [
     'Anúncio', 'Quảng cáo', 'โฆษณา', 'sponsored', 'patrocinado', 'gesponsert',
     'Sponzorováno', '스폰서', 'Gesponsord', 'Sponsorisé'
 ]
+BLACKLIST_UPPER = frozenset(value.upper() for value in BLACKLIST)
 
-SITE_ALTS = {
+
+class SiteAltIndex:
+    """An index of site alternatives by domain, for matching a link's host
+    (or any of its parent domains) with a single lookup per domain level,
+    rather than checking every configured site.
+    """
+
+    def __init__(self, site_alts: dict) -> None:
+        # Sites without an alternative are never swapped
+        self.alts = {site.lower(): alt for site, alt in site_alts.items()
+                     if alt}
+        self.pattern = None
+        if site_alts:
+            self.pattern = re.compile(
+                '|'.join([re.escape(site) for site in site_alts]))
+        self._prefixed = {}
+
+    def lookup(self, split_host: list) -> tuple[int, str] | None:
+        """Finds the most specific configured site for a host
+
+        Args:
+            split_host: The labels of the host (e.g. ['en', 'wikipedia',
+                        'org'])
+
+        Returns:
+            tuple: The number of trailing labels that matched the site, and
+                   the site's alternative, or None if there isn't one
+        """
+        labels = [_.lower() for _ in split_host]
+        if labels:
+            # Ignore the port, if any
+            labels[-1] = labels[-1].split(':', 1)[0]
+
+        for length in range(len(labels), min(len(labels), 2) - 1, -1):
+            alt = self.alts.get('.'.join(labels[-length:]))
+            if alt:
+                return length, alt
+        return None
+
+    def site_with_prefix(self, site: str) -> re.Pattern:
+        """Returns a pattern matching a site, including any leading www.,
+        mobile. or m. prefix
+        """
+        pattern = self._prefixed.get(site)
+        if pattern is None:
+            pattern = re.compile(rf'(?:(?:www|mobile|m)\.)?{re.escape(site)}')
+            self._prefixed[site] = pattern
+        return pattern
+
+
+class SiteAlts(dict):
+    """The map of sites to their alternatives, which keeps a SiteAltIndex
+    of itself. The index is rebuilt on first use after the map changes.
+    """
+
+    @property
+    def index(self) -> SiteAltIndex:
+        index = getattr(self, '_index', None)
+        if index is None:
+            index = self._index = SiteAltIndex(self)
+        return index
+
+    def _changed(self) -> None:
+        self._index = None
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._changed()
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self._changed()
+        return result
+
+    def clear(self) -> None:
+        super().clear()
+        self._changed()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def setdefault(self, *args):
+        result = super().setdefault(*args)
+        self._changed()
+        return result
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self._changed()
+
+
+SITE_ALTS = SiteAlts({
     'twitter.com': os.getenv('WHOOGLE_ALT_TW', 'farside.link/nitter'),
     'youtube.com': os.getenv('WHOOGLE_ALT_YT', 'farside.link/invidious'),
     'reddit.com': os.getenv('WHOOGLE_ALT_RD', 'farside.link/libreddit'),
@@ -45,12 +150,24 @@ SITE_ALTS = {
     'imdb.com': os.getenv('WHOOGLE_ALT_IMDB', 'farside.link/libremdb'),
     'quora.com': os.getenv('WHOOGLE_ALT_QUORA', 'farside.link/quetre'),
     'stackoverflow.com': os.getenv('WHOOGLE_ALT_SO', 'farside.link/anonymousoverflow')
-}
+})
 
 # Include custom site redirects from WHOOGLE_REDIRECTS
 SITE_ALTS.update(list_to_dict(re.split(',|:', os.getenv('WHOOGLE_REDIRECTS', ''))))
 
 
+@functools.lru_cache(maxsize=32)
+def _site_alts_index(site_alts: tuple) -> SiteAltIndex:
+    return SiteAltIndex(dict(site_alts))
+
+
+def site_alts_index(site_alts: dict) -> SiteAltIndex:
+    """Returns the index of a map of site alternatives"""
+    if isinstance(site_alts, SiteAlts):
+        return site_alts.index
+    return _site_alts_index(tuple(site_alts.items()))
+
+
 def contains_cjko(s: str) -> bool:
     """This function check whether or not a string contains Chinese, Japanese,
     or Korean characters. It employs regex and uses the u escape sequence to
@@ -72,54 +189,94 @@ def contains_cjko(s: str) -> bool:
     return bool(re.search(fr'[{unicode_ranges}]', s))
 
 
-def bold_search_terms(response: str, query: str) -> BeautifulSoup:
+def bold_search_terms(response: str | BeautifulSoup,
+                      query: str) -> BeautifulSoup:
     """Wraps all search terms in bold tags (<b>). If any terms are wrapped
     in quotes, only that exact phrase will be made bold.
 
     Args:
-        response: The initial response body for the query
+        response: The initial response body for the query, either as a
+                  string or an already parsed soup (modified in place)
         query: The original search query
 
     Returns:
         BeautifulSoup: modified soup object with bold items
     """
-    response = BeautifulSoup(response, 'html.parser')
+    if isinstance(response, str):
+        response = parse_html(response)
+
+    pattern = search_terms_pattern(query)
+    if pattern is None:
+        return response
+
+    # Every term is matched in a single pass over the text nodes, and the
+    # matches are split out into <b> tags in place
+    for element in response.find_all(string=pattern):
+        if (type(element) is not NavigableString or
+                (element.parent and element.parent.name == 'style')):
+            continue
 
-    def replace_any_case(element: NavigableString, target_word: str) -> None:
-        # Replace all instances of the word, but maintaining the same case in
-        # the replacement
-        if len(element) == len(target_word):
-            return
+        parts = []
+        pos = 0
+        for match in pattern.finditer(element):
+            # Text that is only the search term is left as-is
+            if len(match.group()) == len(element):
+                continue
+
+            if match.start() > pos:
+                parts.append(NavigableString(element[pos:match.start()]))
+            bold = response.new_tag('b')
+            bold.string = match.group()
+            parts.append(bold)
+            pos = match.end()
+
+        if not parts:
+            continue
+        if pos < len(element):
+            parts.append(NavigableString(element[pos:]))
+        element.replace_with(*parts)
 
-        # Ensure target word is escaped for regex
-        target_word = re.escape(target_word)
+    return response
 
-        # Check if the word contains Chinese, Japanese, or Korean characters
-        if contains_cjko(target_word):
-            reg_pattern = fr'((?![{{}}<>-]){target_word}(?![{{}}<>-]))'
-        else:
-            reg_pattern = fr'\b((?![{{}}<>-]){target_word}(?![{{}}<>-]))\b'
 
-        if re.match(r'.*[@_!#$%^&*()<>?/\|}{~:].*', target_word) or (
-                element.parent and element.parent.name == 'style'):
-            return
+@functools.lru_cache(maxsize=256)
+def search_terms_pattern(query: str) -> re.Pattern | None:
+    """Builds a single case-insensitive regex matching any of a query's
+    search terms (or quoted phrases), preferring the longest
 
-        element.replace_with(BeautifulSoup(
-            re.sub(reg_pattern,
-                   r'<b>\1</b>',
-                   element,
-                   flags=re.I), 'html.parser')
-        )
+    Args:
+        query: The original search query
+
+    Returns:
+        Pattern: The compiled pattern, or None if the query has no terms
+    """
+    terms = {}
 
     # Split all words out of query, grouping the ones wrapped in quotes
     for word in re.split(r'\s+(?=[^"]*(?:"[^"]*"[^"]*)*$)', query):
         word = re.sub(r'[@_!#$%^&*()<>?/\|}{~:]+', '', word)
-        target = response.find_all(
-            string=re.compile(r'' + re.escape(word), re.I))
-        for nav_str in target:
-            replace_any_case(nav_str, word)
+        if len(word) > 2 and word.startswith('"') and word.endswith('"'):
+            word = word[1:-1]
+        if not word or word.lower() in terms:
+            continue
 
-    return response
+        # Ensure target word is escaped for regex
+        target_word = re.escape(word)
+
+        # Check if the word contains Chinese, Japanese, or Korean characters
+        if contains_cjko(target_word):
+            reg_pattern = fr'(?![{{}}<>-]){target_word}(?![{{}}<>-])'
+        else:
+            reg_pattern = fr'\b(?![{{}}<>-]){target_word}(?![{{}}<>-])\b'
+        terms[word.lower()] = reg_pattern
+
+    if not terms:
+        return None
+
+    # Longer terms go first, so that a phrase is bolded as a whole rather
+    # than as the words in it
+    return re.compile('|'.join(
+        terms[_] for _ in sorted(terms, key=len, reverse=True)), re.I)
 
 
 def has_ad_content(element: str) -> bool:
@@ -133,8 +290,7 @@ def has_ad_content(element: str) -> bool:
 
     """
     element_str = ''.join(filter(str.isalpha, element))
-    return (element_str.upper() in (value.upper() for value in BLACKLIST)
-            or 'ⓘ' in element)
+    return element_str.upper() in BLACKLIST_UPPER or 'ⓘ' in element
 
 
 def get_first_link(soup) -> str:
@@ -177,52 +333,51 @@ def get_site_alt(link: str, site_alts: dict = SITE_ALTS) -> str:
     # Need to replace full hostname with alternative to encapsulate
     # subdomains as well
     parsed_link = urlparse.urlparse(link)
-
-    # Extract subdomain separately from the domain+tld. The subdomain
-    # is used for wikiless translations.
     split_host = parsed_link.netloc.split('.')
-    subdomain = split_host[0] if len(split_host) > 2 else ''
-    hostname = '.'.join(split_host[-2:])
-
-    # The full scheme + hostname is used when comparing against the list of
-    # available alternative services, due to how Medium links are constructed.
-    # (i.e. for medium.com: "https://something.medium.com" should match,
-    # "https://medium.com/..." should match, but "philomedium.com" should not)
-    hostcomp = f'{parsed_link.scheme}://{hostname}'
-
-    for site_key in site_alts.keys():
-        site_alt = f'{parsed_link.scheme}://{site_key}'
-        if not hostname or site_alt not in hostcomp or not site_alts[site_key]:
-            continue
 
-        # Wikipedia -> Wikiless replacements require the subdomain (if it's
-        # a 2-char language code) to be passed as a URL param to Wikiless
-        # in order to preserve the language setting.
-        params = ''
-        if 'wikipedia' in hostname and len(subdomain) == 2:
-            hostname = f'{subdomain}.{hostname}'
-            params = f'?lang={subdomain}'
-        elif 'medium' in hostname and len(subdomain) > 0:
-            hostname = f'{subdomain}.{hostname}'
-
-        parsed_alt = urlparse.urlparse(site_alts[site_key])
-        link = link.replace(hostname, site_alts[site_key]) + params
-        # If a scheme is specified in the alternative, this results in a
-        # replaced link that looks like "https://http://altservice.tld".
-        # In this case, we can remove the original scheme from the result
-        # and use the one specified for the alt.
-        if parsed_alt.scheme:
-            link = '//'.join(link.split('//')[1:])
+    # Sites are matched against the host's parent domains from the most
+    # specific down to the domain+tld, so "https://something.medium.com"
+    # and "https://medium.com/..." match medium.com, but "philomedium.com"
+    # does not.
+    if not parsed_link.netloc:
+        return link
+    match = site_alts_index(site_alts).lookup(split_host)
+    if match is None:
+        return link
+    length, alt = match
+    hostname = '.'.join(split_host[-length:])
 
-        for prefix in SKIP_PREFIX:
-            if parsed_alt.scheme:
-                # If a scheme is specified, remove everything before the
-                # first occurence of it
-                link = f'{parsed_alt.scheme}{link.split(parsed_alt.scheme, 1)[-1]}'
-            else:
-                # Otherwise, replace the first occurrence of the prefix
-                link = link.replace(prefix, '//', 1)
-        break
+    # Extract subdomain separately from the matched site. The subdomain
+    # is used for wikiless translations.
+    subdomain = split_host[0] if len(split_host) > length else ''
+
+    # Wikipedia -> Wikiless replacements require the subdomain (if it's
+    # a 2-char language code) to be passed as a URL param to Wikiless
+    # in order to preserve the language setting.
+    params = ''
+    if 'wikipedia' in hostname and len(subdomain) == 2:
+        hostname = parsed_link.netloc
+        params = f'?lang={subdomain}'
+    elif 'medium' in hostname and len(subdomain) > 0:
+        hostname = parsed_link.netloc
+
+    parsed_alt = urlparse.urlparse(alt)
+    link = link.replace(hostname, alt) + params
+    # If a scheme is specified in the alternative, this results in a
+    # replaced link that looks like "https://http://altservice.tld".
+    # In this case, we can remove the original scheme from the result
+    # and use the one specified for the alt.
+    if parsed_alt.scheme:
+        link = '//'.join(link.split('//')[1:])
+
+    for prefix in SKIP_PREFIX:
+        if parsed_alt.scheme:
+            # If a scheme is specified, remove everything before the
+            # first occurence of it
+            link = f'{parsed_alt.scheme}{link.split(parsed_alt.scheme, 1)[-1]}'
+        else:
+            # Otherwise, replace the first occurrence of the prefix
+            link = link.replace(prefix, '//', 1)
 
     return link
 
@@ -270,7 +425,7 @@ def append_nojs(result: BeautifulSoup) -> None:
         None
 
     """
-    nojs_link = BeautifulSoup(features='html.parser').new_tag('a')
+    nojs_link = parse_html(fragment=True).new_tag('a')
     nojs_link['href'] = f'{Endpoint.window}?nojs=1&location=' + result['href']
     nojs_link.string = ' NoJS Link'
     result.append(nojs_link)
@@ -288,7 +443,7 @@ def append_anon_view(result: BeautifulSoup, config: Config) -> None:
         None
 
     """
-    av_link = BeautifulSoup(features='html.parser').new_tag('a')
+    av_link = parse_html(fragment=True).new_tag('a')
     nojs = 'nojs=1' if config.nojs else 'nojs=0'
     location = f'location={result["href"]}'
     av_link['href'] = f'{Endpoint.window}?{nojs}&{location}'
@@ -299,17 +454,18 @@ def append_anon_view(result: BeautifulSoup, config: Config) -> None:
     av_link['class'] = 'anon-view'
     result.append(av_link)
 
-def check_currency(response: str) -> dict:
+def check_currency(response: str | BeautifulSoup) -> dict:
     """Check whether the results have currency conversion
 
     Args:
-        response: Search query Result
+        response: Search query Result, either as a string or an already
+                  parsed soup
 
     Returns:
         dict: Consists of currency names and values
 
     """
-    soup = BeautifulSoup(response, 'html.parser')
+    soup = parse_html(response) if isinstance(response, str) else response
     currency_link = soup.find('a', {'href': 'https://g.co/gfd'})
     if currency_link:
         while 'class' not in currency_link.attrs or \
@@ -416,6 +572,161 @@ def add_currency_card(soup: BeautifulSoup,
     return soup
 
 
+# Whitespace that clean_text_spacing removes entirely: before a domain
+# extension ("weather .com"), after www/http/https ("www .example") and before
+# common punctuation
+TEXT_SPACING_RE = re.compile(
+    r'\s+(?=\.[a-zA-Z]{2,}\b|[,;:])|'
+    r'(?:(?<=\bwww)|(?<=\bhttp)|(?<=\bhttps))\s+(?=\.)')
+
+
+def clean_text_spacing(text: str) -> str:
+    """Clean up text spacing issues from HTML extraction.
+    
+    Args:
+        text: Text extracted from HTML that may have spacing issues
+        
+    Returns:
+        Cleaned text with proper spacing
+    """
+    if not text:
+        return text
+
+    # Remove spaces around domain names and before punctuation, then
+    # normalize the remaining whitespace to single spaces
+    # Examples: "weather .com" -> "weather.com", "www .example" ->
+    # "www.example", "a , b" -> "a, b"
+    return ' '.join(TEXT_SPACING_RE.sub('', text).split())
+
+
+def _external_href(href: str) -> str:
+    return href if href.startswith('http') else ''
+
+
+def get_json_results(soup: BeautifulSoup,
+                     get_href: Callable[[str], str] = None) -> list[dict]:
+    """Extracts a list of structured results from the filtered results page,
+    for use in the JSON search API
+
+    Args:
+        soup: The filtered search results
+        get_href: Resolves a link's href to the destination of the result, or
+                  an empty string if it isn't a result link. By default, only
+                  links starting with http are used (as they are).
+
+    Returns:
+        list[dict]: The results, each containing the result's href, text,
+                    title and content
+    """
+    if get_href is None:
+        get_href = _external_href
+
+    results = []
+    seen = set()
+
+    # Find all result containers (using known result classes)
+    result_divs = soup.find_all('div', class_=['ZINbbc', 'ezO2md'])
+
+    if result_divs:
+        # Process structured Google results with container divs
+        for div in result_divs:
+            # Find the first valid link in this result container
+            link = None
+            for a in div.find_all('a', href=True):
+                href = get_href(a['href'])
+                if href:
+                    link = a
+                    break
+
+            if not link:
+                continue
+
+            if href in seen:
+                continue
+
+            # Get all text from the result container, not just the link
+            text = clean_text_spacing(div.get_text(separator=' ', strip=True))
+            if not text:
+                continue
+
+            # Extract title and content separately
+            # Title is typically in an h3 tag, CVA68e span, or the main link text
+            title = ''
+            # First try h3 tag
+            h3_tag = div.find('h3')
+            if h3_tag:
+                title = clean_text_spacing(h3_tag.get_text(separator=' ', strip=True))
+            else:
+                # Try CVA68e class (common title class in Google results)
+                title_span = div.find('span', class_='CVA68e')
+                if title_span:
+                    title = clean_text_spacing(title_span.get_text(separator=' ', strip=True))
+                elif link:
+                    # Fallback to link text, but exclude URL breadcrumb
+                    title = clean_text_spacing(link.get_text(separator=' ', strip=True))
+
+            # Content is the description/snippet text
+            # Look for description/snippet elements
+            content = ''
+            # Common classes for snippets/descriptions in Google results
+            snippet_selectors = [
+                {'class_': 'VwiC3b'},   # Standard snippet
+                {'class_': 'FrIlee'},   # Alternative snippet class (common in current Google)
+                {'class_': 's'},        # Another snippet class
+                {'class_': 'st'},       # Legacy snippet class
+            ]
+
+            for selector in snippet_selectors:
+                snippet_elem = div.find('span', selector) or div.find('div', selector)
+                if snippet_elem:
+                    # Get text but exclude any nested links (like "Related searches")
+                    content = clean_text_spacing(snippet_elem.get_text(separator=' ', strip=True))
+                    # Only use if it's substantial content (not just the URL breadcrumb)
+                    if content and not content.startswith('www.') and '›' not in content:
+                        break
+                    else:
+                        content = ''
+
+            # If no specific content found, use text minus title as fallback
+            if not content and title:
+                # Try to extract content by removing title from full text
+                if text.startswith(title):
+                    content = text[len(title):].strip()
+                else:
+                    content = text
+            elif not content:
+                content = text
+
+            seen.add(href)
+            results.append({
+                'href': href,
+                'text': text,
+                'title': title,
+                'content': content
+            })
+    else:
+        # Fallback: extract links directly if no result containers found
+        for a in soup.find_all('a', href=True):
+            href = get_href(a['href'])
+            if not href:
+                continue
+            if href in seen:
+                continue
+            text = clean_text_spacing(a.get_text(separator=' ', strip=True))
+            if not text:
+                continue
+            seen.add(href)
+            # In fallback mode, the link text serves as both title and text
+            results.append({
+                'href': href,
+                'text': text,
+                'title': text,
+                'content': ''
+            })
+
+    return results
+
+
 def get_tabs_content(tabs: dict,
                      full_query: str,
                      search_type: str,
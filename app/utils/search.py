@@ -1,14 +1,16 @@
+import asyncio
 import os
 import re
 from typing import Any
 from app.filter import Filter
 from app.request import gen_query
-from app.utils.misc import get_proxy_host_url
+from app.utils.misc import get_proxy_host_url, parse_html
 from app.utils.results import get_first_link
+from app.utils.tokens import get_cipher
 from app.services.cse_client import CSEClient, cse_results_to_html
-from bs4 import BeautifulSoup as bsoup
-from cryptography.fernet import Fernet, InvalidToken
-from flask import g
+from bs4 import BeautifulSoup
+from cryptography.fernet import InvalidToken
+from flask import current_app, g, session
 
 TOR_BANNER = '<hr><h1 style="text-align: center">You are using Tor</h1><hr>'
 CAPTCHA = 'div class="g-recaptcha"'
@@ -34,17 +36,25 @@ def needs_https(url: str) -> bool:
     return (is_heroku and is_http) or (https_only and is_http)
 
 
-def has_captcha(results: str) -> bool:
+def has_captcha(results: str | BeautifulSoup) -> bool:
     """Checks to see if the search results are blocked by a captcha
 
     Args:
-        results: The search page html as a string
+        results: The search page html as a string, or the already parsed
+                 search page
 
     Returns:
         bool: True/False indicating if a captcha element was found
 
     """
-    return CAPTCHA in results
+    if isinstance(results, str):
+        return CAPTCHA in results
+
+    # Match the captcha div itself, as well as any (escaped) copy of its
+    # markup within the page text
+    return bool(
+        results.find('div', class_='g-recaptcha') or
+        results.find(string=lambda s: CAPTCHA in s))
 
 
 class Search:
@@ -55,8 +65,11 @@ class Search:
         request: the incoming flask request
         config: the current user config settings
         session_key: the flask user fernet key
+        structured: whether to return structured results (for the JSON
+                    search API) rather than a results page
     """
-    def __init__(self, request, config, session_key, cookies_disabled=False, user_request=None):
+    def __init__(self, request, config, session_key, cookies_disabled=False,
+                 user_request=None, structured=False):
         method = request.method
         self.request = request
         self.request_params = request.args if method == 'GET' else request.form
@@ -66,8 +79,10 @@ class Search:
         self.session_key = session_key
         self.query = ''
         self.widget = ''
+        self.encrypted_paths = {}
         self.cookies_disabled = cookies_disabled
         self.user_request = user_request
+        self.structured = structured
         self.search_type = self.request_params.get(
             'tbm') if 'tbm' in self.request_params else ''
 
@@ -100,7 +115,7 @@ class Search:
         else:
             # Attempt to decrypt if this is an internal link
             try:
-                q = Fernet(self.session_key).decrypt(q.encode()).decode()
+                q = get_cipher(self.session_key).decrypt(q)
             except InvalidToken:
                 pass
 
@@ -122,14 +137,87 @@ class Search:
                 self.query.lower()) else self.widget
         return self.query
 
-    def generate_response(self) -> str:
+    def page_cache_key(self) -> tuple:
+        """Builds the rendered page cache key for the current search. The key
+        covers everything that changes the filtered results page, aside from
+        the per-session values that are filled in when the page is served.
+
+        Returns:
+            tuple: The cache key
+
+        """
+        args = tuple(sorted(
+            (k, v) for k, v in self.request_params.to_dict(flat=True).items()
+            if k not in ('q', 'preferences')))
+
+        mobile = 'Android' in self.user_agent or 'iPhone' in self.user_agent
+        user_agent = ''
+        if os.environ.get('WHOOGLE_USE_CLIENT_USER_AGENT', '0') == '1':
+            user_agent = self.user_agent
+
+        return (self.query,
+                args,
+                tuple(sorted(self.config.get_attrs().items())),
+                get_proxy_host_url(self.request, self.request.url_root,
+                                   root=True),
+                mobile,
+                user_agent)
+
+    def generate_response(self) -> str | BeautifulSoup:
         """Generates a response for the user's query
 
         Returns:
-            str: A string response to the search query, in the form of a URL
-                 or string representation of HTML content.
+            str | BeautifulSoup | list[dict]: A URL to redirect to (for
+                 "feeling lucky" searches), or the filtered results page. The
+                 results page is returned as a parsed tree so that it can be
+                 post-processed without being parsed again. Structured
+                 searches return the list of results instead (see
+                 _structured_results).
 
         """
+        content_filter, root_url, mobile = self._new_filter()
+
+        if self.use_cse:
+            # Use Google Custom Search API
+            return self._generate_cse_response(content_filter, root_url, mobile)
+        
+        # Default: Use traditional scraping method
+        return self._generate_scrape_response(content_filter, root_url, mobile)
+
+    async def generate_response_async(self) -> str | BeautifulSoup:
+        """Async variant of generate_response. The upstream search is
+        awaited instead of blocking a worker thread, and the results are
+        filtered in a worker thread to keep the event loop free.
+
+        Returns:
+            str | BeautifulSoup: A URL to redirect to (for "feeling lucky"
+                 searches), or the filtered results page
+
+        """
+        if self.use_cse:
+            return await asyncio.to_thread(self.generate_response)
+
+        content_filter, _, _ = self._new_filter()
+        full_query = self._gen_full_query()
+
+        client = self.user_request or g.user_request
+        get_body = await client.send_async(query=full_query,
+                                           force_mobile=self.config.view_image,
+                                           user_agent=self.user_agent)
+
+        return await asyncio.to_thread(
+            self._filter_scrape_response, content_filter, full_query, get_body)
+
+    @property
+    def use_cse(self) -> bool:
+        """Checks if CSE (Custom Search Engine) should be used"""
+        return bool(
+            self.config.use_cse and
+            self.config.cse_api_key and
+            self.config.cse_id
+        )
+
+    def _new_filter(self) -> tuple:
         mobile = 'Android' in self.user_agent or 'iPhone' in self.user_agent
         # reconstruct url if X-Forwarded-Host header present
         root_url = get_proxy_host_url(
@@ -142,23 +230,21 @@ class Search:
                                 mobile=mobile,
                                 config=self.config,
                                 query=self.query,
-                                page_url=self.request.url)
-        
-        # Check if CSE (Custom Search Engine) should be used
-        use_cse = (
-            self.config.use_cse and 
-            self.config.cse_api_key and 
-            self.config.cse_id
-        )
-        
-        if use_cse:
-            # Use Google Custom Search API
-            return self._generate_cse_response(content_filter, root_url, mobile)
-        
-        # Default: Use traditional scraping method
-        return self._generate_scrape_response(content_filter, root_url, mobile)
+                                page_url=self.request.url,
+                                favicon_cache=current_app.services.get(
+                                    'favicon_cache'),
+                                session_id=session.get('uuid', ''))
+        self.encrypted_paths = content_filter.encrypted_paths
+        return content_filter, root_url, mobile
+
+    def _gen_full_query(self) -> str:
+        self.full_query = gen_query(self.query,
+                                    self.request_params,
+                                    self.config)
+        return self.full_query
     
-    def _generate_cse_response(self, content_filter: Filter, root_url: str, mobile: bool) -> str:
+    def _generate_cse_response(self, content_filter: Filter, root_url: str,
+                               mobile: bool) -> str | BeautifulSoup:
         """Generate response using Google Custom Search API
         
         Args:
@@ -167,7 +253,8 @@ class Search:
             mobile: Whether this is a mobile request
             
         Returns:
-            str: HTML response string
+            str | BeautifulSoup: "Feeling lucky" redirect URL, or the filtered
+                                 results tree
         """
         # Get pagination start index from request params
         start = int(self.request_params.get('start', 1))
@@ -202,7 +289,7 @@ class Search:
         self.full_query = self.query
         
         # Parse and filter the HTML
-        html_soup = bsoup(html_content, 'html.parser')
+        html_soup = parse_html(html_content)
         
         # Handle feeling lucky
         if self.feeling_lucky:
@@ -213,9 +300,10 @@ class Search:
         # Apply content filter (encrypts links, applies CSS, etc.)
         formatted_results = content_filter.clean(html_soup)
         
-        return str(formatted_results)
+        return formatted_results
     
-    def _generate_scrape_response(self, content_filter: Filter, root_url: str, mobile: bool) -> str:
+    def _generate_scrape_response(self, content_filter: Filter, root_url: str,
+                                  mobile: bool) -> str | BeautifulSoup:
         """Generate response using traditional HTML scraping
         
         Args:
@@ -224,13 +312,32 @@ class Search:
             mobile: Whether this is a mobile request
             
         Returns:
-            str: HTML response string
+            str | BeautifulSoup: "Feeling lucky" redirect URL, or the filtered
+                                 results tree
         """
-        full_query = gen_query(self.query,
-                               self.request_params,
-                               self.config)
-        self.full_query = full_query
+        full_query = self._gen_full_query()
+
+        client = self.user_request or g.user_request
+        get_body = client.send(query=full_query,
+                               force_mobile=self.config.view_image,
+                               user_agent=self.user_agent)
+
+        return self._filter_scrape_response(content_filter, full_query, get_body)
 
+    def _filter_scrape_response(self, content_filter: Filter, full_query: str,
+                                get_body) -> str | BeautifulSoup:
+        """Filters the response to a scraped search
+
+        Args:
+            content_filter: Filter instance for processing results
+            full_query: The query sent upstream
+            get_body: The upstream response
+
+        Returns:
+            str | BeautifulSoup | list[dict]: "Feeling lucky" redirect URL,
+                                 the filtered results tree, or the
+                                 structured results
+        """
         # force mobile search when view image is true and
         # the request is not already made by a mobile
         is_image_query = ('tbm=isch' in full_query) or ('udm=2' in full_query)
@@ -238,19 +345,19 @@ class Search:
         # to avoid Google returning only text/AI blocks.
         view_image = is_image_query
 
-        client = self.user_request or g.user_request
-        get_body = client.send(query=full_query,
-                               force_mobile=self.config.view_image,
-                               user_agent=self.user_agent)
+        if self.structured and not view_image:
+            return self._structured_results(content_filter, get_body.text)
 
         # Produce cleanable html soup from response
         get_body_safed = get_body.text.replace("&lt;","andlt;").replace("&gt;","andgt;")
-        html_soup = bsoup(get_body_safed, 'html.parser')
+        html_soup = parse_html(get_body_safed)
         
-        # Ensure we extract only the content within <html> if it exists
+        # Ensure we keep only the content within <html> if it exists
         # This prevents doctype declarations from appearing in the output
         if html_soup.html:
-            html_soup = html_soup.html
+            for node in [_ for _ in html_soup.contents
+                         if _ is not html_soup.html]:
+                node.extract()
 
         # Replace current soup if view_image is active
         if view_image:
@@ -258,7 +365,8 @@ class Search:
 
         # Indicate whether or not a Tor connection is active
         if (self.user_request or g.user_request).tor_valid:
-            html_soup.insert(0, bsoup(TOR_BANNER, 'html.parser'))
+            (html_soup.html or html_soup).insert(
+                0, parse_html(TOR_BANNER, fragment=True))
 
         formatted_results = content_filter.clean(html_soup)
         if self.feeling_lucky:
@@ -280,4 +388,32 @@ class Search:
                 continue
             link['href'] += param_str
 
-        return str(formatted_results)
+        return formatted_results
+
+    def _structured_results(self, content_filter: Filter,
+                            body: str) -> str | BeautifulSoup | list[dict]:
+        """Extracts structured results directly from the upstream results
+        page, without building a results page
+
+        Args:
+            content_filter: Filter instance for processing results
+            body: The upstream results page
+
+        Returns:
+            str | BeautifulSoup | list[dict]: "Feeling lucky" redirect URL,
+                 the results, or the unfiltered page if it's blocked by a
+                 captcha (so that the block is reported as usual)
+        """
+        html_soup = parse_html(body)
+        if has_captcha(html_soup):
+            return html_soup
+
+        results = content_filter.extract_results(html_soup)
+        if self.feeling_lucky:
+            if results:
+                return results[0]['href']
+
+            # Fall through to regular search if unable to find link
+            self.feeling_lucky = False
+
+        return results
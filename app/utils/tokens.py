@@ -0,0 +1,146 @@
+import base64
+import functools
+import os
+import re
+import sys
+
+from cryptography.exceptions import InvalidTag, UnsupportedAlgorithm
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# AES-GCM-SIV is only available in cryptography 42+ (and only works with
+# OpenSSL 3.2+, see aead_supported)
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCMSIV
+except ImportError:
+    AESGCMSIV = None
+
+# Supported URL token schemes, see WHOOGLE_URL_TOKEN_MODE
+TOKEN_MODES = ['fernet', 'aead']
+DEFAULT_TOKEN_MODE = 'fernet'
+
+# Fernet tokens always begin with the (base64 encoded) version byte 0x80
+FERNET_PREFIX = 'gAAAAA'
+AEAD_PREFIX = 'v2.'
+AEAD_NONCE_SIZE = 12
+
+# Element IDs aren't encrypted, but refer to URLs stored server-side (see
+# app/services/element_table.py)
+ELEMENT_ID_PREFIX = 'e.'
+
+# Matches tokens of any supported scheme, and element IDs, within a page
+TOKEN_RE = re.compile(r'gAAAAA[\w-]+=*|v2\.[\w-]+|e\.[\w-]{16}')
+
+
+@functools.lru_cache(maxsize=None)
+def aead_supported() -> bool:
+    """Checks (once) whether the cryptography backend supports AES-GCM-SIV,
+    which the 'aead' token mode needs
+
+    Returns:
+        bool: True/False indicating if 'aead' tokens can be used
+    """
+    try:
+        if AESGCMSIV is None:
+            raise UnsupportedAlgorithm('AES-GCM-SIV is not available')
+        AESGCMSIV(bytes(32)).encrypt(bytes(AEAD_NONCE_SIZE), b'', None)
+        return True
+    except UnsupportedAlgorithm:
+        print('Warning: AES-GCM-SIV is not supported by the installed '
+              'cryptography/OpenSSL (OpenSSL 3.2+ is required), so '
+              'WHOOGLE_URL_TOKEN_MODE=aead falls back to fernet tokens',
+              file=sys.stderr)
+        return False
+
+
+def is_token(value: str) -> bool:
+    """Checks if a value looks like an encrypted URL token (as opposed to a
+    plaintext URL or query)
+
+    Args:
+        value: The value to check
+
+    Returns:
+        bool: True/False indicating if the value is a token
+    """
+    return value.startswith((FERNET_PREFIX, AEAD_PREFIX))
+
+
+class TokenCipher:
+    """Encrypts the paths and queries embedded in results pages (element
+    URLs, internal search links, etc.) with a user's session key.
+
+    Tokens are either standard Fernet tokens ('fernet'), or shorter AES-GCM-SIV
+    tokens ('aead'), which are authenticated as well but take a single
+    primitive to create. Tokens of either scheme can be decrypted regardless of
+    the mode, so changing modes doesn't break pages that are already open.
+    """
+
+    def __init__(self, key: bytes | str,
+                 mode: str = DEFAULT_TOKEN_MODE) -> None:
+        if mode not in TOKEN_MODES:
+            raise ValueError(f'Unknown URL token mode: {mode}')
+
+        self.mode = mode
+        self._key = key
+        self._fernet = Fernet(key)
+
+    @functools.cached_property
+    def _aead(self) -> 'AESGCMSIV':
+        if not aead_supported():
+            raise UnsupportedAlgorithm('AES-GCM-SIV is not supported')
+
+        # The AEAD key is derived from the session key, rather than using the
+        # same key material for two different ciphers
+        return AESGCMSIV(HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b'whoogle url token',
+        ).derive(base64.urlsafe_b64decode(self._key)))
+
+    def encrypt(self, value: str) -> str:
+        if self.mode == 'fernet':
+            return self._fernet.encrypt(value.encode()).decode()
+
+        nonce = os.urandom(AEAD_NONCE_SIZE)
+        token = nonce + self._aead.encrypt(nonce, value.encode(), None)
+        return AEAD_PREFIX + base64.urlsafe_b64encode(
+            token).decode().rstrip('=')
+
+    def decrypt(self, token: str) -> str:
+        """Decrypts a token of either scheme
+
+        Raises:
+            InvalidToken: The token is malformed, or wasn't created with this
+                          key
+        """
+        if not token.startswith(AEAD_PREFIX):
+            return self._fernet.decrypt(token.encode()).decode()
+
+        try:
+            data = token[len(AEAD_PREFIX):]
+            data = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+            nonce, ciphertext = data[:AEAD_NONCE_SIZE], data[AEAD_NONCE_SIZE:]
+            return self._aead.decrypt(nonce, ciphertext, None).decode()
+        except (InvalidTag, UnsupportedAlgorithm, ValueError):
+            raise InvalidToken
+
+
+@functools.lru_cache(maxsize=1024)
+def get_cipher(key: bytes | str) -> TokenCipher:
+    """Returns the (cached) token cipher for a session key, using the scheme
+    set by WHOOGLE_URL_TOKEN_MODE. The 'aead' scheme falls back to 'fernet'
+    if the cryptography backend doesn't support it.
+
+    Args:
+        key: The session key
+
+    Returns:
+        TokenCipher: The cipher for the key
+    """
+    mode = os.getenv('WHOOGLE_URL_TOKEN_MODE', DEFAULT_TOKEN_MODE).lower()
+    if mode == 'aead' and not aead_supported():
+        mode = 'fernet'
+    return TokenCipher(key, mode)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark bang suggestions for autocomplete (suggest_bang in
+app/utils/bangs.py) against the full DuckDuckGo bang set.
+
+The prefix index is compared against a linear scan over every bang (as
+suggestions were previously looked up). The DDG bangs are read from
+app/static/bangs/bangs.json if it has been generated, otherwise a synthetic
+set of the same size is used.
+
+Usage:
+    python misc/benchmarks/bang_suggestions.py [--iterations <n>]
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from app.utils import bangs  # noqa: E402
+
+BANGS_FILE = os.path.join(ROOT_DIR, 'app', 'static', 'bangs', 'bangs.json')
+
+# Roughly the number of bangs in the DDG bang set
+SYNTHETIC_BANGS = 13500
+
+QUERIES = ['!g', '!gh', '!w', '!yt', '!amazon', '!zzzz']
+
+
+def load_ddg_bangs() -> tuple[dict, str]:
+    try:
+        with open(BANGS_FILE, 'r', encoding='utf-8') as f:
+            ddg_bangs = json.load(f)
+        if ddg_bangs:
+            return ddg_bangs, 'DDG'
+    except (OSError, ValueError):
+        pass
+
+    rng = random.Random(0)
+    ddg_bangs = {}
+    while len(ddg_bangs) < SYNTHETIC_BANGS:
+        name = ''.join(rng.choices(string.ascii_lowercase + string.digits,
+                                   k=rng.randint(1, 8)))
+        ddg_bangs[f'!{name}'] = {
+            'url': f'https://{name}.example.com/?q={{}}',
+            'suggestion': f'!{name} ({name})',
+        }
+    return ddg_bangs, 'synthetic'
+
+
+def linear_scan(query: str) -> list[str]:
+    table = bangs.bang_table.bangs
+    return [table[_][1] for _ in table if _.startswith(query)
+            ][:bangs.MAX_BANG_SUGGESTIONS]
+
+
+def suggestions_per_second(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for query in QUERIES:
+            func(query)
+    return iterations * len(QUERIES) / (time.perf_counter() - start)
+
+
+def run(iterations: int) -> None:
+    ddg_bangs, source = load_ddg_bangs()
+    bangs.set_bangs(ddg_bangs)
+
+    for query in QUERIES:
+        assert bangs.suggest_bang(query) == linear_scan(query), query
+
+    print(f'Bang suggestions, {len(ddg_bangs)} {source} bangs, '
+          f'{iterations} iterations of {len(QUERIES)} queries')
+    print(f'{"lookup":<20}{"queries/s":>14}')
+    for name, func in [('linear scan', linear_scan),
+                       ('prefix index', bangs.suggest_bang)]:
+        print(f'{name:<20}{suggestions_per_second(func, iterations):>14,.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Whoogle bang suggestion benchmark')
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=200,
+        help='Number of times to time each query (default 200)')
+    args = parser.parse_args()
+    run(args.iterations)
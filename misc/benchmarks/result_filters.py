@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark the removal of ads, AI Overviews and blocked results from a results
+page (Filter.remove_results in app/filter.py) on a large synthetic page.
+
+The single pass is compared against the previous separate passes, which
+searched every div's descendants (and AI Overview text) once per div. Both
+are checked to produce the same page.
+
+Usage:
+    python misc/benchmarks/result_filters.py [--results <n>] [--iterations <n>]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from app import app  # noqa: E402
+from app.filter import AI_OVERVIEW_PATTERNS, Filter  # noqa: E402
+from app.models.config import Config  # noqa: E402
+from app.models.g_classes import GClasses  # noqa: E402
+from app.utils.results import BLACKLIST  # noqa: E402
+from app.utils.session import generate_key  # noqa: E402
+
+
+def build_page(results: int) -> str:
+    divs = []
+    for idx in range(results):
+        title = f'Blocked result {idx}' if idx % 25 == 7 else f'Result {idx}'
+        site = 'blocked.com' if idx % 25 == 13 else f'site{idx}.com'
+        label = '<span>Sponsored</span>' if idx % 10 == 3 else ''
+        overview = ('<div><div><span>AI Overview</span></div></div>'
+                    if idx == 1 else '')
+        divs.append(
+            f'<div class="{GClasses.result_class_a}">'
+            f'<div class="kCrYT">{label}{overview}'
+            f'<a href="https://{site}/page/{idx}"><h3>{title}</h3>'
+            f'<div><span>{site}</span> › page › {idx}</div></a></div>'
+            '<div class="kCrYT"><div><div><div>'
+            f'<span>Snippet for result {idx}, with a few more words '
+            'of text to make it a realistic length.</span>'
+            f'<span>{idx} days ago</span>'
+            '</div></div></div></div></div>')
+    return f'<html><body><div id="main">{"".join(divs)}</div></body></html>'
+
+
+def legacy_has_ad_content(element: str) -> bool:
+    element_str = ''.join(filter(str.isalpha, element))
+    return (element_str.upper() in (value.upper() for value in BLACKLIST)
+            or 'ⓘ' in element)
+
+
+def legacy_remove_results(f: Filter) -> None:
+    for div in [_ for _ in f.main_divs.find_all('div', recursive=True)]:
+        div_ads = [_ for _ in div.find_all('span', recursive=True)
+                   if legacy_has_ad_content(_.text)]
+        _ = div.decompose() if len(div_ads) else None
+
+    result_classes = [GClasses.result_class_a]
+    result_classes.extend(GClasses.result_classes.get(
+        GClasses.result_class_a, []))
+    divs_to_remove = []
+    for div in f.main_divs.find_all('div', recursive=True):
+        div_text = div.get_text()
+        if any(pattern in div_text for pattern in AI_OVERVIEW_PATTERNS):
+            parent = div
+            while parent:
+                p_cls = parent.attrs.get('class') or []
+                if any(rc in p_cls for rc in result_classes):
+                    if parent not in divs_to_remove:
+                        divs_to_remove.append(parent)
+                    break
+                parent = parent.parent
+    for div in divs_to_remove:
+        div.decompose()
+
+    block_title = re.compile(f.config.block_title)
+    for div in [_ for _ in f.main_divs.find_all('div', recursive=True)]:
+        block_divs = [_ for _ in div.find_all('h3', recursive=True)
+                      if block_title.search(_.text) is not None]
+        _ = div.decompose() if len(block_divs) else None
+
+    block_url = re.compile(f.config.block_url)
+    for div in [_ for _ in f.main_divs.find_all('div', recursive=True)]:
+        block_divs = [_ for _ in div.find_all('a', recursive=True)
+                      if block_url.search(_.attrs['href']) is not None]
+        _ = div.decompose() if len(block_divs) else None
+
+
+def run_filter(page: str, config: Config, remove) -> tuple[str, float]:
+    f = Filter(user_key=generate_key(), config=config)
+    f.soup = BeautifulSoup(page, 'html.parser')
+    f.main_divs = f.soup.find('div', {'id': 'main'})
+
+    start = time.perf_counter()
+    remove(f)
+    return str(f.soup), time.perf_counter() - start
+
+
+def run(results: int, iterations: int) -> None:
+    page = build_page(results)
+    with app.app_context():
+        config = Config(block_title='^Blocked', block_url=r'blocked\.com')
+
+    timings = {}
+    pages = {}
+    for name, remove in [('separate passes', legacy_remove_results),
+                         ('single pass', Filter.remove_results)]:
+        total = 0.0
+        for _ in range(iterations):
+            pages[name], seconds = run_filter(page, config, remove)
+            total += seconds
+        timings[name] = total / iterations
+    assert pages['separate passes'] == pages['single pass']
+
+    print(f'Result removal, {results} results ({len(page):,} bytes), '
+          f'{iterations} iterations')
+    print(f'{"implementation":<20}{"ms/page":>14}')
+    for name, seconds in timings.items():
+        print(f'{name:<20}{seconds * 1000:>14,.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Whoogle result removal benchmark')
+    parser.add_argument(
+        '--results',
+        type=int,
+        default=500,
+        help='Number of results in the synthetic page (default 500)')
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=3,
+        help='Number of times to filter the page (default 3)')
+    args = parser.parse_args()
+    run(args.results, args.iterations)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-query CPU cost of the /search route against the mock
+Google result pages used by the test suite (test/mock_google.py).
+
+Upstream requests are replaced with the mock pages, so the numbers only
+reflect Whoogle's own parsing, filtering and rendering work. Alongside the
+total CPU time per query, the time spent inside BeautifulSoup parsing and
+serialization and the number of full-document parses are reported.
+
+Usage:
+    python misc/benchmarks/search_pipeline.py [--iterations <n>] [--json]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+# Avoid the daily update check reaching out to GitHub during the benchmark
+os.environ.setdefault('WHOOGLE_UPDATE_CHECK', '0')
+# Measure the full pipeline for every search, rather than cached pages
+os.environ.setdefault('WHOOGLE_PAGE_CACHE_SIZE', '0')
+
+import bs4  # noqa: E402
+import httpx  # noqa: E402
+
+from app import app  # noqa: E402
+from app.request import Request  # noqa: E402
+from test.mock_google import build_mock_response  # noqa: E402
+
+QUERIES = [
+    'test',
+    'wikipedia',
+    'whoogle github',
+    'pinterest ideas',
+    'usd to eur',
+    'my ip address',
+]
+
+# Fragments smaller than this are not counted as a "full document" parse
+FULL_PARSE_MIN_LENGTH = 512
+
+
+def fake_send(self, base_url='', query='', attempt=0,
+              force_mobile=False, user_agent=''):
+    html = build_mock_response(query, self.language, self.country)
+    request = httpx.Request('GET', (base_url or self.search_url) + query)
+    return httpx.Response(200, request=request, text=html)
+
+
+class SoupProfiler:
+    """Counts full-document BeautifulSoup parses and accumulates the CPU time
+    spent parsing markup and serializing trees back to strings"""
+    def __init__(self) -> None:
+        self.parses = 0
+        self.soup_seconds = 0.0
+        self._depth = 0
+        self._original_init = bs4.BeautifulSoup.__init__
+        self._original_decode = bs4.element.Tag.decode
+
+    def _timed(self, func, *args, **kwargs):
+        # Only time the outermost call, since decode is reentrant
+        if self._depth:
+            return func(*args, **kwargs)
+        self._depth += 1
+        start = time.process_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.soup_seconds += time.process_time() - start
+            self._depth -= 1
+
+    def __enter__(self) -> 'SoupProfiler':
+        profiler = self
+        original_init = self._original_init
+        original_decode = self._original_decode
+
+        def profiled_init(soup, markup='', *args, **kwargs):
+            if len(str(markup)) >= FULL_PARSE_MIN_LENGTH:
+                profiler.parses += 1
+            profiler._timed(original_init, soup, markup, *args, **kwargs)
+
+        def profiled_decode(tag, *args, **kwargs):
+            return profiler._timed(original_decode, tag, *args, **kwargs)
+
+        bs4.BeautifulSoup.__init__ = profiled_init
+        bs4.element.Tag.decode = profiled_decode
+        return self
+
+    def __exit__(self, *args) -> None:
+        bs4.BeautifulSoup.__init__ = self._original_init
+        bs4.element.Tag.decode = self._original_decode
+
+
+def run(iterations: int, as_json: bool) -> None:
+    Request.send = fake_send
+    results = {}
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session['uuid'] = 'benchmark'
+            session['key'] = app.enc_key
+            session['config'] = {}
+            session['auth'] = False
+
+        for query in QUERIES:
+            path = f'/search?q={query}' + ('&format=json' if as_json else '')
+
+            # Warm up template and regex caches before measuring
+            client.get(path)
+
+            with SoupProfiler() as profiler:
+                start = time.process_time()
+                for _ in range(iterations):
+                    rv = client.get(path)
+                    assert rv.status_code == 200, rv.status_code
+                elapsed = time.process_time() - start
+
+            results[query] = (elapsed / iterations * 1000,
+                              profiler.soup_seconds / iterations * 1000,
+                              profiler.parses / iterations)
+
+    mode = 'json' if as_json else 'html'
+    print(f'/search ({mode}), {iterations} iterations per query')
+    print(f'{"query":<20}{"cpu ms/query":>14}{"bs4 ms/query":>14}'
+          f'{"full parses":>14}')
+    for query, (total_ms, soup_ms, parses) in results.items():
+        print(f'{query:<20}{total_ms:>14.2f}{soup_ms:>14.2f}{parses:>14.1f}')
+    means = [sum(_[i] for _ in results.values()) / len(results)
+             for i in range(3)]
+    print(f'{"mean":<20}{means[0]:>14.2f}{means[1]:>14.2f}{means[2]:>14.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Whoogle /search pipeline benchmark')
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=50,
+        help='Number of requests to time per query (default 50)')
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Benchmark the JSON (format=json) results path instead of HTML')
+    args = parser.parse_args()
+    run(args.iterations, args.json)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark the URL token schemes used to encrypt element URLs and internal
+links in results pages (see app/utils/tokens.py).
+
+Each scheme is timed encrypting and decrypting a typical element path, and is
+compared against constructing a new Fernet instance for every token (as
+results pages were previously encrypted).
+
+Usage:
+    python misc/benchmarks/url_tokens.py [--iterations <n>]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from app.utils.tokens import TOKEN_MODES, TokenCipher  # noqa: E402
+
+PATH = 'https://www.example.com/favicon.ico'
+
+
+def tokens_per_second(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def run(iterations: int) -> None:
+    key = Fernet.generate_key()
+    results = {}
+
+    uncached_token = Fernet(key).encrypt(PATH.encode())
+    results['fernet (uncached)'] = (
+        tokens_per_second(
+            lambda: Fernet(key).encrypt(PATH.encode()), iterations),
+        tokens_per_second(
+            lambda: Fernet(key).decrypt(uncached_token), iterations),
+        len(uncached_token))
+
+    for mode in TOKEN_MODES:
+        cipher = TokenCipher(key, mode)
+        token = cipher.encrypt(PATH)
+        results[mode] = (
+            tokens_per_second(lambda: cipher.encrypt(PATH), iterations),
+            tokens_per_second(lambda: cipher.decrypt(token), iterations),
+            len(token))
+
+    print(f'URL tokens, {iterations} iterations per scheme')
+    print(f'{"scheme":<20}{"encrypt/s":>14}{"decrypt/s":>14}'
+          f'{"token length":>14}')
+    for scheme, (encrypt, decrypt, length) in results.items():
+        print(f'{scheme:<20}{encrypt:>14,.0f}{decrypt:>14,.0f}{length:>14}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Whoogle URL token benchmark')
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=20000,
+        help='Number of tokens to time per scheme (default 20000)')
+    args = parser.parse_args()
+    run(args.iterations)
@@ -1,5 +1,7 @@
 from app import app
 from app.request import Request
+from app.services.favicon_cache import FaviconCache
+from app.services.provider import get_page_cache
 from app.utils.session import generate_key
 from test.mock_google import build_mock_response
 import httpx
@@ -44,9 +46,20 @@ def mock_google(monkeypatch):
 
     monkeypatch.setattr(Request, 'send', fake_send)
     monkeypatch.setattr(Request, 'autocomplete', fake_autocomplete)
+
+    # Rendered pages depend on the mocked responses, and shouldn't be shared
+    # between tests
+    get_page_cache().clear()
     yield
 
 
+@pytest.fixture(autouse=True)
+def favicon_cache(monkeypatch, tmp_path):
+    # Favicons fetched by tests shouldn't be written to the app's config dir
+    monkeypatch.setitem(app.services, 'favicon_cache',
+                        FaviconCache(str(tmp_path / 'favicons')))
+
+
 @pytest.fixture
 def client():
     with app.test_client() as client:
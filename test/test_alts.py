@@ -1,6 +1,7 @@
 import copy
 import os
 
+import pytest
 from bs4 import BeautifulSoup
 
 from app import app
@@ -112,3 +113,62 @@ def test_single_pass_description_replacement(monkeypatch):
         results_mod.SITE_ALTS.update(original_site_alts)
 
 
+MATRIX_SITE_ALTS = {
+    'reddit.com': 'farside.link/libreddit',
+    'medium.com': 'farside.link/scribe',
+    'levelup.gitconnected.com': 'farside.link/scribe',
+    'wikipedia.org': 'farside.link/wikiless',
+    'imgur.com': '',
+}
+
+
+@pytest.mark.parametrize('link,expected', [
+    # Medium, including author subdomains, but not lookalike domains
+    ('https://medium.com/p/1', 'https://farside.link/scribe/p/1'),
+    ('https://someone.medium.com/p/1', 'https://farside.link/scribe/p/1'),
+    ('https://philomedium.com/p/1', 'https://philomedium.com/p/1'),
+    ('https://medium.community/p/1', 'https://medium.community/p/1'),
+    ('https://levelup.gitconnected.com/p/1', 'https://farside.link/scribe/p/1'),
+    # Wikipedia language subdomains are passed as a param
+    ('https://wikipedia.org/wiki/X', 'https://farside.link/wikiless/wiki/X'),
+    ('https://en.wikipedia.org/wiki/X',
+     'https://farside.link/wikiless/wiki/X?lang=en'),
+    ('https://de.m.wikipedia.org/wiki/X',
+     'https://farside.link/wikiless/wiki/X?lang=de'),
+    ('https://simple.wikipedia.org/wiki/X',
+     'https://simple.farside.link/wikiless/wiki/X'),
+    # Other subdomains and ports
+    ('https://www.reddit.com/r/x', 'https://farside.link/libreddit/r/x'),
+    ('https://reddit.com:443/r/x', 'https://farside.link/libreddit/r/x'),
+    ('https://notreddit.com/r/x', 'https://notreddit.com/r/x'),
+    # Sites without an alternative, and links without a host
+    ('https://imgur.com/a', 'https://imgur.com/a'),
+    ('/search?q=reddit.com', '/search?q=reddit.com'),
+])
+def test_site_alt_matrix(link, expected):
+    site_alts = results_mod.SiteAlts(MATRIX_SITE_ALTS)
+    assert results_mod.get_site_alt(link, site_alts) == expected
+    assert results_mod.get_site_alt(link, dict(MATRIX_SITE_ALTS)) == expected
+
+
+def test_site_alt_index_updates():
+    site_alts = results_mod.SiteAlts(MATRIX_SITE_ALTS)
+    link = 'https://www.reddit.com/r/x'
+    assert results_mod.get_site_alt(link, site_alts) == \
+        'https://farside.link/libreddit/r/x'
+
+    site_alts['reddit.com'] = 'https://libreddit.example'
+    assert results_mod.get_site_alt(link, site_alts) == \
+        'https://libreddit.example/r/x'
+
+    del site_alts['reddit.com']
+    assert results_mod.get_site_alt(link, site_alts) == link
+    assert 'reddit' not in site_alts.index.pattern.pattern
+
+    site_alts.update({'reddit.com': 'farside.link/libreddit'})
+    assert results_mod.get_site_alt(link, site_alts) == \
+        'https://farside.link/libreddit/r/x'
+
+    site_alts.clear()
+    assert site_alts.index.pattern is None
+    assert results_mod.get_site_alt(link, site_alts) == link
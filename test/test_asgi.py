@@ -0,0 +1,112 @@
+import asyncio
+import json
+import re
+import threading
+
+import httpx
+import pytest
+
+from app.asgi import application
+from app.models.endpoint import Endpoint
+from app.request import Request
+from app.routes import LazyGlobals
+from test.mock_google import build_mock_response
+
+
+@pytest.fixture(autouse=True)
+def async_send(monkeypatch):
+    async def fake_send_async(self, base_url='', query='', attempt=0,
+                              force_mobile=False, user_agent=''):
+        await asyncio.sleep(0.1)
+        html = build_mock_response(query, self.language, self.country)
+        request = httpx.Request('GET', self.search_url + query)
+        return httpx.Response(200, request=request, text=html)
+
+    def blocking_send(self, *args, **kwargs):
+        raise AssertionError('searches should be sent asynchronously')
+
+    monkeypatch.setattr(Request, 'send_async', fake_send_async)
+    monkeypatch.setattr(Request, 'send', blocking_send)
+
+
+async def asgi_get(path: str, query: str = '', headers: list = None) -> tuple:
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'scheme': 'http',
+        'http_version': '1.1',
+        'path': path,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost:5000'),
+                    (b'user-agent', b'Mozilla/5.0 Firefox/120.0')] +
+                   (headers or []),
+        'server': ('localhost', 5000),
+        'client': ('127.0.0.1', 1234),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    headers = {k.decode(): v.decode() for k, v in sent[0]['headers']}
+    return sent[0]['status'], headers, sent[1]['body']
+
+
+def test_asgi_search():
+    status, headers, body = asyncio.run(
+        asgi_get(f'/{Endpoint.search}', 'q=test'))
+    assert status == 200
+    assert headers['content-type'].startswith('text/html')
+    assert 'X-Frame-Options'.lower() in headers
+    assert 'test - Whoogle Search' in body.decode()
+
+
+def test_asgi_search_json():
+    status, _, body = asyncio.run(asgi_get(
+        f'/{Endpoint.search}', 'q=test',
+        headers=[(b'accept', b'application/json')]))
+    assert status == 200
+    assert json.loads(body)['results']
+
+
+def test_asgi_concurrent_searches():
+    async def run_searches():
+        return await asyncio.gather(*[
+            asgi_get(f'/{Endpoint.search}', f'q=test{idx}')
+            for idx in range(5)])
+
+    for status, _, body in asyncio.run(run_searches()):
+        assert status == 200
+        assert re.search(r'test\d - Whoogle Search', body.decode())
+
+
+def test_asgi_wsgi_routes():
+    status, _, body = asyncio.run(asgi_get(f'/{Endpoint.healthz}'))
+    assert status == 200
+
+    status, headers, _ = asyncio.run(asgi_get(f'/{Endpoint.search}'))
+    assert status == 302
+
+
+def test_asgi_search_setup_off_loop(monkeypatch):
+    threads = []
+    load_user_config = LazyGlobals.loaders['user_config']
+
+    def loader():
+        threads.append(threading.current_thread())
+        return load_user_config()
+
+    monkeypatch.setitem(LazyGlobals.loaders, 'user_config', loader)
+
+    # Building the config (and the rest of the search setup) blocks, so it
+    # isn't run on the event loop's thread
+    status, _, _ = asyncio.run(asgi_get(f'/{Endpoint.search}', 'q=test'))
+    assert status == 200
+    assert threads
+    assert threading.main_thread() not in threads
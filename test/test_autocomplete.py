@@ -1,4 +1,8 @@
+import threading
+
+from app import app
 from app.models.endpoint import Endpoint
+from app.request import Request
 
 
 def test_autocomplete_get(client):
@@ -14,3 +18,65 @@ def test_autocomplete_post(client):
     assert rv._status_code == 200
     assert len(rv.data) >= 1
     assert b'the cat in the hat' in rv.data
+
+
+def test_autocomplete_superseded(client):
+    rv = client.post(f'/{Endpoint.autocomplete}?page=a&seq=2',
+                     data=dict(q='the+cat+in+the'))
+    assert b'the cat in the hat' in rv.data
+
+    # Requests that were overtaken by a later keystroke are dropped
+    rv = client.post(f'/{Endpoint.autocomplete}?page=a&seq=1',
+                     data=dict(q='the+cat+in'))
+    assert rv._status_code == 200
+    assert rv.json[1] == []
+
+
+def test_autocomplete_superseded_in_flight(client, monkeypatch):
+    responses = []
+
+    def post(seq: int, q: str) -> None:
+        with app.test_client() as other:
+            with other.session_transaction() as session:
+                session['uuid'] = 'test'
+                session['key'] = app.enc_key
+                session['config'] = {}
+                session['auth'] = False
+            responses.append(other.post(
+                f'/{Endpoint.autocomplete}?page=d&seq={seq}', data=dict(q=q)))
+
+    fetch_autocomplete = Request.autocomplete
+
+    def autocomplete(self, q):
+        if q == 'the+cat+in+the':
+            # The next keystroke's request finishes first
+            thread = threading.Thread(target=post,
+                                      args=(2, 'the+cat+in+the+h'))
+            thread.start()
+            thread.join()
+        return fetch_autocomplete(self, q)
+
+    monkeypatch.setattr(Request, 'autocomplete', autocomplete)
+
+    rv = client.post(f'/{Endpoint.autocomplete}?page=d&seq=1',
+                     data=dict(q='the+cat+in+the'))
+    assert responses[0].json[1] == ['the cat in the hat']
+    assert rv._status_code == 200
+    assert rv.json[1] == []
+
+
+def test_autocomplete_new_page(client):
+    for seq in range(1, 21):
+        rv = client.post(f'/{Endpoint.autocomplete}?page=b&seq={seq}',
+                         data=dict(q='the+cat+in+the'))
+        assert b'the cat in the hat' in rv.data
+
+    # The numbering starts again on a new page (or in another tab)
+    rv = client.post(f'/{Endpoint.autocomplete}?page=c&seq=1',
+                     data=dict(q='the+cat+in+the'))
+    assert b'the cat in the hat' in rv.data
+
+    # Requests that aren't numbered by page are never dropped
+    rv = client.post(f'/{Endpoint.autocomplete}?seq=1',
+                     data=dict(q='the+cat+in+the'))
+    assert b'the cat in the hat' in rv.data
@@ -0,0 +1,106 @@
+import threading
+
+from app import app
+from app.models.config import Config
+from app.request import Request
+from app.services.result_cache import ResultCache
+
+# The autocomplete mock in conftest replaces the real method
+autocomplete = Request.autocomplete
+
+SUGGESTIONS = {
+    'w': ['weather', 'walmart', 'whatsapp', 'wells fargo', 'wordle',
+          'whoogle', 'wikipedia', 'word', 'weather tomorrow', 'walgreens'],
+    'wh': ['whatsapp', 'whoogle', 'whoogle search'],
+    'py': ['python', 'pypi', 'pytorch'],
+}
+
+
+class FakeHttpClient:
+    def __init__(self, delay: float = 0) -> None:
+        self.queries = []
+        self.delay = delay
+        self.timeouts = []
+
+    def get(self, url, headers=None, cookies=None, **kwargs):
+        query = url.split('&q=')[1].split('&')[0]
+        self.queries.append(query)
+        self.timeouts.append(kwargs.get('timeout'))
+        threading.Event().wait(self.delay)
+        xml = ''.join(
+            f'<CompleteSuggestion><suggestion data="{_}"/></CompleteSuggestion>'
+            for _ in SUGGESTIONS.get(query, []))
+
+        class R:
+            text = f'<?xml version="1.0"?><topp>{xml}</topp>'
+        return R()
+
+    def close(self):
+        pass
+
+
+def new_request(http_client, cache, **config):
+    with app.app_context():
+        config = Config(**config)
+    return Request(normal_ua='UA', root_path='http://localhost:5000',
+                   config=config, http_client=http_client,
+                   autocomplete_cache=cache)
+
+
+def test_autocomplete_cache(monkeypatch):
+    monkeypatch.setattr(Request, 'autocomplete', autocomplete)
+    client = FakeHttpClient()
+    cache = ResultCache(maxsize=16)
+    req = new_request(client, cache)
+
+    assert req.autocomplete('wh') == SUGGESTIONS['wh']
+    assert client.timeouts == [3]
+    assert req.autocomplete('WH') == SUGGESTIONS['wh']
+
+    # Longer queries are answered from the complete list for a prefix...
+    assert req.autocomplete('who') == ['whoogle', 'whoogle search']
+    assert req.autocomplete('whoogle ') == ['whoogle search']
+    assert client.queries == ['wh']
+
+    # ...but not from a list that may be missing suggestions
+    assert req.autocomplete('w') == SUGGESTIONS['w']
+    assert req.autocomplete('py') == SUGGESTIONS['py']
+    assert req.autocomplete('we') == []
+    assert client.queries == ['wh', 'w', 'py', 'we']
+
+    # Suggestions are cached per language
+    req = new_request(client, cache, lang_search='lang_de')
+    req.autocomplete('wh')
+    assert client.queries[-1] == 'wh'
+
+
+def test_autocomplete_coalesced(monkeypatch):
+    monkeypatch.setattr(Request, 'autocomplete', autocomplete)
+    client = FakeHttpClient(delay=0.2)
+    req = new_request(client, ResultCache(maxsize=16))
+
+    results = []
+    threads = [threading.Thread(
+        target=lambda: results.append(req.autocomplete('py')))
+        for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [SUGGESTIONS['py']] * 4
+    assert client.queries == ['py']
+
+
+def test_autocomplete_empty_not_cached(monkeypatch):
+    monkeypatch.setattr(Request, 'autocomplete', autocomplete)
+    monkeypatch.setitem(SUGGESTIONS, 'qu', ['quora', 'quizlet'])
+    client = FakeHttpClient()
+    cache = ResultCache(maxsize=16)
+    req = new_request(client, cache)
+
+    # A prefix without suggestions doesn't stop longer queries from having
+    # them
+    assert req.autocomplete('q') == []
+    assert req.autocomplete('qu') == ['quora', 'quizlet']
+    assert client.queries == ['q', 'qu']
@@ -0,0 +1,84 @@
+import os
+
+import httpx
+import pytest
+
+from app import app
+from app.models.endpoint import Endpoint
+from app.services import bang_refresher
+from app.services.bang_refresher import BangRefresher
+from app.utils import bangs
+from app.utils.bangs import resolve_bang
+
+DDG_BANGS = [
+    {'t': 'g', 'u': 'https://www.google.com/search?q={{{s}}}', 's': 'Google'},
+    {'t': 'w', 'u': 'https://en.wikipedia.org/wiki/{{{s}}}', 's': 'Wikipedia'},
+]
+
+
+@pytest.fixture
+def ddg(monkeypatch):
+    # Restore the app's bangs afterwards
+    monkeypatch.setattr(bangs, 'bang_table', bangs.BangTable.build({}))
+
+    requests = []
+
+    def get(url, headers=None, timeout=None):
+        requests.append(headers)
+        request = httpx.Request('GET', url, headers=headers)
+        if headers.get('If-None-Match') == '"v1"':
+            return httpx.Response(304, request=request)
+        return httpx.Response(200, request=request, json=DDG_BANGS,
+                              headers={'ETag': '"v1"'})
+
+    monkeypatch.setattr(bang_refresher.httpx, 'get', get)
+    return requests
+
+
+def test_bang_refresher(ddg, tmp_path):
+    bangs_file = os.path.join(tmp_path, 'bangs.json')
+    refresher = BangRefresher(bangs_file)
+    assert not refresher.load()
+    assert not refresher.ready
+    assert refresher.due_in() == 0
+
+    assert refresher.run_once()
+    assert refresher.ready
+    assert resolve_bang('!w whoogle') == 'https://en.wikipedia.org/wiki/whoogle'
+    assert refresher.due_in() > 0
+
+    # Unchanged bangs aren't downloaded again
+    assert not refresher.run_once()
+    assert ddg[-1] == {'If-None-Match': '"v1"'}
+    assert refresher.stats() == {'ready': 1, 'refreshes': 1,
+                                 'not_modified': 1, 'failures': 0}
+
+
+def test_bang_refresher_restart(ddg, tmp_path):
+    bangs_file = os.path.join(tmp_path, 'bangs.json')
+    BangRefresher(bangs_file).run_once()
+    bangs.set_bangs({})
+
+    # Bangs are available as soon as the refresher starts, and aren't
+    # fetched again until the refresh interval has passed
+    refresher = BangRefresher(bangs_file, interval_seconds=0)
+    refresher.start()
+    assert refresher.ready
+    assert resolve_bang('!g whoogle') == \
+        'https://www.google.com/search?q=whoogle'
+    assert len(ddg) == 1
+    refresher.stop()
+
+
+def test_bang_refresher_readiness_reported(ddg, client, monkeypatch,
+                                           tmp_path):
+    refresher = BangRefresher(os.path.join(tmp_path, 'bangs.json'))
+    monkeypatch.setitem(app.services, 'bang_refresher', refresher)
+
+    rv = client.get(f'/{Endpoint.healthz}')
+    assert rv._status_code == 200
+    assert rv.json['bang_refresher']['ready'] == 0
+
+    refresher.run_once()
+    rv = client.get(f'/{Endpoint.healthz}')
+    assert rv.json['bang_refresher']['ready'] == 1
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from app.utils import bangs
+from app.utils.bangs import (
+    SNAPSHOT_FILE, load_all_bangs, resolve_bang, set_bangs, suggest_bang)
+
+
+@pytest.fixture
+def demo_bangs(monkeypatch):
+    # Restore the app's bangs afterwards
+    monkeypatch.setattr(bangs, 'bang_table', bangs.bang_table)
+
+    set_bangs({
+        f'!{name}': {'url': f'https://{name}.com/?q={{}}',
+                     'suggestion': f'!{name} ({name})'}
+        for name in ['gh', 'GL', 'g', 'gi', 'w', 'ghr', 'a', 'gha', 'wa']
+    })
+
+
+def test_suggest_bang(demo_bangs):
+    assert suggest_bang('!g') == ['!g (g)', '!gh (gh)', '!gha (gha)',
+                                  '!ghr (ghr)', '!gi (gi)', '!GL (GL)']
+    assert suggest_bang('!gh') == ['!gh (gh)', '!gha (gha)', '!ghr (ghr)']
+    assert suggest_bang('!g', limit=2) == ['!g (g)', '!gh (gh)']
+    assert suggest_bang('!wa') == ['!wa (wa)']
+    assert suggest_bang('!x') == []
+    assert suggest_bang('!zzz') == []
+    assert suggest_bang('!GH') == ['!gh (gh)', '!gha (gha)', '!ghr (ghr)']
+
+
+def test_resolve_bang(demo_bangs):
+    assert resolve_bang('!gh whoogle') == 'https://gh.com/?q=whoogle'
+    assert resolve_bang('whoogle  search !w') == \
+        'https://w.com/?q=whoogle  search'
+    assert resolve_bang('!gh') == 'https://gh.com'
+
+    # Operators aren't case-sensitive
+    assert resolve_bang('!GH whoogle') == 'https://gh.com/?q=whoogle'
+    assert resolve_bang('!gl whoogle') == 'https://GL.com/?q=whoogle'
+
+    assert resolve_bang('whoogle') == ''
+    assert resolve_bang('!x whoogle') == ''
+    assert resolve_bang('whoogle!gh') == ''
+    assert resolve_bang('!gh whoogle !w') == ''
+
+
+def test_resolve_custom_bang(demo_bangs):
+    # Custom bang files can use operators that don't start with '!'
+    set_bangs({'yt!': {'url': 'https://yt.com/?q={}',
+                       'suggestion': 'yt! (yt)'}})
+    assert resolve_bang('yt! whoogle') == 'https://yt.com/?q=whoogle'
+    assert resolve_bang('whoogle YT!') == 'https://yt.com/?q=whoogle'
+    assert resolve_bang('yt whoogle') == ''
+
+
+def test_bang_snapshot(demo_bangs, tmp_path):
+    ddg_bangs_file = os.path.join(tmp_path, 'bangs.json')
+    with open(ddg_bangs_file, 'w') as f:
+        json.dump({'!a': {'url': 'https://a.com/?q={}',
+                          'suggestion': '!a (a)'}}, f)
+    with open(os.path.join(tmp_path, 'custom.json'), 'w') as f:
+        json.dump({'!B': {'url': 'https://b.com/?q={}',
+                          'suggestion': '!B (b)'}}, f)
+
+    set_bangs({})
+    load_all_bangs(ddg_bangs_file)
+    assert os.path.exists(os.path.join(tmp_path, SNAPSHOT_FILE))
+    assert suggest_bang('!') == ['!a (a)', '!B (b)']
+
+    # Unchanged bang files are loaded from the snapshot
+    with open(os.path.join(tmp_path, SNAPSHOT_FILE), 'rb') as f:
+        snapshot = f.read()
+    set_bangs({})
+    load_all_bangs(ddg_bangs_file)
+    assert resolve_bang('!b whoogle') == 'https://b.com/?q=whoogle'
+
+    # ...and reloaded from the json once they change
+    with open(os.path.join(tmp_path, 'custom.json'), 'w') as f:
+        json.dump({'!cc': {'url': 'https://cc.com/?q={}',
+                           'suggestion': '!cc (cc)'}}, f)
+    set_bangs({})
+    load_all_bangs(ddg_bangs_file)
+    assert suggest_bang('!') == ['!a (a)', '!cc (cc)']
+    with open(os.path.join(tmp_path, SNAPSHOT_FILE), 'rb') as f:
+        assert f.read() != snapshot
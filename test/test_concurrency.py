@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import app
+from app.models.config import Config
+from app.request import Request
+from app.services.concurrency import LatestRequests, SingleFlight, \
+    UpstreamLimiter
+from app.services.result_cache import ResultCache
+
+# The Request.send used by the test suite is mocked by conftest
+original_send = Request.send
+
+
+class SlowHttpClient:
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.urls = []
+
+    def get(self, url, headers=None, cookies=None, retries=0, backoff_seconds=0.5, use_cache=False):
+        self.urls.append(url)
+        time.sleep(self.delay)
+
+        class Response:
+            status_code = 200
+            text = 'results'
+        return Response()
+
+
+def run_threads(target, count: int) -> list:
+    results = [None] * count
+
+    def run(idx):
+        results[idx] = target()
+
+    threads = [threading.Thread(target=run, args=(idx,))
+               for idx in range(count)]
+    [_.start() for _ in threads]
+    [_.join() for _ in threads]
+    return results
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results = run_threads(lambda: flight.do('key', work), 5)
+    assert len(calls) == 1
+    assert all(_ is results[0] for _ in results)
+    assert flight.coalesced == 4
+
+    # Errors are raised for every caller, and the key is released afterwards
+    def fail():
+        raise ValueError('upstream error')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_single_flight_async():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 'results'
+
+    async def run():
+        return await asyncio.gather(
+            *[flight.do_async('key', work) for _ in range(5)])
+
+    assert asyncio.run(run()) == ['results'] * 5
+    assert len(calls) == 1
+
+
+def test_upstream_limiter():
+    limiter = UpstreamLimiter(2)
+    active = []
+    peak = []
+
+    def work():
+        with limiter:
+            active.append(1)
+            peak.append(len(active))
+            time.sleep(0.05)
+            active.pop()
+
+    run_threads(work, 6)
+    assert max(peak) == 2
+    assert limiter.active == 0
+
+
+def test_upstream_limiter_async():
+    limiter = UpstreamLimiter(2)
+    active = []
+    peak = []
+
+    async def work():
+        async with limiter:
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.05)
+            active.pop()
+
+    async def run():
+        tasks = [asyncio.ensure_future(work()) for _ in range(5)]
+
+        # A cancelled waiter gives up its place in line
+        waiter = asyncio.ensure_future(work())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert limiter.active == 0
+
+
+def test_latest_requests():
+    requests = LatestRequests()
+    assert requests.start('a', 1)
+    assert requests.start('a', 3)
+    assert requests.start('b', 2)
+
+    # Requests overtaken by a newer one from the same client are dropped
+    assert not requests.start('a', 2)
+    assert requests.start('a', 3)
+    assert requests.superseded == 1
+
+    # ...including ones overtaken while they were in flight
+    assert requests.is_latest('a', 3)
+    assert requests.start('a', 4)
+    assert not requests.is_latest('a', 3)
+    assert requests.superseded == 2
+
+
+def test_identical_searches_coalesced():
+    with app.app_context():
+        config = Config()
+    http_client = SlowHttpClient()
+
+    def search():
+        req = Request(normal_ua='TestUA', root_path='http://localhost:5000',
+                      config=config, http_client=http_client,
+                      result_cache=ResultCache(maxsize=0))
+        return original_send(req, query='whoogle')
+
+    results = run_threads(search, 5)
+    assert len(http_client.urls) == 1
+    assert all(_ is results[0] for _ in results)
@@ -0,0 +1,67 @@
+import json
+import os
+
+from app import app
+from app.models.endpoint import Endpoint
+from app.services.default_config import DefaultConfig
+
+
+def write_config(path, config: dict, mtime: int) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_default_config_reloads(tmp_path):
+    path = os.path.join(tmp_path, 'config.json')
+    default_config = DefaultConfig(path)
+    assert default_config.get() == {}
+    assert default_config.reloads == 0
+
+    write_config(path, {'theme': 'dark'}, 1000)
+    assert default_config.get() == {'theme': 'dark'}
+    assert default_config.get() == {'theme': 'dark'}
+    assert default_config.reloads == 1
+
+    # Callers get their own copy of the config
+    default_config.get()['theme'] = 'light'
+    assert default_config.get() == {'theme': 'dark'}
+
+    write_config(path, {'theme': 'light'}, 2000)
+    assert default_config.get() == {'theme': 'light'}
+    assert default_config.reloads == 2
+
+    default_config.reload()
+    default_config.get()
+    assert default_config.reloads == 3
+
+    # An invalid file doesn't replace the last good config
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{')
+    os.utime(path, (3000, 3000))
+    assert default_config.get() == {'theme': 'light'}
+
+
+def test_default_config_applied(client, tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, 'config.json')
+    write_config(path, {'theme': 'dark'}, 1000)
+    monkeypatch.setitem(app.services, 'default_config', DefaultConfig(path))
+
+    with client.session_transaction() as session:
+        session.clear()
+
+    client.get('/')
+    with client.session_transaction() as session:
+        assert session['config'] == {'theme': 'dark'}
+
+
+def test_default_config_reloads_reported(client, tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, 'config.json')
+    write_config(path, {'theme': 'dark'}, 1000)
+    default_config = DefaultConfig(path)
+    monkeypatch.setitem(app.services, 'default_config', default_config)
+
+    default_config.reload()
+    default_config.get()
+    rv = client.get(f'/{Endpoint.healthz}')
+    assert rv.json['default_config'] == {'reloads': 1}
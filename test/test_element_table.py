@@ -0,0 +1,82 @@
+import re
+import uuid
+
+import httpx
+
+from app import app
+from app.models.endpoint import Endpoint
+from app.request import Request
+from app.services import provider
+from app.services.element_table import ElementTable
+from app.services.favicon_cache import FaviconCache
+
+ELEMENT_RE = re.compile(r'/element\?url=(e\.[\w-]{16})')
+
+
+def test_element_table():
+    table = ElementTable(maxsize=2)
+    key = str(uuid.uuid4())
+
+    element_id = table.add('https://example.com/img.png', key)
+    assert len(element_id) == 18
+    assert table.resolve(element_id, key) == 'https://example.com/img.png'
+
+    # IDs only resolve for the session that created them
+    assert table.resolve(element_id, str(uuid.uuid4())) is None
+    assert table.resolve('e.not-an-element-id', key) is None
+
+    # The oldest IDs are evicted once the table is full
+    table.add('https://example.com/a.png', key)
+    table.add('https://example.com/b.png', key)
+    assert table.resolve(element_id, key) is None
+
+
+def test_element_table_disabled():
+    table = ElementTable()
+    assert not table.enabled
+    element_id = table.add('https://example.com/img.png', 'session')
+    assert table.resolve(element_id, str(uuid.uuid4())) is None
+
+
+def test_element_ids(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(provider, '_element_table', ElementTable(maxsize=100))
+    monkeypatch.setitem(app.services, 'favicon_cache',
+                        FaviconCache(str(tmp_path), maxsize=0))
+
+    fetched = []
+    pages = []
+    mock_send = Request.send
+
+    def send(self, base_url='', *args, **kwargs):
+        if not base_url.endswith('/favicon.ico'):
+            return mock_send(self, base_url, *args, **kwargs)
+        fetched.append(base_url)
+        return httpx.Response(200, request=httpx.Request('GET', base_url),
+                              content=b'icon')
+
+    monkeypatch.setattr(Request, 'send', send)
+
+    for _ in range(2):
+        # New IDs are created for every page, including cached pages
+        rv = client.get(f'/{Endpoint.search}?q=wikipedia')
+        element_ids = ELEMENT_RE.findall(rv.data.decode())
+        assert element_ids
+        pages.append(element_ids)
+
+        rv = client.get(f'/{Endpoint.element}?url={element_ids[0]}')
+        assert rv.data == b'icon'
+
+    assert not set(pages[0]) & set(pages[1])
+    assert len(fetched) == 2
+    assert fetched[0] == fetched[1]
+
+    # IDs don't resolve for other sessions
+    with app.test_client() as other:
+        with other.session_transaction() as session:
+            session['uuid'] = 'other'
+            session['key'] = app.enc_key
+            session['config'] = {}
+            session['auth'] = False
+        rv = other.get(f'/{Endpoint.element}?url={pages[1][0]}')
+        assert rv.data != b'icon'
+    assert len(fetched) == 2
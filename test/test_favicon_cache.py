@@ -0,0 +1,145 @@
+import os
+import time
+
+import httpx
+
+from app import app
+from app.filter import Filter, PLACEHOLDER_URI
+from app.models.config import Config
+from app.models.endpoint import Endpoint
+from app.models.g_classes import GClasses
+from app.request import Request
+from app.services.favicon_cache import Favicon, FaviconCache, MISSING
+from app.utils.misc import parse_html, placeholder_img
+from app.utils.session import generate_key
+
+
+def test_favicon_cache(tmp_path):
+    cache = FaviconCache(str(tmp_path))
+    icon = Favicon(b'\x00\x00\x01\x00icon', 'image/x-icon')
+
+    assert cache.get('example.com') is None
+    cache.set('Example.com', icon)
+    cache.set('missing.com', MISSING)
+    assert cache.get('example.com') == icon
+    assert cache.get('missing.com') == MISSING
+
+    # Icons are read back from disk, e.g. after a restart
+    restarted = FaviconCache(str(tmp_path))
+    assert restarted.get('example.com') == icon
+    assert restarted.get('missing.com') == MISSING
+    assert restarted.stats()['disk_hits'] == 2
+
+    # Missing icons expire sooner than found ones
+    stale = time.time() - 2 * 86400
+    for name in os.listdir(tmp_path):
+        os.utime(os.path.join(tmp_path, name), (stale, stale))
+
+    restarted = FaviconCache(str(tmp_path))
+    assert restarted.get('example.com') == icon
+    assert restarted.get('missing.com') is None
+    assert restarted.prune() == 1
+
+
+def test_favicon_cache_disabled(tmp_path):
+    cache = FaviconCache(str(tmp_path), maxsize=0)
+    cache.set('example.com', Favicon(b'icon', 'image/png'))
+    assert cache.get('example.com') is None
+    assert not os.listdir(tmp_path)
+
+
+def test_favicon_cache_misses(monkeypatch, tmp_path):
+    cache = FaviconCache(str(tmp_path))
+    reads = []
+    read = cache._read
+    monkeypatch.setattr(cache, '_read', lambda netloc: reads.append(netloc)
+                        or read(netloc))
+
+    # Icons that aren't cached are only looked up on disk once
+    assert cache.get('example.com') is None
+    assert cache.get('example.com') is None
+    assert reads == ['example.com']
+    assert cache.stats()['misses'] == 2
+
+    icon = Favicon(b'icon', 'image/png')
+    cache.set('example.com', icon)
+    assert cache.get('example.com') == icon
+
+    # ...until the miss expires
+    cache = FaviconCache(str(tmp_path), miss_ttl_seconds=0)
+    monkeypatch.setattr(cache, '_read', lambda netloc: reads.append(netloc)
+                        or read(netloc))
+    assert cache.get('example.org') is None
+    assert cache.get('example.org') is None
+    assert reads == ['example.com', 'example.org', 'example.org']
+
+
+def test_favicon_cache_write_error(monkeypatch, tmp_path):
+    def replace(src, dst):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(os, 'replace', replace)
+    cache = FaviconCache(str(tmp_path))
+    cache.set('example.com', Favicon(b'icon', 'image/png'))
+
+    # The icon is still cached in memory, and no partial file is left behind
+    assert cache.get('example.com') == Favicon(b'icon', 'image/png')
+    assert not os.listdir(tmp_path)
+
+
+def test_favicon_route(client, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.services, 'favicon_cache',
+                        FaviconCache(str(tmp_path)))
+
+    fetched = []
+
+    def send(self, base_url='', **kwargs):
+        fetched.append(base_url)
+        request = httpx.Request('GET', base_url)
+        if 'missing' in base_url:
+            return httpx.Response(404, request=request)
+        return httpx.Response(200, request=request, content=b'icon')
+
+    monkeypatch.setattr(Request, 'send', send)
+    monkeypatch.setattr('app.routes.fetch_favicon',
+                        lambda url: placeholder_img)
+
+    for _ in range(2):
+        rv = client.get(f'/{Endpoint.element}?type=image/x-icon&'
+                        'url=https://example.com/favicon.ico')
+        assert rv.data == b'icon'
+        assert rv.headers['Content-Type'] == 'image/x-icon'
+
+        rv = client.get(f'/{Endpoint.element}?type=image/x-icon&'
+                        'url=https://missing.com/favicon.ico')
+        assert rv.data == placeholder_img
+
+    # Each site's icon (or lack of one) is only fetched once
+    assert fetched == ['https://example.com/favicon.ico',
+                       'https://missing.com/favicon.ico']
+
+
+def test_inline_favicons(tmp_path):
+    cache = FaviconCache(str(tmp_path))
+    cache.set('cached.com', Favicon(b'icon', 'image/x-icon'))
+    cache.set('missing.com', MISSING)
+
+    html = ''.join(
+        f'<div class="{GClasses.result_class_a}">'
+        f'<a href="https://{site}/page">{site}</a></div>'
+        for site in ['cached.com', 'missing.com', 'uncached.com'])
+
+    with app.app_context():
+        content_filter = Filter(generate_key(), Config(),
+                                favicon_cache=cache)
+        soup = parse_html(html)
+        for link in soup.find_all('a'):
+            content_filter.add_favicon(link)
+
+    icons = [img['src'] for img in soup.find_all('img', class_='site-favicon')]
+    assert icons[0] == 'data:image/x-icon;base64,aWNvbg=='
+    assert icons[1] == PLACEHOLDER_URI
+
+    # Only icons that aren't cached yet are requested through the proxy
+    assert icons[2].startswith(f'/{Endpoint.element}?url=')
+    assert content_filter.elements == 1
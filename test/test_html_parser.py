@@ -0,0 +1,91 @@
+import re
+
+import pytest
+
+from app import app
+from app.filter import Filter
+from app.models.config import Config
+from app.utils.misc import HTML_PARSERS, get_html_parser, parse_html
+from app.utils.session import generate_key
+from test.mock_google import build_mock_response
+
+MOCK_QUERIES = ['test', 'wikipedia', 'whoogle github', 'pinterest']
+
+IMAGE_RESULTS = (
+    '<html><body><div id="main">'
+    '<div data-attrid="images universal" data-docid="doc1" '
+    'data-lpage="https://example.com/page1"><img src="data:,"></div>'
+    '<div data-attrid="images universal" data-docid="doc2">'
+    '<a href="https://example.org/page2">'
+    '<img src="https://encrypted-tbn0.gstatic.com/images?q=tbn:2"></a></div>'
+    '</div><script>var d = [0,"doc1",'
+    '["https://encrypted-tbn0.gstatic.com/images?q\\u003dtbn:1",90,90],'
+    '["https://example.com/full1.jpg",800,600]];</script>'
+    '</body></html>'
+)
+
+
+@pytest.fixture(params=HTML_PARSERS)
+def parser(request):
+    # lxml and html5lib are optional dependencies
+    if request.param != 'html.parser':
+        pytest.importorskip(request.param)
+    return request.param
+
+
+def normalize(soup) -> str:
+    # Encrypted element/query tokens are randomized on every call
+    return re.sub(r'gAAAAA[\w=-]+', '<token>', str(soup))
+
+
+def clean(markup: str, parser: str):
+    with app.test_request_context():
+        content_filter = Filter(user_key=generate_key(), config=Config(**{}))
+        return content_filter.clean(parse_html(markup, parser=parser))
+
+
+def extract_results(markup: str, parser: str) -> list:
+    # The JSON search API extracts results from the upstream page directly
+    with app.test_request_context():
+        content_filter = Filter(user_key=generate_key(), config=Config(**{}))
+        return content_filter.extract_results(
+            parse_html(markup, parser=parser))
+
+
+def test_configured_parser(monkeypatch):
+    monkeypatch.setenv('WHOOGLE_HTML_PARSER', 'not-a-parser')
+    assert get_html_parser() == 'html.parser'
+
+    monkeypatch.delenv('WHOOGLE_HTML_PARSER')
+    assert get_html_parser() == 'html.parser'
+
+    # Fragments always use the built-in parser, to avoid <html> wrapping
+    monkeypatch.setenv('WHOOGLE_HTML_PARSER', 'lxml')
+    assert str(parse_html('<b>x</b>', fragment=True)) == '<b>x</b>'
+
+
+@pytest.mark.parametrize('query', MOCK_QUERIES)
+def test_filter_clean_conformance(parser, query):
+    page = build_mock_response(query)
+    expected = normalize(clean(page, 'html.parser'))
+    assert normalize(clean(page, parser)) == expected
+
+
+@pytest.mark.parametrize('query', MOCK_QUERIES)
+def test_json_results_conformance(parser, query):
+    page = build_mock_response(query)
+    expected = extract_results(page, 'html.parser')
+    assert expected
+    assert extract_results(page, parser) == expected
+
+
+def test_view_image_conformance(parser):
+    with app.test_request_context():
+        content_filter = Filter(user_key=generate_key(), config=Config(**{}))
+        expected = content_filter.view_image(
+            parse_html(IMAGE_RESULTS, parser='html.parser'))
+        result = content_filter.view_image(
+            parse_html(IMAGE_RESULTS, parser=parser))
+
+    assert 'https://example.com/full1.jpg' in str(expected)
+    assert normalize(result) == normalize(expected)
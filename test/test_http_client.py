@@ -1,3 +1,4 @@
+import asyncio
 import types
 
 import httpx
@@ -31,3 +32,46 @@ def test_httpxclient_follow_redirects_and_proxy(monkeypatch):
     assert kwargs.get('follow_redirects') is True
     assert ('proxy' in kwargs) or ('proxies' in kwargs) or ('mounts' in kwargs)
 
+
+
+def test_httpxclient_aget_retries(monkeypatch):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url)
+        if len(attempts) == 1:
+            raise httpx.ConnectError('connection failed', request=request)
+        return httpx.Response(200, text='ok')
+
+    client = HttpxClient()
+    monkeypatch.setattr(
+        client, '_build_async_client',
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    async def fetch():
+        response = await client.aget('https://example.com',
+                                     backoff_seconds=0,
+                                     use_cache=True)
+        cached = await client.aget('https://example.com', use_cache=True)
+        await client.aclose()
+        return response, cached
+
+    response, cached = asyncio.run(fetch())
+    assert response.text == 'ok'
+    assert cached is response
+    assert len(attempts) == 2
+
+
+def test_httpxclient_aget_build_error():
+    client = HttpxClient()
+
+    def build_async_client():
+        raise RuntimeError('Client has been closed')
+
+    client._build_async_client = build_async_client
+
+    # The error building the client is raised, rather than an error from
+    # closing a client that was never built
+    with pytest.raises(RuntimeError, match='closed'):
+        asyncio.run(client.aget('https://example.com', retries=1,
+                                backoff_seconds=0))
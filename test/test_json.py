@@ -3,8 +3,15 @@ import types
 
 import pytest
 
+from app import app
+from app.filter import Filter
+from app.models.config import Config
 from app.models.endpoint import Endpoint
 from app.utils import search as search_mod
+from app.utils.misc import parse_html
+from app.utils.results import get_json_results
+from app.utils.session import generate_key
+from test.mock_google import build_mock_response
 
 
 @pytest.fixture
@@ -77,3 +84,40 @@ def test_search_json_feeling_lucky(client, monkeypatch):
     assert data['redirect'] == 'https://example.com/lucky'
 
 
+def test_search_json_structured(client, monkeypatch):
+    # Structured results are extracted without building a results page
+    def fake_clean(self, soup):
+        raise AssertionError('results page was built for a JSON search')
+
+    monkeypatch.setattr(Filter, 'clean', fake_clean)
+
+    rv = client.get(f'/{Endpoint.search}?q=wikipedia&format=json')
+    assert rv._status_code == 200
+    data = json.loads(rv.data)
+    assert data['query'] == 'wikipedia'
+    assert data['results']
+    for result in data['results']:
+        assert result['href'].startswith('https://')
+        assert 'google.com/url' not in result['href']
+        assert result['title']
+
+    rv = client.get(f'/{Endpoint.search}?q=wikipedia%20!&format=json')
+    assert rv._status_code == 303
+    assert json.loads(rv.data)['redirect'] == data['results'][0]['href']
+
+
+@pytest.mark.parametrize('query', ['test', 'wikipedia', 'whoogle github'])
+def test_extract_results(query):
+    page = build_mock_response(query)
+    with app.test_request_context():
+        content_filter = Filter(user_key=generate_key(), config=Config(**{}))
+        expected = get_json_results(content_filter.clean(parse_html(page)))
+
+        content_filter = Filter(user_key=generate_key(), config=Config(**{}))
+        results = content_filter.extract_results(parse_html(page))
+
+    # The same results are found as in the results page, without any of the
+    # spacing left around bolded search terms
+    assert [_['href'] for _ in results] == [_['href'] for _ in expected]
+    assert [_['title'] for _ in results] == [_['title'] for _ in expected]
+    assert not any(' .' in _['content'] for _ in results)
@@ -0,0 +1,169 @@
+import re
+import time
+
+from app import app
+from app.models.config import Config
+from app.models.endpoint import Endpoint
+from app.request import Request, normalize_query
+from app.services.provider import get_page_cache
+from app.services.result_cache import PageTemplate, ResultCache
+from app.utils.misc import encrypt_string
+from cryptography.fernet import Fernet
+
+# The Request.send used by the test suite is mocked by conftest
+original_send = Request.send
+
+
+class FakeResponse:
+    def __init__(self, text: str = '', status_code: int = 200):
+        self.text = text
+        self.status_code = status_code
+
+
+class FakeHttpClient:
+    def __init__(self, text: str = 'results'):
+        self.text = text
+        self.urls = []
+
+    def get(self, url, headers=None, cookies=None, retries=0, backoff_seconds=0.5, use_cache=False):
+        self.urls.append(url)
+        return FakeResponse(text=self.text)
+
+    def close(self):
+        pass
+
+
+def build_request(http_client, cache, **config) -> Request:
+    with app.app_context():
+        cfg = Config(**config)
+    return Request(normal_ua='TestUA', root_path='http://localhost:5000',
+                   config=cfg, http_client=http_client, result_cache=cache)
+
+
+def test_cache_lru_and_ttl():
+    cache = ResultCache(maxsize=2, ttl_seconds=1)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    # 'b' is the least recently used entry, and is evicted first
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+    time.sleep(1.1)
+    assert cache.get('a') is None
+
+    disabled = ResultCache(maxsize=0)
+    disabled.set('a', 1)
+    assert disabled.get('a') is None
+
+
+def test_normalize_query():
+    assert normalize_query('whoogle%20%20search&safe=off&gl=US') == \
+        normalize_query('whoogle%20search&gl=US&safe=off')
+
+
+def test_identical_searches_share_upstream_request():
+    cache = ResultCache()
+    http_client = FakeHttpClient()
+    query = 'whoogle&safe=off'
+
+    first = build_request(http_client, cache)
+    second = build_request(http_client, cache)
+    assert original_send(first, query=query).text == 'results'
+    assert original_send(second, query=query).text == 'results'
+    assert len(http_client.urls) == 1
+    assert cache.stats()['hits'] == 1
+
+    # Requests to other urls (elements, autocomplete) are never cached
+    original_send(first, base_url='https://example.com/img.png')
+    original_send(first, base_url='https://example.com/img.png')
+    assert len(http_client.urls) == 3
+
+
+def test_result_config_changes_cache_key():
+    cache = ResultCache()
+    http_client = FakeHttpClient()
+
+    original_send(build_request(http_client, cache), query='whoogle')
+    original_send(build_request(http_client, cache, country='JP'),
+                  query='whoogle')
+    original_send(build_request(http_client, cache, lang_search='lang_ja'),
+                  query='whoogle')
+    assert len(http_client.urls) == 3
+
+
+def test_result_user_agent_changes_cache_key():
+    cache = ResultCache()
+    http_client = FakeHttpClient()
+    lynx = dict(user_agent='custom', custom_user_agent='Lynx/2.9.0')
+    chrome = dict(user_agent='custom', custom_user_agent='Chrome/127.0.0.0')
+
+    original_send(build_request(http_client, cache), query='whoogle')
+    original_send(build_request(http_client, cache, **lynx), query='whoogle')
+    original_send(build_request(http_client, cache, **chrome),
+                  query='whoogle')
+    assert len(http_client.urls) == 3
+
+    # The same custom user agent still shares an entry
+    original_send(build_request(http_client, cache, **lynx), query='whoogle')
+    assert len(http_client.urls) == 3
+    assert cache.stats()['hits'] == 1
+
+
+def test_captcha_not_cached():
+    cache = ResultCache()
+    http_client = FakeHttpClient(text='<div class="g-recaptcha"></div>')
+    req = build_request(http_client, cache)
+    original_send(req, query='whoogle')
+    original_send(req, query='whoogle')
+    assert len(http_client.urls) == 2
+
+
+def test_page_template():
+    key = Fernet.generate_key()
+    token = encrypt_string(key, 'https://example.com/img.png')
+    other = encrypt_string(key, 'not from this page')
+    page = (f'<a href="home?preferences=uABC">home</a>'
+            f'<img src="/element?url={token}&type=image/png">'
+            f'<a href="search?q={other}">keep</a>')
+
+    template = PageTemplate(
+        page, {token: 'https://example.com/img.png'}, 'uABC')
+    assert len(template) == 2
+
+    rendered = template.render(lambda path: f'<{path}>', 'uXYZ')
+    assert rendered == (
+        '<a href="home?preferences=uXYZ">home</a>'
+        '<img src="/element?url=<https://example.com/img.png>&type=image/png">'
+        f'<a href="search?q={other}">keep</a>')
+
+
+def test_rendered_page_cached(client):
+    cache = get_page_cache()
+    search = f'/{Endpoint.search}?q=test'
+
+    first = client.get(search)
+    assert first.status_code == 200
+    assert cache.stats()['size'] == 1
+
+    second = client.get(search)
+    assert second.status_code == 200
+    assert cache.stats()['hits'] >= 1
+
+    # Encrypted paths are re-encrypted for each request
+    token_re = re.compile(r'gAAAAA[\w-]+=*')
+    first_page, second_page = (rv.data.decode() for rv in (first, second))
+    assert first_page != second_page
+    assert token_re.sub('', first_page) == token_re.sub('', second_page)
+
+    fernet = Fernet(app.enc_key)
+    assert [fernet.decrypt(_.encode()) for _ in token_re.findall(first_page)] == \
+        [fernet.decrypt(_.encode()) for _ in token_re.findall(second_page)]
+
+    # A different search (or config) renders a new page
+    client.get(f'{search}&tbs=qdr:d')
+    assert cache.stats()['size'] == 2
@@ -1,4 +1,5 @@
 from bs4 import BeautifulSoup
+from app import app
 from app.filter import Filter
 from app.models.config import Config
 from app.models.endpoint import Endpoint
@@ -182,3 +183,78 @@ def test_site_alt_prefix_skip():
     assert results.get_site_alt(link = 'https://www.reddit.com', site_alts = test_site_alts) == 'https://reddit.endswithmobile.domain'
     assert results.get_site_alt(link = 'https://www.twitter.com', site_alts = test_site_alts) == 'https://twitter.endswithm.domain'
     assert results.get_site_alt(link = 'https://www.youtube.com', site_alts = test_site_alts) == 'http://yt.endswithwww.domain'
+
+
+def test_bold_search_terms_reuses_soup():
+    # Parsed results should be modified in place rather than re-parsed
+    soup = BeautifulSoup(
+        '<div id="main"><div>whoogle search</div></div>', 'html.parser')
+    bolded = results.bold_search_terms(soup, 'whoogle')
+    assert bolded is soup
+    assert soup.find('b').text == 'whoogle'
+    assert not search_mod.has_captcha(soup)
+
+
+def test_remove_results():
+    soup = BeautifulSoup(
+        '<div id="main">'
+        '<div class="ZINbbc"><div><span>Sponsored</span></div>'
+        '<a href="https://ad.com"><h3>Ad</h3></a></div>'
+        '<div class="ZINbbc"><div><div><span>AI </span>Overview</div></div>'
+        '</div>'
+        '<div class="ZINbbc"><div><h2>AI Overview</h2></div></div>'
+        '<div class="ZINbbc"><a href="https://a.com"><h3>Blocked</h3></a></div>'
+        '<div class="ZINbbc"><a href="https://blocked.com"><h3>B</h3></a>'
+        '</div>'
+        '<div class="ZINbbc"><a href="https://c.com"><h3>Result</h3></a>'
+        '<div><span>Ad-free</span></div></div>'
+        '</div>', 'html.parser')
+
+    with app.app_context():
+        config = Config(block_title='^Blocked', block_url='blocked')
+    f = Filter(user_key=generate_key(), config=config)
+    f.soup = soup
+    f.main_divs = soup.find('div', {'id': 'main'})
+    f.remove_results()
+
+    # Only the last result is left
+    assert [_.text for _ in soup.find_all('h3')] == ['Result']
+    assert len(f.main_divs.find_all('div', recursive=False)) == 1
+
+
+def test_sanitize_div():
+    soup = BeautifulSoup(
+        '<div id="main"><div>'
+        '<div>Plain text &gt; more text</div>'
+        '<div>Fish &amp; chips</div>'
+        '<div>&lt;script&gt;alert(1)&lt;/script&gt;Escaped &lt;b&gt;'
+        'markup&lt;/b&gt;&lt;iframe src="x"&gt;&lt;/iframe&gt;</div>'
+        '<div><span>Not text</span></div>'
+        '</div></div>', 'html.parser')
+
+    with app.app_context():
+        config = Config()
+    Filter(user_key=generate_key(), config=config).sanitize_div(
+        soup.find('div', {'id': 'main'}))
+
+    assert [str(_) for _ in soup.find_all('div')[2:]] == [
+        '<div>Plain text &amp;gt; more text</div>',
+        '<div>Fish &amp;amp; chips</div>',
+        '<div>Escaped &lt;b&gt;markup&lt;/b&gt;</div>',
+        '<div><span>Not text</span></div>',
+    ]
+
+
+def test_bold_search_terms():
+    soup = BeautifulSoup(
+        '<div><p>Whoogle search &lt;b&gt; is a search engine</p>'
+        '<p>whoogle</p><style>.whoogle {}</style>'
+        '<p>say "green eggs" and ham, not green or eggs</p></div>',
+        'html.parser')
+    results.bold_search_terms(soup, 'whoogle search "green eggs" ham')
+
+    assert str(soup) == (
+        '<div><p><b>Whoogle</b> <b>search</b> &lt;b&gt; is a <b>search</b> '
+        'engine</p><p>whoogle</p><style>.whoogle {}</style>'
+        '<p>say "<b>green eggs</b>" and <b>ham</b>, not green or eggs</p>'
+        '</div>')
@@ -1,7 +1,14 @@
 from app import app
 from app.models.endpoint import Endpoint
+from app.request import Request
+from app.routes import ELEMENT_CHUNK_SIZE, LazyGlobals
+from app.services import provider
+from app.services.http_client import HttpxClient
+from app.utils.misc import empty_gif
 
+import httpx
 import json
+import threading
 
 from test.conftest import demo_config
 
@@ -62,6 +69,122 @@ def test_custom_bang(client):
     assert rv.headers.get('Location').startswith('search?q=')
 
 
+def test_lazy_globals(client, monkeypatch):
+    loaded = []
+    for name, loader in LazyGlobals.loaders.items():
+        monkeypatch.setitem(
+            LazyGlobals.loaders, name,
+            lambda name=name, loader=loader: loaded.append(name) or loader())
+
+    # The user config and request aren't needed for a health check
+    rv = client.get(f'/{Endpoint.healthz}')
+    assert rv._status_code == 200
+    assert not loaded
+
+    # ...but are built (once) as soon as a route uses them
+    rv = client.get(f'/{Endpoint.search}?q=test')
+    assert rv._status_code == 200
+    assert loaded.count('user_config') == 1
+    assert loaded.count('user_request') == 1
+
+
+def test_lazy_globals_error(client, monkeypatch):
+    loaded = []
+
+    def load_user_config():
+        loaded.append('user_config')
+        raise ValueError('Invalid config')
+
+    monkeypatch.setitem(LazyGlobals.loaders, 'user_config', load_user_config)
+
+    # The error page doesn't try to build the config again
+    rv = client.get(f'/{Endpoint.search}?q=test')
+    assert rv._status_code == 500
+    assert loaded == ['user_config']
+
+
+def test_element(client, monkeypatch):
+    image = b'\x89PNG' + bytes(range(256)) * 1024 * 5
+    assert len(image) > ELEMENT_CHUNK_SIZE
+
+    def handler(request):
+        if request.url.path == '/chunked.png':
+            # No Content-Length
+            return httpx.Response(200, content=iter([image]),
+                                  headers={'Content-Type': 'image/png'})
+        return httpx.Response(200, content=image,
+                              headers={'Content-Type': 'image/png'})
+
+    class Transport(httpx.MockTransport):
+        # Like a connection pool, bodies can't be read once it's closed
+        closed = False
+
+        def handle_request(self, request):
+            response = super().handle_request(request)
+            body = response.read()
+            return httpx.Response(response.status_code,
+                                  headers=response.headers,
+                                  stream=Body(self, body))
+
+        def close(self):
+            self.closed = True
+
+    class Body(httpx.SyncByteStream):
+        def __init__(self, transport, body):
+            self.transport = transport
+            self.body = body
+
+        def __iter__(self):
+            for idx in range(0, len(self.body), ELEMENT_CHUNK_SIZE):
+                if self.transport.closed:
+                    raise httpx.ReadError('Connection closed')
+                yield self.body[idx:idx + ELEMENT_CHUNK_SIZE]
+
+    # Elements are fetched through the shared HTTP client, with upstream
+    # requests answered by the handler above
+    transport = Transport(handler)
+
+    def build_client(self, client_kwargs, verify, client_cls=None):
+        return httpx.Client(transport=transport, verify=verify,
+                            **client_kwargs)
+
+    monkeypatch.setattr(HttpxClient, '_build_client', build_client)
+    monkeypatch.setattr(provider, '_clients', {})
+
+    rv = client.get(f'/{Endpoint.element}?url=https://example.com/img.png')
+    assert rv._status_code == 200
+    assert rv.data == image
+    assert rv.headers['Content-Type'] == 'image/png'
+    assert rv.headers['Content-Length'] == str(len(image))
+
+    # Other requests finishing while an element is streamed don't cut it off
+    rv = client.get(f'/{Endpoint.element}?url=https://example.com/img.png',
+                    buffered=False)
+    chunks = iter(rv.response)
+    body = next(chunks)
+    assert len(body) < len(image)
+    other = threading.Thread(target=lambda: app.test_client().get('/'))
+    other.start()
+    other.join()
+    body += b''.join(chunks)
+    rv.close()
+    assert body == image
+
+    rv = client.get(
+        f'/{Endpoint.element}?url=https://example.com/chunked.png')
+    assert rv.data == image
+
+    # Elements over the max size aren't proxied, including elements without
+    # a Content-Length
+    monkeypatch.setenv('WHOOGLE_ELEMENT_MAX_SIZE', '1024')
+    rv = client.get(f'/{Endpoint.element}?url=https://example.com/img.png')
+    assert rv.data == empty_gif
+
+    rv = client.get(
+        f'/{Endpoint.element}?url=https://example.com/chunked.png')
+    assert rv.data == empty_gif
+
+
 def test_config(client):
     rv = client.post(f'/{Endpoint.config}', data=demo_config)
     assert rv._status_code == 302
@@ -0,0 +1,59 @@
+import json
+import os
+
+from app import app
+from app.models.endpoint import Endpoint
+from app.services.session_janitor import SessionJanitor
+
+
+def write_session(path, name: str, data) -> str:
+    file_path = os.path.join(path, name)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(data if isinstance(data, str) else json.dumps(data))
+    return file_path
+
+
+def test_janitor_reaps_invalid_sessions(tmp_path):
+    valid = write_session(tmp_path, 'a', {'valid': True})
+    invalid = write_session(tmp_path, 'b', {'uuid': 'test'})
+    unrelated = write_session(tmp_path, 'c', 'not a session')
+    oversized = write_session(tmp_path, 'd', {'data': 'x' * 100})
+
+    janitor = SessionJanitor(str(tmp_path), max_session_size=50,
+                             batch_size=2)
+
+    # Only the first batch of files is examined in a run
+    assert janitor.run_once() == 1
+    assert not os.path.exists(invalid)
+    assert janitor.stats()['pending'] == 2
+
+    assert janitor.run_once() == 0
+    assert all(os.path.exists(_) for _ in [valid, unrelated, oversized])
+    assert janitor.stats() == {'files_reaped': 1, 'runs': 2, 'pending': 0}
+
+
+def test_janitor_background_thread(tmp_path):
+    invalid = write_session(tmp_path, 'a', {'uuid': 'test'})
+
+    janitor = SessionJanitor(str(tmp_path), max_session_size=4000,
+                             interval_seconds=60)
+    janitor.start()
+    janitor.stop()
+    assert not os.path.exists(invalid)
+    assert janitor.files_reaped == 1
+
+    disabled = SessionJanitor(str(tmp_path), max_session_size=4000,
+                              interval_seconds=0)
+    disabled.start()
+    assert disabled.runs == 0
+
+
+def test_janitor_stats_reported(client, monkeypatch, tmp_path):
+    write_session(tmp_path, 'a', {'uuid': 'test'})
+    janitor = SessionJanitor(str(tmp_path), max_session_size=4000)
+    monkeypatch.setitem(app.services, 'session_janitor', janitor)
+    janitor.run_once()
+
+    rv = client.get(f'/{Endpoint.healthz}')
+    assert rv._status_code == 200
+    assert rv.json['session_janitor']['files_reaped'] == 1
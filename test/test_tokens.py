@@ -0,0 +1,81 @@
+import pytest
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.fernet import InvalidToken
+
+from app.models.endpoint import Endpoint
+from app.utils.session import generate_key
+from app.utils import tokens
+from app.utils.tokens import TOKEN_RE, TokenCipher, get_cipher, is_token
+
+PATH = 'https://example.com/favicon.ico'
+
+
+@pytest.mark.parametrize('mode', ['fernet', 'aead'])
+def test_token_cipher(mode):
+    key = generate_key()
+    cipher = TokenCipher(key, mode)
+    token = cipher.encrypt(PATH)
+
+    assert is_token(token)
+    assert TOKEN_RE.fullmatch(token)
+    assert token != cipher.encrypt(PATH)
+    assert cipher.decrypt(token) == PATH
+
+    # Tokens of either scheme can be decrypted, whatever the current mode
+    other = TokenCipher(key, 'aead' if mode == 'fernet' else 'fernet')
+    assert other.decrypt(token) == PATH
+
+    with pytest.raises(InvalidToken):
+        TokenCipher(generate_key(), mode).decrypt(token)
+    with pytest.raises(InvalidToken):
+        cipher.decrypt(token[:-4])
+    with pytest.raises(InvalidToken):
+        cipher.decrypt('v2.not-a-token')
+
+
+def test_cipher_cached():
+    key = generate_key()
+    assert get_cipher(key) is get_cipher(key)
+    assert get_cipher(key) is not get_cipher(generate_key())
+
+
+def test_aead_tokens(client, monkeypatch):
+    monkeypatch.setenv('WHOOGLE_URL_TOKEN_MODE', 'aead')
+    get_cipher.cache_clear()
+    try:
+        rv = client.get(f'/{Endpoint.search}?q=test')
+        assert rv._status_code == 200
+
+        tokens = TOKEN_RE.findall(rv.data.decode())
+        assert tokens
+        assert all(token.startswith('v2.') for token in tokens)
+    finally:
+        get_cipher.cache_clear()
+
+
+def test_aead_unsupported(client, monkeypatch):
+    # Older OpenSSL backends don't support AES-GCM-SIV
+    class AESGCMSIV:
+        def __init__(self, key):
+            raise UnsupportedAlgorithm('AES-GCM-SIV is not supported')
+
+    key = generate_key()
+    aead_token = TokenCipher(key, 'aead').encrypt(PATH)
+
+    monkeypatch.setattr(tokens, 'AESGCMSIV', AESGCMSIV)
+    monkeypatch.setenv('WHOOGLE_URL_TOKEN_MODE', 'aead')
+    tokens.aead_supported.cache_clear()
+    get_cipher.cache_clear()
+    try:
+        assert get_cipher(key).mode == 'fernet'
+        with pytest.raises(InvalidToken):
+            TokenCipher(key, 'fernet').decrypt(aead_token)
+
+        rv = client.get(f'/{Endpoint.search}?q=test')
+        assert rv._status_code == 200
+        found = TOKEN_RE.findall(rv.data.decode())
+        assert found
+        assert not any(token.startswith('v2.') for token in found)
+    finally:
+        tokens.aead_supported.cache_clear()
+        get_cipher.cache_clear()
@@ -1,8 +1,10 @@
 import pytest
+from stem import Signal
 
 from app import app
 from app.request import Request, TorError
 from app.models.config import Config
+from app.services.tor_controller import TorController
 
 
 class FakeResponse:
@@ -15,9 +17,11 @@ class FakeResponse:
 class FakeHttpClient:
     def __init__(self, tor_ok: bool):
         self._tor_ok = tor_ok
+        self.tor_checks = 0
 
     def get(self, url, headers=None, cookies=None, retries=0, backoff_seconds=0.5, use_cache=False):
         if 'check.torproject.org' in url:
+            self.tor_checks += 1
             return FakeResponse(text=('Congratulations' if self._tor_ok else 'Not Tor'))
         return FakeResponse(text='', status_code=200, content=b'OK')
 
@@ -25,6 +29,28 @@ class FakeHttpClient:
         pass
 
 
+class FakeController:
+    def __init__(self):
+        self.signals = []
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def signal(self, signal):
+        self.signals.append(signal)
+
+    def close(self):
+        self.alive = False
+
+
+@pytest.fixture(autouse=True)
+def tor_controller(monkeypatch):
+    controller = TorController()
+    monkeypatch.setattr('app.request.get_tor_controller', lambda: controller)
+    return controller
+
+
 def build_config(tor: bool) -> Config:
     # Minimal config with tor flag
     with app.app_context():
@@ -50,3 +76,81 @@ def test_tor_validation_failure(monkeypatch):
     with pytest.raises(TorError):
         _ = req.send(base_url='https://example.com', query='')
 
+
+
+def test_tor_validation_cached(monkeypatch, tor_controller):
+    monkeypatch.setattr('app.request.send_tor_signal', lambda signal: True)
+    cfg = build_config(tor=True)
+    http_client = FakeHttpClient(tor_ok=True)
+    for _ in range(3):
+        req = Request(normal_ua='TestUA', root_path='http://localhost:5000',
+                      config=cfg, http_client=http_client)
+        req.send(base_url='https://example.com', query='')
+        assert req.tor_valid is True
+
+    # Only the first request validates the connection with torproject.org
+    assert http_client.tor_checks == 1
+
+    tor_controller.invalidate()
+    req.send(base_url='https://example.com', query='')
+    assert http_client.tor_checks == 2
+
+
+def test_tor_controller_signals(monkeypatch, tor_controller):
+    connections = []
+
+    def connect():
+        connections.append(FakeController())
+        return connections[-1]
+
+    monkeypatch.setattr(tor_controller, '_connect', connect)
+
+    # The control connection is opened once and reused
+    assert tor_controller.signal(Signal.HEARTBEAT)
+    assert tor_controller.signal(Signal.HEARTBEAT)
+    assert len(connections) == 1
+    assert connections[0].signals == [Signal.HEARTBEAT]
+
+    # New identities are requested at most once per interval
+    assert tor_controller.signal(Signal.NEWNYM)
+    assert tor_controller.signal(Signal.NEWNYM)
+    assert connections[0].signals.count(Signal.NEWNYM) == 1
+    assert tor_controller.newnym_skipped == 1
+
+    # A dropped connection is re-established, and has to be validated again
+    tor_controller.validate(lambda: True)
+    connections[0].alive = False
+    assert tor_controller.signal(Signal.HEARTBEAT)
+    assert len(connections) == 2
+    assert tor_controller.validate(lambda: False) is False
+
+
+def test_tor_captcha_retries_wait_for_new_identity(monkeypatch,
+                                                   tor_controller):
+    controller = FakeController()
+    monkeypatch.setattr(tor_controller, '_connect', lambda: controller)
+    tor_controller.newnym_interval = 0.05
+
+    class CaptchaHttpClient(FakeHttpClient):
+        searches = 0
+
+        def get(self, url, **kwargs):
+            if 'check.torproject.org' in url:
+                return super().get(url, **kwargs)
+            self.searches += 1
+            return FakeResponse(text='<form id="captcha-form"></form>')
+
+    # Another search has just requested a new identity, so the next NEWNYM
+    # is rate limited
+    tor_controller.signal(Signal.NEWNYM)
+
+    http_client = CaptchaHttpClient(tor_ok=True)
+    req = Request(normal_ua='TestUA', root_path='http://localhost:5000',
+                  config=build_config(tor=True), http_client=http_client)
+    with pytest.raises(TorError):
+        req.send(base_url='https://example.com', query='')
+
+    # Every retry was sent over a new identity
+    assert http_client.searches == 11
+    assert controller.signals.count(Signal.NEWNYM) == 11
+    assert tor_controller.newnym_skipped == 0